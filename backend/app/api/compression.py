@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import gzip
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:  # brotli — опционально, без него только gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# сжимаем только то, что хорошо сжимается; картинки уже сжаты, а SSE нельзя буферизовать
+COMPRESSIBLE = ("application/json", "application/x-msgpack", "text/plain", "text/html", "text/csv")
+
+
+def _accepted(accept_encoding: str) -> List[str]:
+    out: List[str] = []
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if token:
+            out.append(token.strip().lower())
+    return out
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    acc = _accepted(accept_encoding)
+    if brotli is not None and "br" in acc:
+        return "br"
+    if "gzip" in acc:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """gzip/brotli по ``Accept-Encoding`` для JSON/MessagePack-ответов от ``minimum_size`` байт."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("method") == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def wrapped(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                ctype = headers.get("content-type", "")
+                passthrough = ("content-encoding" in headers) or not ctype.startswith(COMPRESSIBLE)
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            assert start is not None
+            headers = MutableHeaders(raw=start["headers"])
+            if len(body) >= self.minimum_size:
+                body = self._compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+            headers["Content-Length"] = str(len(body))
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, wrapped)
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
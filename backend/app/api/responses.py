@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from contextvars import ContextVar
+from typing import Any
+
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.services.serialization import HAVE_MSGPACK, dumps_json, dumps_msgpack
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+
+_accept: ContextVar[str] = ContextVar("accept", default="")
+
+
+def wants_msgpack(accept: str) -> bool:
+    return HAVE_MSGPACK and ("application/x-msgpack" in accept or "application/msgpack" in accept)
+
+
+class FastResponse(ORJSONResponse):
+    """orjson по умолчанию; MessagePack, если клиент прислал ``Accept: application/x-msgpack``.
+
+    Роуты с большими ответами возвращают её явно, чтобы не проходить через
+    ``jsonable_encoder`` FastAPI."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        if HAVE_MSGPACK:
+            self.headers.add_vary_header("Accept")
+
+    def render(self, content: Any) -> bytes:
+        if wants_msgpack(_accept.get()):
+            self.media_type = MSGPACK_MEDIA_TYPE
+            return dumps_msgpack(content)
+        return dumps_json(content)
+
+
+class AcceptNegotiationMiddleware:
+    """Запоминает ``Accept`` запроса для ``FastResponse`` (contextvar на время запроса)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _accept.set(Headers(scope=scope).get("accept", ""))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _accept.reset(token)
@@ -1,19 +1,30 @@
 from __future__ import annotations
-import json
-from datetime import datetime
+import hashlib
+import shutil
+from datetime import datetime, timedelta
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import FileResponse
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
 
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
 from app.db.models import Audit
-from app.settings import UPLOAD_DIR
+from app.api.responses import FastResponse
+from app.services.archive import audit_row, query_archive
+from app.services.serialization import dumps_json, loads_json, read_json, write_json
+from app.services.derivatives import remove_derivatives
+from app.services.inference_client import InferenceServerUnavailable
+from app.services.masks import MASK_FORMATS, encode_detections
+from app.services.raw_store import load_raw, prune_renders, remove_raw, save_raw
+from app.services.runner import decode_image, draw_custom, resolve
+from app.settings import PROCESSED_DIR, REPORTS_DIR, UPLOAD_DIR
 
 router = APIRouter()
 
@@ -23,14 +34,37 @@ def _url_to_path(static_url: Optional[str]) -> Optional[Path]:
     rel = static_url.replace("/static/", "")
     return UPLOAD_DIR / rel
 
+def _parse_day(s: str) -> datetime:
+    try:
+        return datetime.strptime(s, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(400, f"date must be YYYY-MM-DD, got {s!r}")
+
+def date_bounds(date: Optional[str] = None, date_from: Optional[str] = None,
+                date_to: Optional[str] = None):
+    """Даты фильтра -> полуинтервал [lo, hi) по created_at (None — без границы).
+
+    Сравнение самого столбца с константами (а не DATE(created_at)) позволяет
+    MySQL отсечь лишние помесячные партиции и использовать индекс."""
+    if date:
+        lo = _parse_day(date)
+        return lo, lo + timedelta(days=1)
+    lo = _parse_day(date_from) if date_from else None
+    hi = _parse_day(date_to) + timedelta(days=1) if date_to else None
+    return lo, hi
+
 def apply_filters(q, *, employee_id: Optional[str]=None, date: Optional[str]=None,
-                  manual: Optional[str]=None, employees: Optional[List[str]]=None):
+                  manual: Optional[str]=None, employees: Optional[List[str]]=None,
+                  date_from: Optional[str]=None, date_to: Optional[str]=None):
     if employee_id:
         q = q.filter(func.lower(Audit.employee_id).like(f"%{employee_id.lower()}%"))
     if employees:
         q = q.filter(Audit.employee_id.in_(employees))
-    if date:
-        q = q.filter(func.date(Audit.created_at) == date)
+    lo, hi = date_bounds(date, date_from, date_to)
+    if lo is not None:
+        q = q.filter(Audit.created_at >= lo)
+    if hi is not None:
+        q = q.filter(Audit.created_at < hi)
     if manual == "yes":
         q = q.filter(Audit.manual_check_required.is_(True))
     elif manual == "no":
@@ -43,19 +77,18 @@ def audit_dates(db: Session = Depends(get_db)):
     return [r[0].strftime("%Y-%m-%d") for r in rows]
 
 @router.get("/audits")
-def list_audits(
+async def list_audits(
     page: int = Query(1, ge=1),
     size: int = Query(20, ge=1, le=100),
     employee_id: Optional[str] = Query(None),
     date: Optional[str] = Query(None),
     manual: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    q = db.query(Audit).order_by(Audit.id.desc())
-    q = apply_filters(q, employee_id=employee_id, date=date, manual=manual)
-    total = q.count()
+    q = apply_filters(select(Audit), employee_id=employee_id, date=date, manual=manual)
+    total = (await db.execute(select(func.count()).select_from(q.order_by(None).subquery()))).scalar_one()
     size = 20  # фиксированный размер страницы
-    items = q.offset((page - 1) * size).limit(size).all()
+    items = (await db.execute(q.order_by(Audit.id.desc()).offset((page - 1) * size).limit(size))).scalars().all()
 
     def row(a: Audit) -> Dict[str, Any]:
         return {
@@ -69,7 +102,7 @@ def list_audits(
             "report_url": a.report_url,
         }
 
-    return {"total": total, "page": page, "size": size, "items": [row(i) for i in items]}
+    return FastResponse({"total": total, "page": page, "size": size, "items": [row(i) for i in items]})
 
 @router.get("/audits/{audit_id}/report")
 def get_report(audit_id: int, db: Session = Depends(get_db)):
@@ -81,6 +114,141 @@ def get_report(audit_id: int, db: Session = Depends(get_db)):
         raise HTTPException(404, "Report file not found")
     return FileResponse(str(file_path), media_type="application/json", filename=f"audit_{audit_id}.json")
 
+# ----- пересчёт порогов по сохранённым детекциям -----
+class RethresholdRequest(BaseModel):
+    check_thr: float = Field(0.70, ge=0.0, le=1.0)
+    render_thr: float = Field(0.60, ge=0.0, le=1.0)
+    draw_boxes: bool = True
+    draw_labels: bool = True
+    draw_masks: bool = False
+    render: bool = True       # False — только детекции и сводка (слайдер check_thr)
+    persist: bool = False     # записать новую сводку в аудит и отчёт
+    mask_format: str = "poly"
+    mask_tolerance: float = 0.0
+
+
+def _rethreshold(a: Audit, req: RethresholdRequest) -> Dict[str, Any]:
+    """Пересчёт, рендер и отчёт — синхронно (файлы, модели), вызывается в threadpool."""
+    raw = load_raw(a.image_uid)
+    if raw is None:
+        raise HTTPException(404, "Raw detections are not stored for this audit")
+
+    original_path = _url_to_path(a.original_url)
+    bgr = None
+
+    def load_image():
+        nonlocal bgr
+        if bgr is None:
+            if not original_path or not original_path.exists():
+                raise HTTPException(410, "Original image is gone")
+            bgr = decode_image(original_path.read_bytes())
+        return bgr
+
+    try:
+        pred = resolve(raw, check_thr=req.check_thr, load_image=load_image)
+    except RuntimeError as e:
+        raise HTTPException(400, str(e))
+    except InferenceServerUnavailable as e:
+        raise HTTPException(503, str(e))
+    if pred.pop("raw_updated", False):
+        save_raw(a.image_uid, raw)
+
+    dets = pred["detections"]
+    model_kind = raw["model_kind"]
+    draw_masks = bool(req.draw_masks and model_kind == "seg")
+
+    processed_url = a.processed_url
+    if req.render:
+        # имя зависит от параметров: derived-превью кэшируются как immutable
+        key = dumps_json([req.check_thr, req.render_thr, req.draw_boxes, req.draw_labels, draw_masks])
+        processed_path = PROCESSED_DIR / f"{a.image_uid}_r{hashlib.blake2b(key, digest_size=6).hexdigest()}.jpg"
+        if not processed_path.exists():
+            if not req.draw_boxes and not req.draw_labels and not draw_masks:
+                load_image()
+                shutil.copyfile(original_path, processed_path)
+            else:
+                draw_custom(
+                    load_image(),
+                    dets,
+                    render_thr=req.render_thr,
+                    draw_boxes=req.draw_boxes,
+                    draw_labels=req.draw_labels,
+                    out_path=processed_path,
+                    draw_masks=draw_masks,
+                )
+        processed_url = f"/static/processed/{processed_path.name}"
+        # у аудита живут максимум две перерисовки: записанная в аудит и последняя
+        keep = {processed_path.name}
+        if not req.persist and a.processed_url:
+            keep.add(Path(a.processed_url).name)
+        prune_renders(a.image_uid, keep)
+
+    out_dets = encode_detections(dets, req.mask_format, req.mask_tolerance)
+    report_path = None
+    if req.persist:
+        report_path = _url_to_path(a.report_url) or REPORTS_DIR / f"{a.image_uid}.json"
+        report_data: Dict[str, Any] = read_json(report_path) if report_path.exists() else {}
+        report_data.update({
+            "image_width": pred["w"],
+            "image_height": pred["h"],
+            "detections": out_dets,
+            "mask_format": req.mask_format,
+            "summary": pred["summary"],
+            "original_url": a.original_url,
+            "processed_url": processed_url,
+            "employee_id": a.employee_id,
+            "model_kind": model_kind,
+            "check_threshold": req.check_thr,
+            "render_threshold": req.render_thr,
+            "draw_masks": draw_masks,
+        })
+        write_json(report_path, report_data)
+    return {"pred": pred, "out_dets": out_dets, "processed_url": processed_url, "report_path": report_path}
+
+
+@router.post("/audits/{audit_id}/rethreshold")
+async def rethreshold_audit(
+    audit_id: int,
+    req: RethresholdRequest,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    if req.mask_format not in MASK_FORMATS:
+        raise HTTPException(400, f"mask_format must be one of {', '.join(MASK_FORMATS)}")
+    a = await db.get(Audit, audit_id)
+    if not a:
+        raise HTTPException(404, "Not found")
+
+    res = await run_in_threadpool(_rethreshold, a, req)
+    pred, processed_url = res["pred"], res["processed_url"]
+    summary = pred["summary"]
+
+    if req.persist:
+        a.total_detections = len([d for d in pred["detections"] if d["confidence"] >= req.check_thr])
+        a.all_tools_present = summary["all_tools_present"]
+        a.min_confidence = float(summary["min_confidence"])
+        a.manual_check_required = summary["manual_check_required"]
+        a.missing_tools = dumps_json(summary["missing_tools"]).decode()
+        a.extras_or_duplicates = dumps_json(summary["extras_or_duplicates"]).decode()
+        a.processed_url = processed_url
+        a.report_url = f"/static/processed/reports/{res['report_path'].name}"
+        await db.commit()
+
+    return FastResponse({
+        "audit_id": a.id,
+        "image_width": pred["w"],
+        "image_height": pred["h"],
+        "detections": res["out_dets"],
+        "mask_format": req.mask_format,
+        "summary": summary,
+        "original_url": a.original_url,
+        "processed_url": processed_url,
+        "processed_url_abs": str(request.base_url).rstrip("/") + processed_url,
+        "check_threshold": req.check_thr,
+        "render_threshold": req.render_thr,
+        "persisted": req.persist,
+    })
+
 @router.delete("/audits/{audit_id}")
 def delete_audit(audit_id: int, db: Session = Depends(get_db)):
     a = db.get(Audit, audit_id)
@@ -97,6 +265,9 @@ def delete_audit(audit_id: int, db: Session = Depends(get_db)):
     _safe_unlink(_url_to_path(a.original_url))
     _safe_unlink(_url_to_path(a.processed_url))
     _safe_unlink(_url_to_path(a.report_url))
+    remove_derivatives("original", _url_to_path(a.original_url))
+    remove_derivatives("processed", _url_to_path(a.processed_url))
+    remove_raw(a.image_uid)
 
     db.delete(a)
     db.commit()
@@ -119,6 +290,9 @@ def clear_audits(confirm: str = Query(..., description="Type YES to confirm"), d
         _safe_unlink(_url_to_path(a.original_url))
         _safe_unlink(_url_to_path(a.processed_url))
         _safe_unlink(_url_to_path(a.report_url))
+        remove_derivatives("original", _url_to_path(a.original_url))
+        remove_derivatives("processed", _url_to_path(a.processed_url))
+        remove_raw(a.image_uid)
         db.delete(a)
     db.commit()
     return {"ok": True, "deleted": len(items)}
@@ -126,12 +300,15 @@ def clear_audits(confirm: str = Query(..., description="Type YES to confirm"), d
 # ----- экспорт -----
 class ExportRequest(BaseModel):
     date: Optional[str] = None
+    date_from: Optional[str] = None     # YYYY-MM-DD, включительно
+    date_to: Optional[str] = None       # YYYY-MM-DD, включительно
     page_from: Optional[int] = None
     page_to: Optional[int] = None
     size: int = 20
     status: str = "all"                 # 'all' | 'needed' | 'not_needed'
     employees: Optional[List[str]] = None
     employee_search: Optional[str] = None
+    include_archive: bool = True        # добавить записи из архива холодных месяцев (ARCHIVE_DIR)
 
 @router.post("/audits/export")
 def export_audits(req: ExportRequest, db: Session = Depends(get_db)):
@@ -141,7 +318,17 @@ def export_audits(req: ExportRequest, db: Session = Depends(get_db)):
     if req.status == "needed": manual = "yes"
     elif req.status == "not_needed": manual = "no"
 
-    q = apply_filters(q, employee_id=req.employee_search, date=req.date, manual=manual, employees=req.employees)
+    q = apply_filters(q, employee_id=req.employee_search, date=req.date, manual=manual, employees=req.employees,
+                      date_from=req.date_from, date_to=req.date_to)
+
+    # архивные записи старше любых живых (id меньше), поэтому идут после них;
+    # архив распаковывается, только если живые строки не заполнили страницы
+    def archived_rows() -> List[Dict[str, Any]]:
+        if not req.include_archive:
+            return []
+        lo, hi = date_bounds(req.date, req.date_from, req.date_to)
+        return query_archive(date_from=lo, date_to=hi, employee_search=req.employee_search,
+                             employees=req.employees, manual=manual)
 
     if req.page_from and req.page_to:
         pf = max(1, int(req.page_from))
@@ -149,39 +336,21 @@ def export_audits(req: ExportRequest, db: Session = Depends(get_db)):
         size = max(1, int(req.size))
         offs = (pf - 1) * size
         lim = (pt - pf + 1) * size
-        q = q.offset(offs).limit(lim)
-
-    rows = q.all()
-
-    def full_row(a: Audit) -> Dict[str, Any]:
-        try:
-            missing = json.loads(a.missing_tools)
-        except Exception:
-            missing = []
-        try:
-            extras = json.loads(a.extras_or_duplicates)
-        except Exception:
-            extras = []
-        return {
-            "id": a.id,
-            "image_uid": a.image_uid,
-            "employee_id": a.employee_id,
-            "created_at": a.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "total_detections": a.total_detections,
-            "all_tools_present": a.all_tools_present,
-            "min_confidence": float(a.min_confidence),
-            "manual_check_required": a.manual_check_required,
-            "missing_tools": missing,
-            "extras_or_duplicates": extras,
-            "original_url": a.original_url,
-            "processed_url": a.processed_url,
-            "report_url": a.report_url,
-        }
+        rows = q.offset(offs).limit(lim).all()
+        archived: List[Dict[str, Any]] = []
+        if len(rows) < lim:
+            archived = archived_rows()
+            if archived:
+                a_offs = max(0, offs - q.order_by(None).count())
+                archived = archived[a_offs:a_offs + lim - len(rows)]
+    else:
+        rows = q.all()
+        archived = archived_rows()
 
-    data = [full_row(r) for r in rows]
-    tmp = NamedTemporaryFile("w", encoding="utf-8", suffix=".json", dir=str((UPLOAD_DIR / 'processed' / 'reports')), delete=False)
+    data = [audit_row(r) for r in rows] + archived
+    tmp = NamedTemporaryFile("wb", suffix=".json", dir=str((UPLOAD_DIR / 'processed' / 'reports')), delete=False)
     with tmp as f:
-        json.dump({"count": len(data), "items": data}, f, ensure_ascii=False, indent=2)
+        f.write(dumps_json({"count": len(data), "items": data}))
         temp_path = Path(f.name)
 
     fname = f"audit_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
@@ -196,26 +365,24 @@ def audits_facets(db: Session = Depends(get_db)):
         if d[0] is not None
     ]
     employees = [e[0] for e in db.query(Audit.employee_id).distinct().order_by(Audit.employee_id).all()]
-    return {"dates": dates, "employees": employees}
+    return FastResponse({"dates": dates, "employees": employees})
 
 @router.get("/audits/stats")
-def audits_stats(
+async def audits_stats(
     date: Optional[str] = Query(None, description="YYYY-MM-DD — конкретная дата"),
     date_from: Optional[str] = Query(None, description="YYYY-MM-DD — от"),
     date_to: Optional[str] = Query(None, description="YYYY-MM-DD — до (включительно)"),
     manual: Optional[str] = Query(None, regex="^(yes|no|all)$", description="yes|no|all"),
     employee_ids: Optional[str] = Query(None, description="через запятую"),
     search: Optional[str] = Query(None, description="подстрока по employee_id, case-insensitive"),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    q = db.query(Audit)
+    q = select(Audit)
 
     from sqlalchemy import func as _f
-    if date:
-        q = q.filter(_f.date(Audit.created_at) == date)
-    else:
-        if date_from: q = q.filter(_f.date(Audit.created_at) >= date_from)
-        if date_to:   q = q.filter(_f.date(Audit.created_at) <= date_to)
+    lo, hi = date_bounds(date, date_from, date_to)
+    if lo is not None: q = q.filter(Audit.created_at >= lo)
+    if hi is not None: q = q.filter(Audit.created_at < hi)
 
     if manual == "yes":
         q = q.filter(Audit.manual_check_required.is_(True))
@@ -228,17 +395,17 @@ def audits_stats(
     if search:
         q = q.filter(_f.lower(Audit.employee_id).like(f"%{search.lower()}%"))
 
-    rows: List[Audit] = q.order_by(Audit.created_at.asc()).all()
+    rows: List[Audit] = (await db.execute(q.order_by(Audit.created_at.asc()))).scalars().all()
     total = len(rows)
     if not total:
-        return {
+        return FastResponse({
             "total": 0,
             "detections": {"avg": 0, "min": 0, "max": 0},
             "manual": {"required": 0, "not_required": 0},
             "all_tools_present": {"yes": 0, "no": 0},
             "by_date": [], "by_employee": [], "min_conf_hist": [],
             "missing_top": [], "extras_top": [], "date_span": None,
-        }
+        })
 
     d_min = min(r.created_at for r in rows)
     d_max = max(r.created_at for r in rows)
@@ -286,18 +453,18 @@ def audits_stats(
 
     for r in rows:
         try:
-            m = json.loads(r.missing_tools or "[]")
+            m = loads_json(r.missing_tools or "[]")
             if isinstance(m, list): miss_cnt.update([str(x) for x in m])
         except Exception: pass
         try:
-            e = json.loads(r.extras_or_duplicates or "[]")
+            e = loads_json(r.extras_or_duplicates or "[]")
             if isinstance(e, list): extra_cnt.update([str(x) for x in e])
         except Exception: pass
 
     def top(counter, n=10):
         return [{"name": k, "count": v} for k, v in counter.most_common(n)]
 
-    return {
+    return FastResponse({
         "total": total,
         "detections": det_stats,
         "manual": {"required": manual_req, "not_required": total - manual_req},
@@ -308,4 +475,4 @@ def audits_stats(
         "missing_top": top(miss_cnt, 12),
         "extras_top": top(extra_cnt, 12),
         "date_span": {"from": d_min.strftime("%Y-%m-%d %H:%M:%S"), "to": d_max.strftime("%Y-%m-%d %H:%M:%S")},
-    }
+    })
@@ -1,84 +1,92 @@
 from __future__ import annotations
+import cProfile
+import logging
 import uuid
-import json
+from contextlib import nullcontext
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, Optional
 
-from fastapi import APIRouter, Request, UploadFile, File, Form, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Request, UploadFile, File, Form, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.api.responses import FastResponse
 
-from app.settings import ORIGINAL_DIR, PROCESSED_DIR, REPORTS_DIR
-from app.db.database import get_db
+from app.settings import ORIGINAL_DIR, PROCESSED_DIR, RAW_FLOOR_CONF, REPORTS_DIR
+from app.db.database import AsyncSessionLocal, get_async_db
 from app.db.models import Audit
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.services.inference import run_pipeline, draw_custom
+from app.services import layout_prior
+from app.services.inference_client import InferenceServerUnavailable
+from app.services.masks import MASK_FORMATS, encode_detections
+from app.services.raw_store import save_raw
+from app.services.serialization import dumps_json, write_json
+from app.services.runner import (
+    decode_image, detect_raw, draw_custom, resolve, resolve_provisional, run_pipeline,
+)
+from app.services.profiling import (
+    NULL_TIMER, StageTimer, call_profiled, profiler_slot, profiling_allowed, save_profile,
+)
 
 router = APIRouter()
+log = logging.getLogger(__name__)
 
 def _abs_url(request: Request, rel: str) -> str:
     base = str(request.base_url).rstrip("/")
     return base + rel
 
-@router.post("/infer")
-async def infer_endpoint(
-    request: Request,
-    image: UploadFile = File(...),
-    employee_id: str = Form(...),
+def _save_upload(t, original_path: Path, data: bytes):
+    """Оригинал на диск и декодирование — в threadpool, не в event loop."""
+    with t.stage("io_upload"):
+        original_path.write_bytes(data)
+    with t.stage("decode"):
+        return decode_image(data)
 
-    check_thr: float = Form(0.70),     # 0..1
-    render_thr: float = Form(0.60),    # 0..1
-    model_kind: str = Form("det"),     # "det" | "seg"
 
-    draw_boxes: bool = Form(True),
-    draw_labels: bool = Form(True),
-    draw_masks: bool = Form(False),
-    db: Session = Depends(get_db),
-):
-    # сохранить оригинал
-    ext = Path(image.filename).suffix or ".jpg"
-    uid = uuid.uuid4().hex
-    original_path = ORIGINAL_DIR / f"{uid}{ext}"
+def _write_outputs(
+    t, *, uid: str, data: bytes, bgr, pred: Dict[str, Any], original_path: Path,
+    employee_id: str, model_kind: str, check_thr: float, render_thr: float, draw_boxes: bool,
+    draw_labels: bool, draw_masks: bool, mask_format: str, mask_tolerance: float,
+) -> Dict[str, Any]:
+    """Сырые детекции, рендер, маски, отчёт, карта раскладки. Синхронно и тяжело
+    (рендер большого кадра — сотни мс) — вызывается через run_in_threadpool."""
     processed_path = PROCESSED_DIR / f"{uid}.jpg"
     report_path = REPORTS_DIR / f"{uid}.json"
-
-    with original_path.open("wb") as f:
-        f.write(await image.read())
-
-    # инференс
-    try:
-        pred: Dict[str, Any] = run_pipeline(original_path, model_kind=model_kind, check_thr=check_thr)
-    except RuntimeError as e:
-        raise HTTPException(400, str(e))
-
     dets = pred["detections"]
-    summary = pred["summary"]
+    # сырые детекции — для POST /audits/{id}/rethreshold без повторного инференса
+    with t.stage("io_raw"):
+        save_raw(uid, pred.pop("raw"))
 
     # рендер
-    if not draw_boxes and not draw_labels and not draw_masks:
-        processed_path.write_bytes(original_path.read_bytes())
-    else:
-        draw_custom(
-            original_path,
-            dets,
-            render_thr=render_thr,
-            draw_boxes=draw_boxes,
-            draw_labels=draw_labels,
-            out_path=processed_path,
-            draw_masks=(draw_masks and model_kind == "seg"),
-        )
+    with t.stage("render"):
+        if not draw_boxes and not draw_labels and not draw_masks:
+            processed_path.write_bytes(data)
+        else:
+            draw_custom(
+                bgr,
+                dets,
+                render_thr=render_thr,
+                draw_boxes=draw_boxes,
+                draw_labels=draw_labels,
+                out_path=processed_path,
+                draw_masks=(draw_masks and model_kind == "seg"),
+            )
+
+    # маски в ответе/отчёте — в запрошенном формате (рендер выше шёл по исходным полигонам)
+    with t.stage("encode_masks"):
+        out_dets = encode_detections(dets, mask_format, mask_tolerance)
 
     # отчёт
     original_url = f"/static/original/{original_path.name}"
     processed_url = f"/static/processed/{processed_path.name}"
-    processed_url_abs = _abs_url(request, processed_url)
 
     report_data = {
         "image_width": pred["w"],
         "image_height": pred["h"],
-        "detections": dets,
-        "summary": summary,
+        "detections": out_dets,
+        "mask_format": mask_format,
+        "summary": pred["summary"],
         "original_url": original_url,
         "processed_url": processed_url,
         "employee_id": employee_id,
@@ -88,9 +96,35 @@ async def infer_endpoint(
         "render_threshold": render_thr,
         "draw_masks": bool(draw_masks and model_kind == "seg"),
     }
-    with report_path.open("w", encoding="utf-8") as f:
-        json.dump(report_data, f, ensure_ascii=False, indent=2)
-    report_url = f"/static/processed/reports/{report_path.name}"
+    with t.stage("io_report"):
+        write_json(report_path, report_data)
+
+    # карта раскладки учится на уверенных детекциях (DOP-fallback по кропам)
+    with t.stage("layout_prior"):
+        try:
+            layout_prior.record(dets, pred["w"], pred["h"])
+        except Exception as e:
+            log.warning("layout prior update failed: %s", e)
+
+    return {
+        "detections": out_dets,
+        "original_url": original_url,
+        "processed_url": processed_url,
+        "report_url": f"/static/processed/reports/{report_path.name}",
+    }
+
+
+async def _store_result(
+    request: Request, db: AsyncSession, t, *, uid: str, pred: Dict[str, Any], employee_id: str,
+    check_thr: float, mask_format: str, **outputs: Any,
+) -> Dict[str, Any]:
+    """Общее для /infer и /infer/stream: файлы (в threadpool), затем запись в БД."""
+    dets = pred["detections"]
+    summary = pred["summary"]
+    out = await run_in_threadpool(
+        _write_outputs, t, uid=uid, pred=pred, employee_id=employee_id, check_thr=check_thr,
+        mask_format=mask_format, **outputs)
+    original_url, processed_url = out["original_url"], out["processed_url"]
 
     # запись в БД
     a = Audit(
@@ -100,21 +134,206 @@ async def infer_endpoint(
         all_tools_present=summary["all_tools_present"],
         min_confidence=float(summary["min_confidence"]),
         manual_check_required=summary["manual_check_required"],
-        missing_tools=json.dumps(summary["missing_tools"], ensure_ascii=False),
-        extras_or_duplicates=json.dumps(summary["extras_or_duplicates"], ensure_ascii=False),
+        missing_tools=dumps_json(summary["missing_tools"]).decode(),
+        extras_or_duplicates=dumps_json(summary["extras_or_duplicates"]).decode(),
         original_url=original_url,
         processed_url=processed_url,
-        report_url=report_url,
+        report_url=out["report_url"],
     )
-    db.add(a); db.commit(); db.refresh(a)
+    with t.stage("db"):
+        db.add(a)
+        await db.commit()
+        await db.refresh(a)
 
-    return JSONResponse({
+    return {
         "audit_id": a.id,
         "image_width": pred["w"],
         "image_height": pred["h"],
-        "detections": dets,
+        "detections": out["detections"],
+        "mask_format": mask_format,
         "summary": summary,
         "original_url": original_url,
         "processed_url": processed_url,
-        "processed_url_abs": processed_url_abs,
+        "processed_url_abs": _abs_url(request, processed_url),
+    }
+
+
+@router.post("/infer")
+async def infer_endpoint(
+    request: Request,
+    image: UploadFile = File(...),
+    employee_id: str = Form(...),
+
+    check_thr: float = Form(0.70),     # 0..1
+    render_thr: float = Form(0.60),    # 0..1
+    model_kind: str = Form("det"),     # "det" | "seg"
+
+    draw_boxes: bool = Form(True),
+    draw_labels: bool = Form(True),
+    draw_masks: bool = Form(False),
+    mask_format: str = Form("poly"),   # "poly" | "int" | "packed" (см. app/services/masks.py)
+    mask_tolerance: float = Form(0.0), # упрощение полигонов, px (0 — без упрощения)
+    profile: bool = Form(False),       # разбивка по стадиям + cProfile-дамп (см. PROFILING_ENABLED)
+    x_admin_token: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if mask_format not in MASK_FORMATS:
+        raise HTTPException(400, f"mask_format must be one of {', '.join(MASK_FORMATS)}")
+    if profile and not profiling_allowed(x_admin_token):
+        raise HTTPException(403, "Profiling is disabled or admin token is invalid")
+    with profiler_slot() if profile else nullcontext(True) as slot:
+        if not slot:
+            raise HTTPException(409, "Another profiled request is in progress")
+        return await _infer(
+            request, db, image=image, employee_id=employee_id, check_thr=check_thr,
+            render_thr=render_thr, model_kind=model_kind, draw_boxes=draw_boxes,
+            draw_labels=draw_labels, draw_masks=draw_masks, mask_format=mask_format,
+            mask_tolerance=mask_tolerance, profile=profile,
+        )
+
+
+async def _infer(
+    request: Request, db: AsyncSession, *, image: UploadFile, employee_id: str, check_thr: float,
+    render_thr: float, model_kind: str, draw_boxes: bool, draw_labels: bool, draw_masks: bool,
+    mask_format: str, mask_tolerance: float, profile: bool,
+) -> FastResponse:
+    timer = StageTimer() if profile else None
+    t = timer or NULL_TIMER
+    # cProfile включается только в потоке пайплайна (call_profiled): в event loop
+    # между await-ами выполняются чужие запросы
+    prof = cProfile.Profile() if profile else None
+
+    # сохранить оригинал
+    ext = Path(image.filename).suffix or ".jpg"
+    uid = uuid.uuid4().hex
+    original_path = ORIGINAL_DIR / f"{uid}{ext}"
+
+    with t.stage("io_upload"):
+        data = await image.read()
+    try:
+        bgr = await run_in_threadpool(_save_upload, t, original_path, data)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    # инференс
+    try:
+        # в threadpool: локальные модели под _LOCAL_LOCK, его может держать /infer/stream
+        pred: Dict[str, Any] = await run_in_threadpool(
+            call_profiled, prof, run_pipeline, bgr, model_kind=model_kind, check_thr=check_thr, timer=timer)
+    except RuntimeError as e:
+        raise HTTPException(400, str(e))
+    except InferenceServerUnavailable as e:
+        raise HTTPException(503, str(e))
+
+    resp = await _store_result(
+        request, db, t, uid=uid, data=data, bgr=bgr, pred=pred, original_path=original_path,
+        employee_id=employee_id, model_kind=model_kind, check_thr=check_thr, render_thr=render_thr,
+        draw_boxes=draw_boxes, draw_labels=draw_labels, draw_masks=draw_masks,
+        mask_format=mask_format, mask_tolerance=mask_tolerance,
+    )
+    if prof and timer:
+        timings = timer.as_dict()
+        timings["dump"] = save_profile(uid, prof, timings, {
+            "audit_id": resp["audit_id"],
+            "model_kind": model_kind,
+            "check_threshold": check_thr,
+            "image_width": pred["w"],
+            "image_height": pred["h"],
+            "candidates": len(pred["detections"]),
+        })
+        resp["profile"] = timings
+    return FastResponse(resp)
+
+
+# ========= потоковый /infer (Server-Sent Events) =========
+#   event: detections — сразу после DET/SEG: детекции и черновая сводка
+#                       ("final": false, если ещё нужны fallback-проходы)
+#   event: refined    — после коловорота из SEG / DOP: уточнённые детекции и сводка
+#   event: done       — аудит записан: audit_id и URL-ы
+#   event: error      — {"status", "detail"}; поток на этом заканчивается
+
+def _sse(event: str, payload: Dict[str, Any]) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps_json(payload) + b"\n\n"
+
+
+@router.post("/infer/stream")
+async def infer_stream_endpoint(
+    request: Request,
+    image: UploadFile = File(...),
+    employee_id: str = Form(...),
+
+    check_thr: float = Form(0.70),
+    render_thr: float = Form(0.60),
+    model_kind: str = Form("det"),
+
+    draw_boxes: bool = Form(True),
+    draw_labels: bool = Form(True),
+    draw_masks: bool = Form(False),
+    mask_format: str = Form("poly"),
+    mask_tolerance: float = Form(0.0),
+):
+    if mask_format not in MASK_FORMATS:
+        raise HTTPException(400, f"mask_format must be one of {', '.join(MASK_FORMATS)}")
+
+    # загрузка и декодирование — до начала потока, ошибки обычным HTTP-статусом
+    ext = Path(image.filename).suffix or ".jpg"
+    uid = uuid.uuid4().hex
+    original_path = ORIGINAL_DIR / f"{uid}{ext}"
+    data = await image.read()
+    try:
+        bgr = await run_in_threadpool(_save_upload, NULL_TIMER, original_path, data)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            raw = await run_in_threadpool(
+                detect_raw, bgr, model_kind=model_kind, floor_conf=min(RAW_FLOOR_CONF, check_thr))
+            pred = await run_in_threadpool(resolve_provisional, raw, check_thr=check_thr)
+            pending = pred["skipped"]
+            yield _sse("detections", {
+                "stage": model_kind,
+                "final": not pending,
+                "pending": pending,
+                "image_width": pred["w"],
+                "image_height": pred["h"],
+                "detections": encode_detections(pred["detections"], mask_format, mask_tolerance),
+                "mask_format": mask_format,
+                "summary": pred["summary"],
+            })
+
+            if pending:
+                pred = await run_in_threadpool(resolve, raw, check_thr=check_thr, load_image=lambda: bgr)
+                yield _sse("refined", {
+                    "stage": "fallbacks",
+                    "final": True,
+                    "passes": pending,
+                    "detections": encode_detections(pred["detections"], mask_format, mask_tolerance),
+                    "mask_format": mask_format,
+                    "summary": pred["summary"],
+                })
+
+            pred["raw"] = raw
+            async with AsyncSessionLocal() as db:
+                resp = await _store_result(
+                    request, db, NULL_TIMER, uid=uid, data=data, bgr=bgr, pred=pred,
+                    original_path=original_path, employee_id=employee_id, model_kind=model_kind,
+                    check_thr=check_thr, render_thr=render_thr, draw_boxes=draw_boxes,
+                    draw_labels=draw_labels, draw_masks=draw_masks,
+                    mask_format=mask_format, mask_tolerance=mask_tolerance,
+                )
+            yield _sse("done", {k: resp[k] for k in (
+                "audit_id", "summary", "original_url", "processed_url", "processed_url_abs")})
+        except RuntimeError as e:
+            yield _sse("error", {"status": 400, "detail": str(e)})
+        except InferenceServerUnavailable as e:
+            yield _sse("error", {"status": 503, "detail": str(e)})
+        except Exception:
+            # клиент должен получить error, а не оборванный поток
+            log.exception("infer stream %s failed", uid)
+            yield _sse("error", {"status": 500, "detail": "Internal Server Error"})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",     # nginx: не буферизовать поток
     })
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+
+from app.services.derivatives import FORMATS, etag_for, get_derivative
+from app.settings import DERIVED_CACHE_MAX_AGE
+
+router = APIRouter()
+
+
+@router.get("/derived/{kind}/{name}")
+def get_derived(
+    request: Request,
+    kind: str,
+    name: str,
+    size: str = Query("thumb", regex="^(thumb|medium|full)$"),
+    fmt: str = Query("auto", regex="^(auto|webp|jpeg)$", description="auto — WebP, если клиент его принимает"),
+):
+    if fmt == "auto":
+        fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+
+    path = get_derivative(kind, name, size, fmt)
+    if path is None:
+        raise HTTPException(404, "Not found")
+
+    etag = etag_for(path)
+    headers = {
+        "Cache-Control": f"public, max-age={DERIVED_CACHE_MAX_AGE}, immutable",
+        "ETag": etag,
+        "Vary": "Accept",
+    }
+    inm = request.headers.get("if-none-match", "")
+    if etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return FileResponse(str(path), media_type=FORMATS[fmt][1], headers=headers)
@@ -0,0 +1,26 @@
+from __future__ import annotations
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from app.services.profiling import list_profiles, profile_path, profiling_allowed
+
+router = APIRouter()
+
+def _require_admin(token: Optional[str]) -> None:
+    if not profiling_allowed(token):
+        raise HTTPException(403, "Profiling is disabled or admin token is invalid")
+
+@router.get("/profiles")
+def get_profiles(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return {"items": list_profiles()}
+
+@router.get("/profiles/{name}")
+def download_profile(name: str, x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    p = profile_path(name)
+    if p is None:
+        raise HTTPException(404, "Not found")
+    return FileResponse(str(p), media_type="application/octet-stream", filename=name)
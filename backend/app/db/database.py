@@ -1,11 +1,50 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
-from typing import Iterator
+from typing import Any, AsyncIterator, Dict, Iterator
 from . import __init__ as _  # noqa: F401  (пусть пакет точно считается пакетом)
-from app.settings import DB_URL
+from app.settings import (
+    ASYNC_DB_URL, DB_MAX_OVERFLOW, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS, DB_URL,
+)
 
-engine = create_engine(DB_URL, pool_pre_ping=True, future=True)
+
+def _engine_kwargs(url: str) -> Dict[str, Any]:
+    kw: Dict[str, Any] = {"pool_pre_ping": True}
+    if not url.startswith("sqlite"):
+        kw.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return kw
+
+
+def _install_statement_timeout(sync_engine: Engine) -> None:
+    # MySQL: лимит на время выполнения SELECT для каждой сессии пула.
+    # Только для async-движка горячих эндпоинтов: тяжёлые выборки sync-движка
+    # (/audits/export, /audits/facets, tools/*) ограничивать нельзя
+    if DB_STATEMENT_TIMEOUT_MS <= 0 or sync_engine.dialect.name != "mysql":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_timeout(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute(f"SET SESSION max_execution_time = {int(DB_STATEMENT_TIMEOUT_MS)}")
+        finally:
+            cur.close()
+
+
+engine = create_engine(DB_URL, future=True, **_engine_kwargs(DB_URL))
 SessionLocal = sessionmaker(engine, autoflush=False, autocommit=False, future=True)
+
+async_engine = create_async_engine(ASYNC_DB_URL, **_engine_kwargs(ASYNC_DB_URL))
+_install_statement_timeout(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db() -> Iterator[Session]:
@@ -13,4 +52,9 @@ def get_db() -> Iterator[Session]:
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,191 @@
+"""Помесячные RANGE-партиции таблицы ``audits`` по ``created_at`` (MySQL).
+
+Схема::
+
+    PARTITION BY RANGE COLUMNS(created_at) (
+        PARTITION p202609 VALUES LESS THAN ('2026-10-01'),
+        PARTITION p202610 VALUES LESS THAN ('2026-11-01'),
+        ...
+        PARTITION pmax    VALUES LESS THAN (MAXVALUE)
+    )
+
+MySQL требует, чтобы партиционирующий столбец входил в каждый уникальный
+ключ, поэтому первичный ключ таблицы — ``(id, created_at)``. ORM по-прежнему
+адресует строки по ``id`` (он AUTO_INCREMENT и уникален сам по себе).
+
+На других СУБД (SQLite в разработке) партиций нет: ``list_partitions`` пуст,
+а ``drop_month`` удаляет строки месяца обычным DELETE.
+"""
+from __future__ import annotations
+
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.models import Audit
+
+TABLE = Audit.__tablename__
+MAX_PARTITION = "pmax"
+
+Month = Tuple[int, int]     # (год, месяц)
+
+
+# ========= месяцы =========
+
+def parse_month(s: str) -> Month:
+    """``YYYY-MM`` -> (год, месяц)."""
+    try:
+        d = datetime.strptime(s, "%Y-%m")
+    except ValueError:
+        raise ValueError(f"month must be YYYY-MM, got {s!r}")
+    return d.year, d.month
+
+
+def month_of(d: date) -> Month:
+    return d.year, d.month
+
+
+def add_months(m: Month, n: int) -> Month:
+    k = m[0] * 12 + (m[1] - 1) + n
+    return k // 12, k % 12 + 1
+
+
+def month_start(m: Month) -> datetime:
+    return datetime(m[0], m[1], 1)
+
+
+def month_bounds(m: Month) -> Tuple[datetime, datetime]:
+    """[начало месяца, начало следующего) — как у партиции."""
+    return month_start(m), month_start(add_months(m, 1))
+
+
+def month_label(m: Month) -> str:
+    return f"{m[0]:04d}-{m[1]:02d}"
+
+
+def partition_name(m: Month) -> str:
+    return f"p{m[0]:04d}{m[1]:02d}"
+
+
+def months_between(first: Month, last: Month) -> List[Month]:
+    out, m = [], first
+    while m <= last:
+        out.append(m)
+        m = add_months(m, 1)
+    return out
+
+
+def _partition_ddl(m: Month) -> str:
+    return f"PARTITION {partition_name(m)} VALUES LESS THAN ('{month_start(add_months(m, 1)):%Y-%m-%d}')"
+
+
+# ========= состояние =========
+
+def is_mysql(engine: Engine) -> bool:
+    return engine.dialect.name == "mysql"
+
+
+def list_partitions(conn: Connection) -> List[Dict[str, Any]]:
+    """Партиции audits по порядку: name, bound (или None для pmax), rows (оценка InnoDB)."""
+    if conn.dialect.name != "mysql":
+        return []
+    rows = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS "
+        "FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"
+    ), {"t": TABLE}).all()
+    return [{"name": r[0], "bound": None if r[1] == "MAXVALUE" else str(r[1]).strip("'"), "rows": int(r[2] or 0)}
+            for r in rows]
+
+
+def partition_month(name: str) -> Optional[Month]:
+    if len(name) == 7 and name[0] == "p" and name[1:].isdigit():
+        return int(name[1:5]), int(name[5:7])
+    return None
+
+
+def _data_span(conn: Connection) -> Optional[Tuple[datetime, datetime]]:
+    lo, hi = conn.execute(text(f"SELECT MIN(created_at), MAX(created_at) FROM {TABLE}")).one()
+    return (lo, hi) if lo is not None else None
+
+
+# ========= управление =========
+
+def init_partitioning(engine: Engine, *, ahead: int, today: Optional[date] = None) -> List[str]:
+    """Перевести audits на помесячные партиции (один раз; таблица перестраивается).
+
+    Партиции создаются от месяца самой старой строки до ``ahead`` месяцев вперёд."""
+    if not is_mysql(engine):
+        raise RuntimeError("partitioning is supported on MySQL only")
+    cur = month_of(today or datetime.utcnow().date())
+    with engine.begin() as conn:
+        if list_partitions(conn):
+            raise RuntimeError(f"{TABLE} is already partitioned")
+        span = _data_span(conn)
+        first = month_of(span[0]) if span else cur
+        months = months_between(min(first, cur), add_months(cur, ahead))
+        parts = ",\n  ".join([_partition_ddl(m) for m in months]
+                             + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)"])
+        conn.execute(text(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_at)"))
+        conn.execute(text(f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(created_at) (\n  {parts}\n)"))
+    return [partition_name(m) for m in months]
+
+
+def add_partitions(engine: Engine, *, ahead: int, today: Optional[date] = None) -> List[str]:
+    """Досоздать партиции до ``ahead`` месяцев вперёд (отщеплением от pmax)."""
+    if not is_mysql(engine):
+        return []
+    cur = month_of(today or datetime.utcnow().date())
+    with engine.begin() as conn:
+        parts = list_partitions(conn)
+        if not parts:
+            return []
+        have = [m for m in (partition_month(p["name"]) for p in parts) if m]
+        start = add_months(max(have), 1) if have else cur
+        months = months_between(start, add_months(cur, ahead))
+        if not months:
+            return []
+        ddl = ", ".join([_partition_ddl(m) for m in months]
+                        + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)"])
+        conn.execute(text(f"ALTER TABLE {TABLE} REORGANIZE PARTITION {MAX_PARTITION} INTO ({ddl})"))
+    return [partition_name(m) for m in months]
+
+
+def month_range(conn: Connection, m: Month) -> Tuple[Optional[datetime], datetime]:
+    """Диапазон ``[lo, hi)`` created_at, который удалит ``drop_month`` (``lo=None`` — без нижней границы).
+
+    Партиция хранит всё ниже своей границы и выше границы предыдущей: у первой
+    партиции (предыдущие уже удалены) нижней границы нет — в неё попадают и
+    строки более старых месяцев, вставленные задним числом."""
+    lo, hi = month_bounds(m)
+    parts = list_partitions(conn)
+    names = [p["name"] for p in parts]
+    if partition_name(m) not in names:
+        return lo, hi
+    i = names.index(partition_name(m))
+    return (datetime.fromisoformat(parts[i - 1]["bound"]) if i else None), hi
+
+
+def _range_filter(lo: Optional[datetime], hi: datetime) -> List[Any]:
+    return ([Audit.created_at >= lo] if lo is not None else []) + [Audit.created_at < hi]
+
+
+def drop_month(engine: Engine, m: Month, *, expect: Optional[int] = None) -> str:
+    """Удалить все строки месяца: DROP PARTITION на MySQL, DELETE по диапазону иначе.
+
+    ``expect`` — сколько строк выгружено в архив; если в удаляемом диапазоне
+    (``month_range``) их другое число, ничего не удаляется (RuntimeError)."""
+    with engine.begin() as conn:
+        lo, hi = month_range(conn, m)
+        if expect is not None:
+            n = conn.execute(select(func.count()).select_from(Audit).where(*_range_filter(lo, hi))).scalar_one()
+            if n != expect:
+                raise RuntimeError(f"{month_label(m)}: {n} rows to drop, {expect} archived; not dropped")
+        if partition_name(m) in {p["name"] for p in list_partitions(conn)}:
+            conn.execute(text(f"ALTER TABLE {TABLE} DROP PARTITION {partition_name(m)}"))
+            return "partition"
+        conn.execute(delete(Audit).where(*_range_filter(lo, hi)))
+        return "delete"
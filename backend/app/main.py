@@ -1,5 +1,6 @@
 from __future__ import annotations
 import asyncio
+import logging
 import time
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -8,10 +9,18 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from app.settings import CORS_ORIGINS, ORIGINAL_DIR, PROCESSED_DIR, REPORTS_DIR, UPLOAD_DIR
-from app.db.database import Base, engine
+from app.settings import (
+    AUDIT_PARTITIONS_AHEAD, CORS_ORIGINS, DERIVED_DIR, ORIGINAL_DIR, PROCESSED_DIR, RAW_DIR, REPORTS_DIR, UPLOAD_DIR,
+)
+from app.db.database import Base, async_engine, engine
+from app.db.partitions import add_partitions, is_mysql
+from app.api.compression import CompressionMiddleware
+from app.api.responses import AcceptNegotiationMiddleware, FastResponse
 from app.api.routes_infer import router as infer_router
 from app.api.routes_audits import router as audits_router
+from app.api.routes_media import router as media_router
+from app.api.routes_profiles import router as profiles_router
+from app.services import derivatives
 
 # создаём таблицы
 Base.metadata.create_all(engine)
@@ -21,26 +30,44 @@ async def cleanup_uploads():
     while True:
         now = time.time()
         cutoff = 60 * 60  # 1 час
-        for folder in (ORIGINAL_DIR, PROCESSED_DIR, REPORTS_DIR):
+        for folder in (ORIGINAL_DIR, PROCESSED_DIR, REPORTS_DIR, DERIVED_DIR, RAW_DIR):
             for p in Path(folder).glob("*"):
                 try:
                     if p.is_file() and now - p.stat().st_mtime > cutoff:
                         p.unlink()
+                        derivatives.forget(p)
                 except Exception:
                     pass 
         await asyncio.sleep(300)
 
+# партиции audits на месяцы вперёд (если таблица партиционирована, см. tools/partitions.py)
+async def ensure_partitions():
+    if not is_mysql(engine):
+        return
+    while True:
+        try:
+            await asyncio.to_thread(add_partitions, engine, ahead=AUDIT_PARTITIONS_AHEAD)
+        except Exception as e:
+            logging.getLogger(__name__).warning("partition maintenance failed: %s", e)
+        await asyncio.sleep(24 * 60 * 60)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    task = asyncio.create_task(cleanup_uploads())
+    tasks = [asyncio.create_task(cleanup_uploads()), asyncio.create_task(ensure_partitions())]
     yield
-    task.cancel()
-    try:
-        await task
-    except asyncio.CancelledError:
-        pass
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await async_engine.dispose()
+
+app = FastAPI(title="Silex Core API", version="4.0.0", lifespan=lifespan, default_response_class=FastResponse)
 
-app = FastAPI(title="Silex Core API", version="4.0.0", lifespan=lifespan)
+# сжатие и выбор формата ответа (JSON / MessagePack); CORS — самый внешний
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+app.add_middleware(AcceptNegotiationMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -56,3 +83,5 @@ app.mount("/static", StaticFiles(directory=str(UPLOAD_DIR)), name="static")
 # роуты
 app.include_router(infer_router)
 app.include_router(audits_router)
+app.include_router(media_router)
+app.include_router(profiles_router)
@@ -0,0 +1,169 @@
+"""Архив холодных месяцев ``audits``: один ``audits_YYYY-MM.ndjson.gz`` на месяц.
+
+Строка файла — одна запись аудита в том же виде, что отдаёт экспорт
+(``audit_row``). Файл пишется во временный и переименовывается, так что
+неполный архив никогда не виден читателям; месяц удаляется из БД только
+после того, как записанный файл перечитан и число строк совпало.
+"""
+from __future__ import annotations
+
+import gzip
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.db.models import Audit
+from app.db.partitions import Month, drop_month, month_bounds, month_label, month_of, month_range, parse_month
+from app.services.serialization import dumps_json, loads_json
+from app.settings import ARCHIVE_DIR
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def audit_row(a: Audit) -> Dict[str, Any]:
+    try:
+        missing = loads_json(a.missing_tools)
+    except Exception:
+        missing = []
+    try:
+        extras = loads_json(a.extras_or_duplicates)
+    except Exception:
+        extras = []
+    return {
+        "id": a.id,
+        "image_uid": a.image_uid,
+        "employee_id": a.employee_id,
+        "created_at": a.created_at.strftime(TS_FORMAT),
+        "total_detections": a.total_detections,
+        "all_tools_present": a.all_tools_present,
+        "min_confidence": float(a.min_confidence),
+        "manual_check_required": a.manual_check_required,
+        "missing_tools": missing,
+        "extras_or_duplicates": extras,
+        "original_url": a.original_url,
+        "processed_url": a.processed_url,
+        "report_url": a.report_url,
+    }
+
+
+# ========= файлы =========
+
+def archive_path(m: Month, base: Path = ARCHIVE_DIR) -> Path:
+    return base / f"audits_{month_label(m)}.ndjson.gz"
+
+
+def archived_months(base: Path = ARCHIVE_DIR) -> List[Month]:
+    out: List[Month] = []
+    for p in base.glob("audits_*.ndjson.gz"):
+        try:
+            out.append(parse_month(p.name[len("audits_"):-len(".ndjson.gz")]))
+        except ValueError:
+            continue
+    return sorted(out)
+
+
+def iter_archived(m: Month, base: Path = ARCHIVE_DIR) -> Iterator[Dict[str, Any]]:
+    p = archive_path(m, base)
+    if not p.exists():
+        return
+    with gzip.open(p, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield loads_json(line)
+
+
+def write_month(rows: Iterable[Dict[str, Any]], m: Month, base: Path = ARCHIVE_DIR) -> int:
+    base.mkdir(parents=True, exist_ok=True)
+    out = archive_path(m, base)
+    tmp = out.with_name(out.name + f".{os.getpid()}.tmp")
+    n = 0
+    with open(tmp, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9, mtime=0) as f:
+        for r in rows:
+            f.write(dumps_json(r) + b"\n")
+            n += 1
+        f.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, out)
+    return n
+
+
+# ========= архивирование месяца =========
+
+def archive_month(engine: Engine, m: Month, *, drop: bool = True, base: Path = ARCHIVE_DIR,
+                  batch: int = 5000) -> Dict[str, Any]:
+    """Выгрузить месяц в архив и (по умолчанию) удалить его из БД.
+
+    Выгружается ровно то, что удалит ``drop_month`` (``month_range``); строки
+    более старых месяцев из первой партиции попадают в архивы своих месяцев.
+    Если архив месяца уже есть (повторный запуск), новые строки дописываются
+    к нему — по ``id`` без дублей."""
+    with engine.connect() as conn:
+        lo, hi = month_range(conn, m)
+    by_month: Dict[Month, Dict[int, Dict[str, Any]]] = {m: {r["id"]: r for r in iter_archived(m, base)}}
+    n_db = 0
+    with Session(engine) as db:
+        if engine.dialect.name == "mysql":
+            # выгрузка месяца дольше лимита на SELECT из DB_STATEMENT_TIMEOUT_MS
+            db.execute(text("SET SESSION max_execution_time = 0"))
+        # диапазон по created_at — MySQL читает только партицию этого месяца
+        q = select(Audit).order_by(Audit.id).execution_options(yield_per=batch)
+        if lo is not None:
+            q = q.where(Audit.created_at >= lo)
+        for a in db.scalars(q.where(Audit.created_at < hi)):
+            am = month_of(a.created_at)
+            if am not in by_month:
+                by_month[am] = {r["id"]: r for r in iter_archived(am, base)}
+            by_month[am][a.id] = audit_row(a)
+            n_db += 1
+    for am, rows in sorted(by_month.items()):
+        written = write_month((rows[k] for k in sorted(rows)), am, base)
+        check = sum(1 for _ in iter_archived(am, base))
+        if check != written:
+            raise RuntimeError(f"archive {archive_path(am, base)}: wrote {written}, read back {check}")
+    how = drop_month(engine, m, expect=n_db) if drop else None
+    return {"month": month_label(m), "rows": len(by_month[m]), "db_rows": n_db, "dropped": how,
+            "file": str(archive_path(m, base)),
+            "also": [month_label(am) for am in sorted(by_month) if am != m]}
+
+
+# ========= чтение для экспорта =========
+
+def _overlaps(m: Month, date_from: Optional[datetime], date_to: Optional[datetime]) -> bool:
+    lo, hi = month_bounds(m)
+    return (date_to is None or lo < date_to) and (date_from is None or hi > date_from)
+
+
+def query_archive(*, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None,
+                  employee_search: Optional[str] = None, employees: Optional[List[str]] = None,
+                  manual: Optional[str] = None, base: Path = ARCHIVE_DIR) -> List[Dict[str, Any]]:
+    """Архивные записи с теми же фильтрами, что ``apply_filters``; новые первыми (id desc).
+    ``date_to`` — исключающая граница. Читаются только месяцы, пересекающие диапазон."""
+    needle = employee_search.lower() if employee_search else None
+    allowed = set(employees) if employees else None
+    out: List[Dict[str, Any]] = []
+    for m in archived_months(base):
+        if not _overlaps(m, date_from, date_to):
+            continue
+        for r in iter_archived(m, base):
+            ts = datetime.strptime(r["created_at"], TS_FORMAT)
+            if date_from is not None and ts < date_from:
+                continue
+            if date_to is not None and ts >= date_to:
+                continue
+            if needle and needle not in str(r["employee_id"]).lower():
+                continue
+            if allowed is not None and r["employee_id"] not in allowed:
+                continue
+            if manual == "yes" and not r["manual_check_required"]:
+                continue
+            if manual == "no" and r["manual_check_required"]:
+                continue
+            out.append(r)
+    out.sort(key=lambda r: r["id"], reverse=True)
+    return out
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+from app.settings import (
+    DERIVED_DIR, DERIVED_JPEG_QUALITY, DERIVED_SIZES, DERIVED_WEBP_QUALITY,
+    ORIGINAL_DIR, PROCESSED_DIR,
+)
+
+# ========= источники и форматы =========
+SOURCE_DIRS: Dict[str, Path] = {"original": ORIGINAL_DIR, "processed": PROCESSED_DIR}
+FORMATS: Dict[str, Tuple[str, str]] = {      # fmt -> (расширение, media type)
+    "jpeg": ("jpg", "image/jpeg"),
+    "webp": ("webp", "image/webp"),
+}
+
+# блокировка живёт, пока её держит хотя бы один сборщик, — словарь не растёт
+_locks: "weakref.WeakValueDictionary[str, threading.Lock]" = weakref.WeakValueDictionary()
+_locks_guard = threading.Lock()
+# path -> (mtime_ns, size, etag); LRU, записи удалённых файлов снимает forget()
+_etags: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+_etags_guard = threading.Lock()
+ETAG_CACHE_SIZE = 4096
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def resolve_source(kind: str, name: str) -> Optional[Path]:
+    base = SOURCE_DIRS.get(kind)
+    if base is None or Path(name).name != name:
+        return None
+    p = base / name
+    return p if p.is_file() else None
+
+
+def derived_path(kind: str, src: Path, size: str, fmt: str) -> Path:
+    ext, _ = FORMATS[fmt]
+    return DERIVED_DIR / f"{kind}_{src.stem}_{size}.{ext}"
+
+
+def _is_fresh(p: Path, src: Path) -> bool:
+    try:
+        return p.stat().st_mtime_ns >= src.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _save(im: Image.Image, out: Path, fmt: str) -> None:
+    tmp = out.with_name(out.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    if fmt == "webp":
+        im.save(str(tmp), "WEBP", quality=DERIVED_WEBP_QUALITY, method=4)
+    else:
+        im.save(str(tmp), "JPEG", quality=DERIVED_JPEG_QUALITY, optimize=True, progressive=True)
+    os.replace(tmp, out)
+
+
+def build_ladder(kind: str, src: Path, *, with_full: bool = False) -> None:
+    """Лестница размеров в JPEG и WebP за одно декодирование.
+
+    Без ``with_full`` строятся только уменьшенные версии, и JPEG декодируется
+    сразу в пониженном масштабе (``draft``) — превью не ждёт полноразмерного WebP.
+    Уменьшенные версии строятся каскадом от предыдущей."""
+    sizes = [(k, v) for k, v in DERIVED_SIZES.items() if with_full or v is not None]
+    sizes.sort(key=lambda kv: -(kv[1] or 10**9))     # от большего к меньшему
+    with Image.open(str(src)) as im0:
+        if not with_full and sizes:
+            side = sizes[0][1]
+            im0.draft("RGB", (side, side))
+        cur = im0.convert("RGB")
+    for size, max_side in sizes:
+        if max_side is not None and max(cur.size) > max_side:
+            cur = cur.copy()
+            cur.thumbnail((max_side, max_side), Image.LANCZOS)
+        for fmt in FORMATS:
+            if size == "full" and fmt == "jpeg" and src.suffix.lower() in (".jpg", ".jpeg"):
+                continue   # исходный JPEG отдаётся как есть
+            _save(cur, derived_path(kind, src, size, fmt), fmt)
+
+
+def get_derivative(kind: str, name: str, size: str, fmt: str) -> Optional[Path]:
+    src = resolve_source(kind, name)
+    if src is None or size not in DERIVED_SIZES or fmt not in FORMATS:
+        return None
+    if size == "full" and fmt == "jpeg" and src.suffix.lower() in (".jpg", ".jpeg"):
+        return src
+    out = derived_path(kind, src, size, fmt)
+    if _is_fresh(out, src):
+        return out
+    with _lock_for(f"{kind}/{src.name}"):
+        if not _is_fresh(out, src):        # пока ждали блокировку, мог собрать другой поток
+            build_ladder(kind, src, with_full=(size == "full"))
+    return out
+
+
+def etag_for(p: Path) -> str:
+    st = p.stat()
+    key = str(p)
+    with _etags_guard:
+        hit = _etags.get(key)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            _etags.move_to_end(key)
+            return hit[2]
+    h = hashlib.blake2b(digest_size=16)
+    with p.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    tag = f'"{h.hexdigest()}"'
+    with _etags_guard:
+        _etags[key] = (st.st_mtime_ns, st.st_size, tag)
+        _etags.move_to_end(key)
+        while len(_etags) > ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return tag
+
+
+def forget(p: Path) -> None:
+    """Снять закэшированный ETag файла (его удалила очистка uploads)."""
+    with _etags_guard:
+        _etags.pop(str(p), None)
+
+
+def remove_derivatives(kind: str, src: Optional[Path]) -> None:
+    if src is None:
+        return
+    for size in DERIVED_SIZES:
+        for fmt in FORMATS:
+            p = derived_path(kind, src, size, fmt)
+            forget(p)
+            try:
+                p.unlink(missing_ok=True)
+            except Exception:
+                pass
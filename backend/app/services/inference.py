@@ -1,22 +1,75 @@
 from __future__ import annotations
 
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
-import colorsys
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 import math
 
 import cv2
 import numpy as np
-from PIL import Image, ImageDraw, ImageFont
 from ultralytics import YOLO
 
-from app.settings import DET_MODEL_PATH, SEG_MODEL_PATH, DOP_MODEL_PATH
+from app.settings import (
+    DET_MODEL_PATH, SEG_MODEL_PATH, DOP_MODEL_PATH,
+    DET_MODEL_INT8_PATH, SEG_MODEL_INT8_PATH, DOP_MODEL_INT8_PATH,
+    RAW_FLOOR_CONF, LAYOUT_ROI_ENABLED, LAYOUT_ROI_IMGSZ,
+    DET_IMGSZ, SEG_FALLBACK_IMGSZ, DOP_IMGSZ, KOLOVOROT_FALLBACK, DOP_FALLBACK,
+)
+from app.services import layout_prior, render
+from app.services.profiling import NULL_TIMER, StageTimer
+from app.services.raw_store import MissingPass
+from app.services.quant_gate import resolve_model_path
+from app.services.render import color_map
 # ========== загрузка моделей ==========
-DET_MODEL = YOLO(str(DET_MODEL_PATH))
-SEG_MODEL: Optional[YOLO] = YOLO(
-    str(SEG_MODEL_PATH)) if SEG_MODEL_PATH.exists() else None
-DOP_MODEL: Optional[YOLO] = YOLO(
-    str(DOP_MODEL_PATH)) if DOP_MODEL_PATH.exists() else None
+
+
+def load_model(fp32_path: Path, int8_path: Path, task: str) -> YOLO:
+    path = resolve_model_path(fp32_path, int8_path)
+    # для ONNX ultralytics не может узнать задачу из файла
+    return YOLO(str(path), task=task) if path.suffix == ".onnx" else YOLO(str(path))
+
+
+DET_MODEL = load_model(DET_MODEL_PATH, DET_MODEL_INT8_PATH, "detect")
+SEG_MODEL: Optional[YOLO] = load_model(
+    SEG_MODEL_PATH, SEG_MODEL_INT8_PATH, "segment") if SEG_MODEL_PATH.exists() else None
+DOP_MODEL: Optional[YOLO] = load_model(
+    DOP_MODEL_PATH, DOP_MODEL_INT8_PATH, "detect") if DOP_MODEL_PATH.exists() else None
+
+
+@contextmanager
+def override_models(det: Optional[YOLO] = None, seg: Optional[YOLO] = None,
+                    dop: Optional[YOLO] = None) -> Iterator[None]:
+    """Временная подмена моделей пайплайна — для офлайн-инструментов
+    (сравнение FP32/INT8, оценка конфигураций). Не потокобезопасно."""
+    global DET_MODEL, SEG_MODEL, DOP_MODEL
+    saved = (DET_MODEL, SEG_MODEL, DOP_MODEL)
+    DET_MODEL = det or DET_MODEL
+    SEG_MODEL = seg or SEG_MODEL
+    DOP_MODEL = dop or DOP_MODEL
+    try:
+        yield
+    finally:
+        DET_MODEL, SEG_MODEL, DOP_MODEL = saved
+
+# параметры пайплайна, которые можно подменить через override_pipeline
+PIPELINE_PARAMS = ("DET_IMGSZ", "SEG_FALLBACK_IMGSZ", "DOP_IMGSZ",
+                   "KOLOVOROT_FALLBACK", "DOP_FALLBACK", "LAYOUT_ROI_ENABLED")
+
+
+@contextmanager
+def override_pipeline(**params: Any) -> Iterator[None]:
+    """Временная подмена ``PIPELINE_PARAMS`` (imgsz, fallback-и) — для
+    офлайн-оценки конфигураций. Не потокобезопасно."""
+    unknown = set(params) - set(PIPELINE_PARAMS)
+    if unknown:
+        raise ValueError(f"unknown pipeline params: {', '.join(sorted(unknown))}")
+    g = globals()
+    saved = {k: g[k] for k in params}
+    g.update(params)
+    try:
+        yield
+    finally:
+        g.update(saved)
 
 # ========= RU-имена + канонизация SEG =========
 RU_NAME_MAP: Dict[str, str] = {
@@ -38,7 +91,9 @@ RU_NAME_MAP: Dict[str, str] = {
     "rozh-key":       "Ключ рожковый накидной 3/4",
 }
 
-CLASS_ORDER: List[str] = list(DET_MODEL.model.names.values())
+# model.names, а не model.model.names: у ONNX (INT8) в .model лежит путь к файлу,
+# имена ultralytics читает из метаданных экспорта — порядок тот же, что у .pt
+CLASS_ORDER: List[str] = [DET_MODEL.names[i] for i in sorted(DET_MODEL.names)]
 
 # seg->det
 SEG_TO_DET_CANON: Dict[str, str] = {
@@ -48,39 +103,13 @@ SEG_TO_DET_CANON: Dict[str, str] = {
     # остальные совпадают
 }
 
-# ========= цветовая палитра =========
-
-
-def build_palette(n: int, s: float = 0.85, v: float = 0.95) -> List[Tuple[int, int, int]]:
-    out = []
-    for i in range(n):
-        h = i / max(1, n)
-        r, g, b = colorsys.hsv_to_rgb(h, s, v)
-        out.append((int(r * 255), int(g * 255), int(b * 255)))
-    return out
-
-
-COLOR_PALETTE = build_palette(len(CLASS_ORDER))
-COLOR_MAP = {name: COLOR_PALETTE[i] for i, name in enumerate(CLASS_ORDER)}
+# ========= цвета / отрисовка (app/services/render.py) =========
+COLOR_MAP = color_map(tuple(CLASS_ORDER))
 
 
 def class_rgb(name_en: str) -> Tuple[int, int, int]:
     return COLOR_MAP.get(name_en, (255, 255, 255))
 
-
-# ========= шрифт =========
-FONT_CANDIDATES = [
-    Path("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
-    Path("/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf"),
-]
-
-
-def load_font(size: int = 22) -> ImageFont.FreeTypeFont:
-    for p in FONT_CANDIDATES:
-        if p.exists():
-            return ImageFont.truetype(str(p), size=size)
-    return ImageFont.load_default()
-
 # ========= геометрия / NMS =========
 
 
@@ -193,13 +222,25 @@ def classwise_nms(dets: List[Dict[str, Any]], default_iou: float = 0.55, default
 
 # ========= yolo utils =========
 
+# путь к файлу или уже декодированный BGR-кадр (один раз на запрос)
+ImageSource = Union[str, Path, np.ndarray]
+
 
-def yolo_detect_boxes(model: YOLO, image_path: str, conf: float, iou: float = 0.65) -> Dict[str, Any]:
+def _source(image: ImageSource) -> Union[str, np.ndarray]:
+    return image if isinstance(image, np.ndarray) else str(image)
+
+
+
+def yolo_detect_boxes(model: YOLO, image_path: ImageSource, conf: float, iou: float = 0.65,
+                      imgsz: Optional[int] = None) -> Dict[str, Any]:
     results = model.predict(
-        source=image_path, conf=conf, iou=iou,
-        imgsz=1280, max_det=300, agnostic_nms=True, verbose=False,
+        source=_source(image_path), conf=conf, iou=iou,
+        imgsz=imgsz or DET_IMGSZ, max_det=300, agnostic_nms=True, verbose=False,
     )
-    r = results[0]
+    return _result_dets(results[0])
+
+
+def _result_dets(r) -> Dict[str, Any]:
     names = r.names
     w, h = r.orig_shape[1], r.orig_shape[0]
     dets: List[Dict[str, Any]] = []
@@ -231,11 +272,11 @@ def yolo_detect_boxes(model: YOLO, image_path: str, conf: float, iou: float = 0.
     return {"w": w, "h": h, "detections": dets}
 
 
-def seg_kolovorot_box(image_path: str, conf: float) -> Optional[Dict[str, Any]]:
+def seg_kolovorot_box(image_path: ImageSource, conf: float) -> Optional[Dict[str, Any]]:
     if SEG_MODEL is None:
         return None
     results = SEG_MODEL.predict(
-        source=image_path, conf=conf, iou=0.5, imgsz=960, max_det=20, verbose=False)
+        source=_source(image_path), conf=conf, iou=0.5, imgsz=SEG_FALLBACK_IMGSZ, max_det=20, verbose=False)
     if not results:
         return None
     r = results[0]
@@ -260,6 +301,46 @@ def seg_kolovorot_box(image_path: str, conf: float) -> Optional[Dict[str, Any]]:
     return best
 
 
+def dop_roi_detect(image_path: ImageSource, classes: List[str],
+                   timer: Optional[StageTimer] = None) -> Optional[List[Dict[str, Any]]]:
+    """DOP только по кропам ожидаемых мест ``classes`` (карта раскладки), одним батчем.
+
+    Кропы берутся из кадра в исходном разрешении и подаются с ``LAYOUT_ROI_IMGSZ``,
+    так что мелкие инструменты получают больше пикселей, чем при 1280 на весь кадр.
+    None — для какого-то класса карта ещё не обучена (нужен проход по всему кадру)."""
+    t = timer or NULL_TIMER
+    if not LAYOUT_ROI_ENABLED or DOP_MODEL is None or not classes:
+        return None
+    bgr = image_path if isinstance(image_path, np.ndarray) else cv2.imread(str(image_path))
+    if bgr is None:
+        return None
+    H, W = bgr.shape[:2]
+    prior = layout_prior.current()
+    rois = [prior.region(c, W, H) for c in classes]
+    if any(r is None for r in rois):
+        return None
+
+    t.note("dop_rois", len(rois))
+    t.note("dop_roi_pixels", sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in rois))
+    crops = [np.ascontiguousarray(bgr[y1:y2, x1:x2]) for x1, y1, x2, y2 in rois]
+    with t.stage("dop_roi"):
+        results = DOP_MODEL.predict(
+            source=crops, conf=0.50, iou=0.65,
+            imgsz=LAYOUT_ROI_IMGSZ, max_det=50, agnostic_nms=True, verbose=False,
+        )
+    found: List[Dict[str, Any]] = []
+    for cls, (x1, y1, _, _), r in zip(classes, rois, results):
+        for d in _result_dets(r)["detections"]:
+            if d["class_name"] != cls:
+                continue    # соседи из кропа — не то, что искали в этой области
+            bx1, by1, bx2, by2 = d["bbox_xyxy"]
+            d["bbox_xyxy"] = [bx1 + x1, by1 + y1, bx2 + x1, by2 + y1]
+            found.append(d)
+    t.note("nms_dop_in", len(found))
+    with t.stage("nms_dop"):
+        return classwise_nms(found, default_iou=0.55, default_contain=0.90)
+
+
 # ========= сводка =========
 REQUIRED_CLASSES: List[str] = CLASS_ORDER
 
@@ -290,95 +371,112 @@ def make_summary(dets: List[Dict[str, Any]], check_thr: float) -> Dict[str, Any]
 # ========= отрисовка =========
 
 
-def draw_custom(image_path: Path, dets: List[Dict[str, Any]], render_thr: float,
+def draw_custom(image_path: ImageSource, dets: List[Dict[str, Any]], render_thr: float,
                 draw_boxes: bool, draw_labels: bool, out_path: Path, *, draw_masks: bool = False) -> None:
-    bgr = cv2.imread(str(image_path))
+    bgr = image_path if isinstance(image_path, np.ndarray) else cv2.imread(str(image_path))
     if bgr is None:
         raise RuntimeError(f"Can't read image: {image_path}")
-    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
-    im = Image.fromarray(rgb)
-    draw = ImageDraw.Draw(im, "RGBA")
-
-    H, W = bgr.shape[:2]
-    box_thickness = max(4, int(min(W, H) * 0.006))
-    font_size = max(20, int(min(W, H) * 0.028))
-    font = load_font(size=font_size)
-    pad = max(6, box_thickness)
-
-    for d in dets:
-        if d["confidence"] < render_thr:
-            continue
-        x1, y1, x2, y2 = [int(round(t)) for t in d["bbox_xyxy"]]
-        en_name = d["class_name"]
-        ru_name = d.get("class_name_ru") or en_name
-        conf_frac = max(0.0, min(1.0, float(d["confidence"])))
-        color = class_rgb(en_name)
-        label = f"{ru_name} {conf_frac:.2f}"
-
-        if draw_masks and d.get("mask"):
-            poly = [(float(px), float(py)) for px, py in d["mask"]]
-            draw.polygon(poly, fill=(color[0], color[1], color[2], 90))
-        if draw_boxes:
-            for off in range(box_thickness):
-                draw.rectangle(
-                    [(x1-off, y1-off), (x2+off, y2+off)], outline=color)
-        if draw_labels:
-            x0, y0, x3, y3 = draw.textbbox((0, 0), label, font=font)
-            tw, th = (x3-x0), (y3-y0)
-            bx = max(0, min(x1, W - tw - pad*2))
-            by = max(0, y1 - th - pad*2)
-            draw.rectangle([(bx, by), (bx+tw+pad*2, by+th+pad*2)],
-                           fill=(color[0], color[1], color[2], 220))
-            draw.text((bx+pad, by+pad), label, font=font, fill=(255, 255, 255, 255),
-                      stroke_width=max(1, box_thickness//3), stroke_fill=(0, 0, 0, 200))
-    out_bgr = cv2.cvtColor(np.array(im), cv2.COLOR_RGB2BGR)
-    cv2.imwrite(str(out_path), out_bgr)
+    render.draw_custom(bgr, dets, render_thr, draw_boxes, draw_labels, out_path,
+                       colors=COLOR_MAP, draw_masks=draw_masks)
 
 # ========= основной пайплайн =========
 
 
-def run_pipeline(image_path: Path, *, model_kind: str, check_thr: float) -> Dict[str, Any]:
+def _canon_seg(dets: List[Dict[str, Any]]) -> None:
+    # нормализация SEG имён в канонические
+    for d in dets:
+        en = d["class_name"]
+        canon = SEG_TO_DET_CANON.get(en, en)
+        if canon != en:
+            d["class_name"] = canon
+            d["class_name_ru"] = RU_NAME_MAP.get(canon, canon)
+            try:
+                d["class_id"] = CLASS_ORDER.index(canon)
+            except ValueError:
+                pass
+
+
+def detect_raw(image_path: ImageSource, *, model_kind: str, floor_conf: float = RAW_FLOOR_CONF,
+               timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    """Основной проход модели с низким порогом ``floor_conf`` — без NMS и сводки.
+
+    Всё, что зависит от check_thr, делает ``resolve``; fallback-проходы
+    (коловорот из SEG, DOP) запускаются там же и только когда нужны."""
+    t = timer or NULL_TIMER
     model = DET_MODEL if model_kind != "seg" else SEG_MODEL
     if model is None:
         raise RuntimeError("Segmentation model not available")
 
-    pred = yolo_detect_boxes(model, str(image_path), conf=check_thr, iou=0.65)
-    dets: List[Dict[str, Any]] = pred["detections"]
-
-    # нормализация SEG имён в канонические
+    with t.stage(model_kind):
+        pred = yolo_detect_boxes(model, image_path, conf=floor_conf, iou=0.65)
     if model_kind == "seg":
-        for d in dets:
-            en = d["class_name"]
-            canon = SEG_TO_DET_CANON.get(en, en)
-            if canon != en:
-                d["class_name"] = canon
-                d["class_name_ru"] = RU_NAME_MAP.get(canon, canon)
-                try:
-                    d["class_id"] = CLASS_ORDER.index(canon)
-                except ValueError:
-                    pass
-
-    dets = classwise_nms(dets, default_iou=0.55, default_contain=0.90)
+        _canon_seg(pred["detections"])
+    return {"w": pred["w"], "h": pred["h"], "model_kind": model_kind,
+            "floor_conf": float(floor_conf), "main": pred["detections"]}
+
+
+def _dop_covered(raw: Dict[str, Any], cls: str) -> bool:
+    return "dop" in raw and ("dop_classes" not in raw or cls in raw["dop_classes"])
+
+
+def _need_pass(raw: Dict[str, Any], key: str, image_path: Optional[ImageSource],
+               skipped: Optional[List[str]]) -> bool:
+    """Есть ли в raw результат прохода ``key``; без кадра — MissingPass
+    (или пропуск с записью в ``skipped``, если он передан)."""
+    if key in raw:
+        return True
+    if image_path is None:
+        if skipped is not None:
+            skipped.append(key)
+            return False
+        raise MissingPass(key)
+    return True
+
+
+def resolve(raw: Dict[str, Any], check_thr: float, *, image_path: Optional[ImageSource] = None,
+            timer: Optional[StageTimer] = None, allow_missing: bool = False) -> Dict[str, Any]:
+    """Детекции и сводка для порога ``check_thr`` по сырым детекциям.
+
+    Недостающие проходы (коловорот, DOP, основной при check_thr ниже floor_conf)
+    выполняются по ``image_path`` и дописываются в ``raw`` (``raw_updated``);
+    без кадра — ``MissingPass``. ``allow_missing`` — пропустить их (черновой
+    результат, пропущенные проходы — в ``skipped``)."""
+    t = timer or NULL_TIMER
+    model_kind = raw["model_kind"]
+    updated = False
+    skipped: Optional[List[str]] = [] if allow_missing else None
+
+    if check_thr < raw["floor_conf"] and _need_pass({}, "main", image_path, skipped):
+        # сохранены только детекции не ниже floor_conf — основной проход заново
+        raw.update(detect_raw(image_path, model_kind=model_kind, floor_conf=check_thr, timer=timer))
+        raw.pop("kolovorot", None)
+        updated = True
+
+    dets = [d for d in raw["main"] if d["confidence"] >= check_thr]
+    t.note("nms_main_in", len(dets))
+    with t.stage("nms_main"):
+        dets = classwise_nms(dets, default_iou=0.55, default_contain=0.90)
 
     # det: fallback kolovorot через сегментацию
-    if model_kind == "det":
+    if model_kind == "det" and KOLOVOROT_FALLBACK:
         has_kolo = [d for d in dets if d["class_name"] ==
                     "kolovorot" and d["confidence"] >= check_thr]
-        if not has_kolo:
-            seg_best = seg_kolovorot_box(str(image_path), conf=check_thr)
-            if seg_best:
+        if not has_kolo and _need_pass(raw, "kolovorot", image_path, skipped):
+            if "kolovorot" not in raw:
+                with t.stage("kolovorot_fallback"):
+                    raw["kolovorot"] = seg_kolovorot_box(image_path, conf=raw["floor_conf"])
+                updated = True
+            seg_best = raw["kolovorot"]
+            if seg_best and seg_best["confidence"] >= check_thr:
                 dets = [d for d in dets if d["class_name"] != "kolovorot"]
                 dets.append(seg_best)
 
-    summary = make_summary(dets, check_thr=check_thr)
+    with t.stage("summary"):
+        summary = make_summary(dets, check_thr=check_thr)
 
     # доп.модель — только для детекции
-    if (summary["missing_tools"] or summary["extras_or_duplicates"]) and DOP_MODEL is not None and model_kind == "det":
-        dop_pred = yolo_detect_boxes(
-            DOP_MODEL, str(image_path), conf=0.50, iou=0.65)
-        dop_dets = classwise_nms(
-            dop_pred["detections"], default_iou=0.55, default_contain=0.90)
-
+    if ((summary["missing_tools"] or summary["extras_or_duplicates"]) and DOP_MODEL is not None
+            and model_kind == "det" and DOP_FALLBACK):
         by_class: Dict[str, int] = {}
         for d in dets:
             if d["confidence"] >= check_thr:
@@ -386,6 +484,26 @@ def run_pipeline(image_path: Path, *, model_kind: str, check_thr: float) -> Dict
                     d["class_name"], 0) + 1
         missing_en = [c for c in REQUIRED_CLASSES if by_class.get(c, 0) == 0]
 
+        # порог DOP фиксирован (0.50) и от check_thr не зависит — в raw хранится после NMS.
+        # "dop_classes" — для каких классов DOP запускался по кропам (нет ключа — по всему кадру)
+        todo = [c for c in missing_en if not _dop_covered(raw, c)]
+        if todo and _need_pass({}, "dop", image_path, skipped):
+            roi_dets = dop_roi_detect(image_path, todo, timer=timer)
+            if roi_dets is not None:
+                raw["dop"] = raw.get("dop", []) + roi_dets
+                raw["dop_classes"] = sorted(set(raw.get("dop_classes", [])) | set(todo))
+            else:
+                with t.stage("dop"):
+                    dop_pred = yolo_detect_boxes(
+                        DOP_MODEL, image_path, conf=0.50, iou=0.65, imgsz=DOP_IMGSZ)
+                t.note("nms_dop_in", len(dop_pred["detections"]))
+                with t.stage("nms_dop"):
+                    raw["dop"] = classwise_nms(
+                        dop_pred["detections"], default_iou=0.55, default_contain=0.90)
+                raw.pop("dop_classes", None)
+            updated = True
+        dop_dets = raw.get("dop", [])
+
         for cls_name in missing_en:
             cand = None
             best = -1.0
@@ -407,7 +525,25 @@ def run_pipeline(image_path: Path, *, model_kind: str, check_thr: float) -> Dict
             if ok:
                 dets.append(cand)
 
-        dets = classwise_nms(dets, default_iou=0.55, default_contain=0.90)
-        summary = make_summary(dets, check_thr=check_thr)
+        with t.stage("nms_merge"):
+            dets = classwise_nms(dets, default_iou=0.55, default_contain=0.90)
+        with t.stage("summary"):
+            summary = make_summary(dets, check_thr=check_thr)
+
+    return {"w": raw["w"], "h": raw["h"], "detections": dets, "summary": summary,
+            "raw_updated": updated, "skipped": skipped or []}
 
-    return {"w": pred["w"], "h": pred["h"], "detections": dets, "summary": summary}
+
+def run_pipeline(image_path: ImageSource, *, model_kind: str, check_thr: float,
+                 timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    """Полный прогон: сырые детекции с floor_conf + разбор под check_thr.
+
+    ``raw`` в результате — для сохранения (app/services/raw_store.py) и
+    последующего пересчёта порогов без инференса."""
+    raw = detect_raw(image_path, model_kind=model_kind,
+                     floor_conf=min(RAW_FLOOR_CONF, check_thr), timer=timer)
+    out = resolve(raw, check_thr, image_path=image_path, timer=timer)
+    out.pop("raw_updated")
+    out.pop("skipped")
+    out["raw"] = raw
+    return out
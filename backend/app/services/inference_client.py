@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import pickle
+import queue
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.services.inference_server import parse_address, put_image
+from app.services.profiling import StageTimer
+from app.services.raw_store import MissingPass
+from app.settings import INFERENCE_SERVER, INFERENCE_SERVER_AUTHKEY, INFERENCE_SERVER_TIMEOUT
+
+
+class InferenceServerUnavailable(Exception):
+    """Сервер инференса не отвечает (не запущен, упал, таймаут)."""
+
+
+class InferenceClient:
+    """Пул соединений к серверу инференса (одно соединение — один запрос за раз)."""
+
+    def __init__(self, address: str = INFERENCE_SERVER, authkey: bytes = INFERENCE_SERVER_AUTHKEY,
+                 timeout: float = INFERENCE_SERVER_TIMEOUT):
+        self.address = parse_address(address)
+        self.authkey = authkey or None     # пустой ключ — сервер без аутентификации
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[Connection]" = queue.LifoQueue()
+
+    def _acquire(self) -> Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except (OSError, EOFError) as e:
+                raise InferenceServerUnavailable(f"inference server {self.address}: {e}") from e
+            except AuthenticationError as e:
+                raise InferenceServerUnavailable(
+                    f"inference server {self.address}: INFERENCE_SERVER_AUTHKEY rejected") from e
+
+    def call(self, msg: Dict[str, Any]) -> Dict[str, Any]:
+        conn = self._acquire()
+        try:
+            conn.send(msg)
+            if not conn.poll(self.timeout):
+                raise InferenceServerUnavailable(f"inference server timeout after {self.timeout}s")
+            resp = conn.recv()
+        except (OSError, EOFError) as e:
+            conn.close()
+            raise InferenceServerUnavailable(f"inference server {self.address}: {e}") from e
+        except pickle.UnpicklingError as e:
+            # вместо ответа пришёл вызов аутентификации: у сервера есть ключ, у клиента нет
+            conn.close()
+            raise InferenceServerUnavailable(
+                f"inference server {self.address}: unexpected reply, INFERENCE_SERVER_AUTHKEY mismatch?") from e
+        except BaseException:
+            conn.close()            # ответ ещё в пути — соединение переиспользовать нельзя
+            raise
+        self._idle.put(conn)
+        if not resp.get("ok"):
+            err = resp.get("error", "inference server error")
+            if resp.get("type") == "MissingPass":
+                raise MissingPass(err)
+            raise RuntimeError(err) if resp.get("type") == "RuntimeError" else InferenceServerUnavailable(err)
+        return resp
+
+    def _with_image(self, img: np.ndarray, msg: Dict[str, Any]) -> Dict[str, Any]:
+        shm, desc = put_image(img)
+        try:
+            return self.call({**msg, "image": desc})
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def ping(self) -> Dict[str, Any]:
+        return self.call({"op": "ping"})["result"]
+
+    def run_pipeline(self, image: np.ndarray, *, model_kind: str, check_thr: float,
+                     timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+        resp = self._with_image(image, {
+            "op": "run_pipeline",
+            "kwargs": {"model_kind": model_kind, "check_thr": check_thr},
+            "profile": timer is not None,
+        })
+        if timer is not None and resp.get("timings"):
+            timer.merge(resp["timings"])
+        return resp["result"]
+
+    def detect_raw(self, image: np.ndarray, *, model_kind: str, floor_conf: float,
+                   timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+        resp = self._with_image(image, {
+            "op": "detect_raw",
+            "kwargs": {"model_kind": model_kind, "floor_conf": floor_conf},
+            "profile": timer is not None,
+        })
+        if timer is not None and resp.get("timings"):
+            timer.merge(resp["timings"])
+        return resp["result"]
+
+    def resolve(self, raw: Dict[str, Any], *, check_thr: float, image: Optional[np.ndarray] = None,
+                timer: Optional[StageTimer] = None, allow_missing: bool = False) -> Dict[str, Any]:
+        msg = {"op": "resolve", "raw": raw, "kwargs": {"check_thr": check_thr, "allow_missing": allow_missing},
+               "profile": timer is not None}
+        resp = self._with_image(image, msg) if image is not None else self.call(msg)
+        if timer is not None and resp.get("timings"):
+            timer.merge(resp["timings"])
+        result = resp["result"]
+        if result.get("raw_updated"):
+            raw.update(result.pop("raw"))
+        return result
+
+    def class_order(self) -> List[str]:
+        return self.call({"op": "class_order"})["result"]
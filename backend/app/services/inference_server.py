@@ -0,0 +1,221 @@
+"""Отдельный процесс, владеющий моделями; API-воркеры обращаются к нему по RPC.
+
+Запуск::
+
+    INFERENCE_SERVER=127.0.0.1:8765 INFERENCE_CPUS=0-5 python -m app.services.inference_server
+
+Кадр передаётся через ``multiprocessing.shared_memory``: клиент декодирует
+изображение в общий буфер, сервер работает с ``np.ndarray`` поверх того же
+буфера — без pickle и без диска. По соединению ходят только маленькие
+сообщения (``multiprocessing.connection``):
+
+    {"op": "run_pipeline", "image": {"shm", "shape", "dtype"}, "kwargs": {...}}
+    {"op": "detect_raw",   "image": {...}, "kwargs": {...}}
+    {"op": "resolve", "raw": {...}, "image": {...}?, "kwargs": {...}}
+    {"op": "class_order"}
+    {"op": "ping"}
+
+Рендер сюда не ходит: API рисует сам (``app.services.render``).
+
+Ответ: ``{"ok": True, "result": ..., "timings": {...}?}`` или
+``{"ok": False, "type": "RuntimeError", "error": "..."}``.
+"""
+from __future__ import annotations
+
+import ipaddress
+import logging
+import os
+import sys
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import TYPE_CHECKING, Any, Dict, Set, Tuple, Union
+
+from app.settings import INFERENCE_CPUS, INFERENCE_SERVER, INFERENCE_SERVER_AUTHKEY
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy здесь импортируется лениво: в процессе сервера pin_cpus должен выставить
+# OMP/MKL/OPENBLAS_NUM_THREADS до первой загрузки numpy/torch
+
+log = logging.getLogger(__name__)
+
+# ========= адрес / shared memory =========
+
+
+def parse_address(addr: str) -> Union[str, Tuple[str, int]]:
+    if ":" in addr and not addr.startswith("/"):
+        host, port = addr.rsplit(":", 1)
+        return host, int(port)
+    return addr
+
+
+def parse_cpus(spec: str) -> Set[int]:
+    cpus: Set[int] = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def put_image(img: np.ndarray) -> Tuple[SharedMemory, Dict[str, Any]]:
+    """Скопировать кадр в новый сегмент; владелец (клиент) потом делает close()+unlink()."""
+    import numpy as np
+
+    shm = SharedMemory(create=True, size=max(1, img.nbytes))
+    view = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+    view[...] = img
+    del view
+    return shm, {"shm": shm.name, "shape": tuple(img.shape), "dtype": str(img.dtype)}
+
+
+def attach_image(desc: Dict[str, Any]) -> Tuple[SharedMemory, np.ndarray]:
+    """Подключиться к сегменту клиента без копирования. Сегмент чужой —
+    снимаем его с учёта resource_tracker, иначе тот удалит его при выходе сервера."""
+    import numpy as np
+
+    shm = SharedMemory(name=desc["shm"])
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+    except Exception:
+        pass
+    arr = np.ndarray(tuple(desc["shape"]), dtype=np.dtype(desc["dtype"]), buffer=shm.buf)
+    return shm, arr
+
+
+# ========= сервер =========
+
+_MODEL_LOCK = threading.Lock()   # модели не потокобезопасны: инференс строго по одному
+
+
+def pin_cpus(spec: str) -> None:
+    """Закрепить процесс (и потоки BLAS/torch) за выделенными ядрами.
+    Вызывать до импорта numpy/torch — OMP/MKL/OpenBLAS читают переменные при загрузке."""
+    if not spec:
+        return
+    cpus = parse_cpus(spec)
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if "numpy" in sys.modules or "torch" in sys.modules:
+        log.warning("numpy/torch already imported: OMP/MKL/OPENBLAS_NUM_THREADS will not take effect")
+    n = str(len(cpus))
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ.setdefault(var, n)
+
+
+def _handle(conn: Connection, inference) -> None:
+    from app.services.profiling import StageTimer
+
+    with conn:
+        while True:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                return
+            op = msg.get("op")
+            shm = img = None
+            try:
+                if op == "ping":
+                    resp: Dict[str, Any] = {"ok": True, "result": {"pid": os.getpid()}}
+                elif op == "run_pipeline":
+                    shm, img = attach_image(msg["image"])
+                    timer = StageTimer() if msg.get("profile") else None
+                    with _MODEL_LOCK:
+                        result = inference.run_pipeline(img, timer=timer, **msg["kwargs"])
+                    resp = {"ok": True, "result": result}
+                    if timer:
+                        resp["timings"] = timer.as_dict()
+                elif op == "detect_raw":
+                    shm, img = attach_image(msg["image"])
+                    timer = StageTimer() if msg.get("profile") else None
+                    with _MODEL_LOCK:
+                        result = inference.detect_raw(img, timer=timer, **msg["kwargs"])
+                    resp = {"ok": True, "result": result}
+                    if timer:
+                        resp["timings"] = timer.as_dict()
+                elif op == "resolve":
+                    # без кадра — только пересчёт; нужен проход модели — MissingPass
+                    if msg.get("image"):
+                        shm, img = attach_image(msg["image"])
+                    timer = StageTimer() if msg.get("profile") else None
+                    raw = msg["raw"]
+                    with _MODEL_LOCK:
+                        result = inference.resolve(raw, image_path=img, timer=timer, **msg["kwargs"])
+                    if result["raw_updated"]:
+                        result["raw"] = raw
+                    resp = {"ok": True, "result": result}
+                    if timer:
+                        resp["timings"] = timer.as_dict()
+                elif op == "class_order":
+                    resp = {"ok": True, "result": list(inference.CLASS_ORDER)}
+                else:
+                    resp = {"ok": False, "type": "ValueError", "error": f"unknown op: {op}"}
+            except Exception as e:
+                resp = {"ok": False, "type": type(e).__name__, "error": str(e)}
+            finally:
+                img = None          # view должен умереть раньше close()
+                if shm is not None:
+                    try:
+                        shm.close()
+                    except BufferError:
+                        pass
+            try:
+                conn.send(resp)
+            except (EOFError, OSError):
+                return
+
+
+def is_local_address(addr: Union[str, Tuple[str, int]]) -> bool:
+    """Unix-сокет или loopback-интерфейс."""
+    if isinstance(addr, str):
+        return True
+    host = addr[0].strip("[]")
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(address: str = INFERENCE_SERVER, cpus: str = INFERENCE_CPUS,
+          authkey: bytes = INFERENCE_SERVER_AUTHKEY) -> None:
+    if not address:
+        raise SystemExit("INFERENCE_SERVER is not set (host:port or unix socket path)")
+    addr = parse_address(address)
+    if not authkey:
+        # сообщения — pickle: без ключа любой, кто достучится до порта, исполнит код
+        if not is_local_address(addr):
+            raise SystemExit(f"refusing to listen on {address} without INFERENCE_SERVER_AUTHKEY")
+        log.warning("INFERENCE_SERVER_AUTHKEY is not set; any local process can connect to %s", address)
+    pin_cpus(cpus)
+    if cpus:
+        # без INFERENCE_CPUS — умолчание OpenCV (0 у него значит «без потоков»)
+        import cv2
+        cv2.setNumThreads(len(parse_cpus(cpus)))
+    from app.services import inference   # модели грузятся здесь, один раз на хост
+
+    if isinstance(addr, str) and os.path.exists(addr):
+        os.unlink(addr)
+    with Listener(addr, authkey=authkey or None) as listener:
+        log.info("inference server pid=%d listening on %s%s",
+                 os.getpid(), address, f", cpus={cpus}" if cpus else "")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception:
+                continue    # неверный authkey / оборванное соединение
+            threading.Thread(target=_handle, args=(conn, inference), daemon=True).start()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    serve()
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import fcntl
+import math
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.services.serialization import read_json, write_json
+from app.settings import (
+    LAYOUT_LEARN_CONF, LAYOUT_MIN_SAMPLES, LAYOUT_PRIOR_PATH,
+    LAYOUT_ROI_MIN_SIDE, LAYOUT_ROI_PAD, LAYOUT_ROI_SIGMA,
+)
+
+# ========= карта раскладки ложемента =========
+# Для каждого класса — онлайн-статистика (Welford) нормированных краёв бокса
+# (x1/W, y1/H, x2/W, y2/H) по уверенным детекциям прошлых аудитов:
+#   {"version": 1, "classes": {"kolovorot": {"n": 120, "mean": [4 x float], "m2": [4 x float]}}}
+# Файл общий для API-воркеров (пишут, под flock) и сервера инференса (читает,
+# перечитывает при изменении mtime).
+
+PRIOR_VERSION = 1
+
+
+class LayoutPrior:
+    def __init__(self, classes: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.classes: Dict[str, Dict[str, Any]] = classes or {}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LayoutPrior":
+        if data.get("version") != PRIOR_VERSION:
+            return cls()
+        return cls(data.get("classes") or {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": PRIOR_VERSION, "classes": self.classes}
+
+    def samples(self, cls: str) -> int:
+        return int(self.classes.get(cls, {}).get("n", 0))
+
+    def observe(self, cls: str, box_norm: Sequence[float]) -> None:
+        s = self.classes.setdefault(cls, {"n": 0, "mean": [0.0] * 4, "m2": [0.0] * 4})
+        s["n"] += 1
+        for i, x in enumerate(box_norm):
+            d = x - s["mean"][i]
+            s["mean"][i] += d / s["n"]
+            s["m2"][i] += d * (x - s["mean"][i])
+
+    def region(self, cls: str, w: int, h: int, *, sigma: float = LAYOUT_ROI_SIGMA,
+               pad: float = LAYOUT_ROI_PAD, min_side: int = LAYOUT_ROI_MIN_SIDE,
+               min_samples: int = LAYOUT_MIN_SAMPLES) -> Optional[List[int]]:
+        """Ожидаемая область класса в пикселях кадра ``w``x``h`` или None,
+        если наблюдений пока мало."""
+        s = self.classes.get(cls)
+        if not s or s["n"] < max(2, min_samples):
+            return None
+        mean = s["mean"]
+        std = [math.sqrt(max(0.0, m2 / (s["n"] - 1))) for m2 in s["m2"]]
+        pw = pad * max(0.0, mean[2] - mean[0])
+        ph = pad * max(0.0, mean[3] - mean[1])
+        x1 = (mean[0] - sigma * std[0] - pw) * w
+        y1 = (mean[1] - sigma * std[1] - ph) * h
+        x2 = (mean[2] + sigma * std[2] + pw) * w
+        y2 = (mean[3] + sigma * std[3] + ph) * h
+        # не меньше min_side по каждой стороне — вокруг того же центра
+        cx, cy = 0.5 * (x1 + x2), 0.5 * (y1 + y2)
+        hw = 0.5 * max(x2 - x1, min(min_side, w))
+        hh = 0.5 * max(y2 - y1, min(min_side, h))
+        x1, x2 = max(0, int(cx - hw)), min(w, int(math.ceil(cx + hw)))
+        y1, y2 = max(0, int(cy - hh)), min(h, int(math.ceil(cy + hh)))
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None
+        return [x1, y1, x2, y2]
+
+
+def confident_boxes(dets: List[Dict[str, Any]], w: int, h: int,
+                    min_conf: float = LAYOUT_LEARN_CONF) -> List[Tuple[str, List[float]]]:
+    """Наблюдения для обучения: классы, найденные ровно один раз с уверенностью
+    не ниже ``min_conf`` (дубликаты положение инструмента не определяют)."""
+    if w <= 0 or h <= 0:
+        return []
+    by_class: Dict[str, List[Dict[str, Any]]] = {}
+    for d in dets:
+        if d["confidence"] >= min_conf:
+            by_class.setdefault(d["class_name"], []).append(d)
+    out: List[Tuple[str, List[float]]] = []
+    for cls, arr in by_class.items():
+        if len(arr) != 1:
+            continue
+        x1, y1, x2, y2 = arr[0]["bbox_xyxy"]
+        box = [x1 / w, y1 / h, x2 / w, y2 / h]
+        if all(-0.01 <= v <= 1.01 for v in box) and box[2] > box[0] and box[3] > box[1]:
+            out.append((cls, box))
+    return out
+
+
+# ========= хранение =========
+_guard = threading.Lock()
+_cache: Dict[str, Any] = {"key": None, "prior": LayoutPrior()}
+
+
+def _read(path: Path) -> LayoutPrior:
+    try:
+        return LayoutPrior.from_dict(read_json(path))
+    except (FileNotFoundError, ValueError):
+        return LayoutPrior()
+
+
+def _write(path: Path, prior: LayoutPrior) -> None:
+    tmp = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    write_json(tmp, prior.to_dict())
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _guard, open(path.with_name(path.name + ".lock"), "a+") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def current(path: Path = LAYOUT_PRIOR_PATH) -> LayoutPrior:
+    """Карта с диска; перечитывается, только если файл изменился."""
+    try:
+        st = path.stat()
+        key = (str(path), st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return LayoutPrior()
+    if _cache["key"] != key:
+        _cache["prior"] = _read(path)
+        _cache["key"] = key
+    return _cache["prior"]
+
+
+def record(dets: List[Dict[str, Any]], w: int, h: int, *, min_conf: float = LAYOUT_LEARN_CONF,
+           path: Path = LAYOUT_PRIOR_PATH) -> int:
+    """Дообучить карту детекциями одного аудита; возвращает число наблюдений."""
+    boxes = confident_boxes(dets, w, h, min_conf)
+    if not boxes:
+        return 0
+    with _locked(path):
+        prior = _read(path)
+        for cls, box in boxes:
+            prior.observe(cls, box)
+        _write(path, prior)
+    return len(boxes)
+
+
+def save(prior: LayoutPrior, path: Path = LAYOUT_PRIOR_PATH) -> None:
+    with _locked(path):
+        _write(path, prior)
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import base64
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import cv2
+import numpy as np
+
+# ========= форматы масок в ответе /infer и в отчёте =========
+#   poly   — [[x, y], ...] float (как раньше)
+#   int    — [[x, y], ...] целые пиксели
+#   packed — {"format": "i16b64", "count": N, "data": base64(int16 LE x0,y0,x1,y1,...)}
+MASK_FORMATS = ("poly", "int", "packed")
+PACKED_FORMAT = "i16b64"
+
+Polygon = List[Tuple[float, float]]
+EncodedMask = Union[List[List[float]], List[List[int]], Dict[str, Any]]
+
+
+def simplify_polygon(poly: Sequence[Sequence[float]], tolerance_px: float) -> np.ndarray:
+    pts = np.asarray(poly, dtype=np.float32).reshape(-1, 2)
+    if tolerance_px <= 0 or len(pts) < 4:
+        return pts
+    approx = cv2.approxPolyDP(pts.reshape(-1, 1, 2), float(tolerance_px), True).reshape(-1, 2)
+    return approx if len(approx) >= 3 else pts
+
+
+def encode_mask(poly: Sequence[Sequence[float]], fmt: str = "poly", tolerance_px: float = 0.0) -> EncodedMask:
+    pts = simplify_polygon(poly, tolerance_px)
+    if fmt == "poly":
+        return [[float(x), float(y)] for x, y in pts]
+    q = np.rint(pts).astype(np.int64)
+    if fmt == "int":
+        return [[int(x), int(y)] for x, y in q]
+    if fmt == "packed":
+        arr = np.clip(q, -32768, 32767).astype("<i2")
+        return {"format": PACKED_FORMAT, "count": int(len(arr)),
+                "data": base64.b64encode(arr.tobytes()).decode("ascii")}
+    raise ValueError(f"unknown mask format: {fmt}")
+
+
+def decode_mask(mask: Optional[EncodedMask]) -> Optional[Polygon]:
+    """Обратное к ``encode_mask`` — для рендера из сохранённого отчёта."""
+    if not mask:
+        return None
+    if isinstance(mask, dict):
+        if mask.get("format") != PACKED_FORMAT:
+            raise ValueError(f"unknown packed mask format: {mask.get('format')}")
+        arr = np.frombuffer(base64.b64decode(mask["data"]), dtype="<i2").reshape(-1, 2)
+        return [(float(x), float(y)) for x, y in arr]
+    return [(float(x), float(y)) for x, y in mask]
+
+
+def encode_detections(dets: List[Dict[str, Any]], fmt: str = "poly", tolerance_px: float = 0.0) -> List[Dict[str, Any]]:
+    """Копии детекций с закодированными масками; исходные (для рендера) не меняются."""
+    if fmt == "poly" and tolerance_px <= 0:
+        return dets
+    out: List[Dict[str, Any]] = []
+    for d in dets:
+        if d.get("mask"):
+            d = {**d, "mask": encode_mask(d["mask"], fmt, tolerance_px)}
+        out.append(d)
+    return out
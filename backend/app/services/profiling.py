@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import cProfile
+import hmac
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from app.settings import PROFILES_DIR, PROFILES_KEEP, PROFILING_ADMIN_TOKEN, PROFILING_ENABLED
+
+# ========= таймер стадий =========
+
+
+class StageTimer:
+    """Суммарное время по стадиям (мс); повторные входы в стадию складываются."""
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.notes: Dict[str, Any] = {}
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - t0) * 1000.0
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def note(self, key: str, value: Any) -> None:
+        """Доп. сведения о запросе (например, число кандидатов на входе NMS)."""
+        self.notes[key] = value
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """Добавить разбивку, посчитанную в другом процессе (``as_dict()`` сервера инференса)."""
+        for k, v in (other.get("stages_ms") or {}).items():
+            self.stages[k] = self.stages.get(k, 0.0) + float(v)
+        for k, v in (other.get("calls") or {}).items():
+            self.counts[k] = self.counts.get(k, 0) + int(v)
+        self.notes.update(other.get("notes") or {})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.perf_counter() - self._t0) * 1000.0, 3),
+            "stages_ms": {k: round(v, 3) for k, v in self.stages.items()},
+            "calls": dict(self.counts),
+            "notes": dict(self.notes),
+        }
+
+
+class _NullTimer:
+    def stage(self, name: str):
+        return nullcontext()
+
+    def note(self, key: str, value: Any) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+# ========= cProfile =========
+
+T = TypeVar("T")
+
+# профилировщик в процессе один: второй enable() на 3.12+ падает с ValueError,
+# на 3.11 молча подменяет первый — профилируемые запросы идут по одному
+_PROFILE_LOCK = threading.Lock()
+
+
+@contextmanager
+def profiler_slot() -> Iterator[bool]:
+    """``True`` — слот получен; ``False`` — уже идёт другой профилируемый запрос."""
+    acquired = _PROFILE_LOCK.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _PROFILE_LOCK.release()
+
+
+def call_profiled(prof: Optional[cProfile.Profile], fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Вызвать ``fn`` под ``prof`` — в том же потоке (threadpool), без чужих корутин event loop."""
+    if prof is None:
+        return fn(*args, **kwargs)
+    prof.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        prof.disable()
+
+# ========= доступ / дампы =========
+
+
+def profiling_allowed(admin_token: Optional[str]) -> bool:
+    if not PROFILING_ENABLED:
+        return False
+    if not PROFILING_ADMIN_TOKEN:
+        return True
+    return bool(admin_token) and hmac.compare_digest(admin_token, PROFILING_ADMIN_TOKEN)
+
+
+def _prune() -> None:
+    files = sorted(PROFILES_DIR.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for p in files[PROFILES_KEEP:]:
+        for q in (p, p.with_suffix(".json")):
+            try:
+                q.unlink(missing_ok=True)
+            except Exception:
+                pass
+
+
+def save_profile(uid: str, prof: cProfile.Profile, timings: Dict[str, Any], meta: Dict[str, Any]) -> str:
+    """cProfile-дамп (``<uid>.prof``, открывается snakeviz / pstats) + JSON с разбивкой по стадиям."""
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    prof_path = PROFILES_DIR / f"{uid}.prof"
+    prof.dump_stats(str(prof_path))
+    with prof_path.with_suffix(".json").open("w", encoding="utf-8") as f:
+        json.dump({"timings": timings, **meta}, f, ensure_ascii=False, indent=2)
+    _prune()
+    return prof_path.name
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    if not PROFILES_DIR.exists():
+        return []
+    out: List[Dict[str, Any]] = []
+    for p in sorted(PROFILES_DIR.glob("*.prof"), key=lambda p: p.stat().st_mtime, reverse=True):
+        meta: Dict[str, Any] = {}
+        side = p.with_suffix(".json")
+        if side.exists():
+            try:
+                meta = json.loads(side.read_text(encoding="utf-8"))
+            except Exception:
+                meta = {}
+        out.append({
+            "name": p.name,
+            "size": p.stat().st_size,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(p.stat().st_mtime)),
+            **meta,
+        })
+    return out
+
+
+def profile_path(name: str) -> Optional[Path]:
+    if Path(name).name != name or not name.endswith(".prof"):
+        return None
+    p = PROFILES_DIR / name
+    return p if p.is_file() else None
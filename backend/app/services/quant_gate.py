@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from app.settings import INT8_GATE_REPORT, USE_INT8_MODELS
+
+log = logging.getLogger(__name__)
+
+
+def file_sha256(p: Path) -> str:
+    h = hashlib.sha256()
+    with p.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_gate(path: Path = INT8_GATE_REPORT) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+def gate_allows(int8_path: Path, gate: Optional[Dict[str, Any]] = None) -> bool:
+    """Проверку прошла именно эта модель, и в отчёте записан хэш именно этого
+    файла — переквантованная модель требует новой проверки."""
+    gate = gate if gate is not None else load_gate()
+    if not gate or not int8_path.exists():
+        return False
+    sha = file_sha256(int8_path)
+    return any(m.get("passed") is True and m.get("file") == int8_path.name and m.get("sha256") == sha
+               for m in (gate.get("models") or {}).values())
+
+
+def resolve_model_path(fp32_path: Path, int8_path: Path) -> Path:
+    if not USE_INT8_MODELS:
+        return fp32_path
+    if gate_allows(int8_path):
+        return int8_path
+    log.warning("INT8 model %s is not approved by %s; using %s",
+                int8_path.name, INT8_GATE_REPORT, fp32_path.name)
+    return fp32_path
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.services.derivatives import remove_derivatives
+from app.services.masks import decode_mask, encode_mask
+from app.services.serialization import read_json, write_json
+from app.settings import PROCESSED_DIR, RAW_DIR
+
+# Сырые результаты проходов моделей по аудиту (см. inference.detect_raw):
+#   {"w", "h", "model_kind", "floor_conf", "classes",
+#    "main": [...],                    # DET/SEG с floor_conf, до NMS
+#    "kolovorot": det | None,          # лучший коловорот из SEG — если проход запускался
+#    "dop": [...]}                     # DOP после NMS — если проход запускался
+
+
+class MissingPass(Exception):
+    """Для этих порогов нужен проход модели, которого нет в сохранённых детекциях."""
+
+    def __init__(self, name: str):
+        super().__init__(f"model pass not stored: {name}")
+        self.name = name
+
+
+def _map_masks(dets: Optional[List[Dict[str, Any]]], fn) -> Optional[List[Dict[str, Any]]]:
+    if dets is None:
+        return None
+    return [{**d, "mask": fn(d["mask"])} if d.get("mask") else d for d in dets]
+
+
+def save_raw(uid: str, raw: Dict[str, Any]) -> None:
+    # маски — целочисленным packed-форматом, без упрощения
+    data = {**raw, "main": _map_masks(raw.get("main"), lambda m: encode_mask(m, "packed"))}
+    write_json(RAW_DIR / f"{uid}.json", data)
+
+
+def load_raw(uid: str) -> Optional[Dict[str, Any]]:
+    p = RAW_DIR / f"{uid}.json"
+    if not p.exists():
+        return None
+    raw = read_json(p)
+    raw["main"] = _map_masks(raw.get("main"), decode_mask)
+    return raw
+
+
+def remove_raw(uid: str) -> None:
+    """Сырые детекции и все рендеры аудита (``<uid>.jpg``, ``<uid>_r*.jpg``) с превью."""
+    try:
+        (RAW_DIR / f"{uid}.json").unlink(missing_ok=True)
+    except Exception:
+        pass
+    for p in PROCESSED_DIR.glob(f"{uid}*.jpg"):
+        remove_derivatives("processed", p)
+        try:
+            p.unlink(missing_ok=True)
+        except Exception:
+            pass
+
+
+def prune_renders(uid: str, keep: Iterable[str]) -> None:
+    """Удалить перерисовки ``<uid>_r*.jpg`` (с превью), кроме ``keep`` (имена файлов)."""
+    keep = set(keep)
+    for p in PROCESSED_DIR.glob(f"{uid}_r*.jpg"):
+        if p.name in keep:
+            continue
+        remove_derivatives("processed", p)
+        try:
+            p.unlink(missing_ok=True)
+        except Exception:
+            pass
@@ -0,0 +1,95 @@
+"""Отрисовка детекций на кадре.
+
+Модели не нужны: при заданном ``INFERENCE_SERVER`` API-воркер рисует сам,
+не занимая ядра сервера инференса и не копируя кадр ещё раз в shared memory.
+Цвета классов — по порядку классов DET-модели (``color_map``).
+"""
+from __future__ import annotations
+
+import colorsys
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+RGB = Tuple[int, int, int]
+
+# ========= цветовая палитра =========
+
+
+def build_palette(n: int, s: float = 0.85, v: float = 0.95) -> List[RGB]:
+    out = []
+    for i in range(n):
+        h = i / max(1, n)
+        r, g, b = colorsys.hsv_to_rgb(h, s, v)
+        out.append((int(r * 255), int(g * 255), int(b * 255)))
+    return out
+
+
+@lru_cache(maxsize=8)
+def color_map(class_order: Tuple[str, ...]) -> Dict[str, RGB]:
+    palette = build_palette(len(class_order))
+    return {name: palette[i] for i, name in enumerate(class_order)}
+
+
+# ========= шрифт =========
+FONT_CANDIDATES = [
+    Path("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"),
+    Path("/usr/share/fonts/truetype/noto/NotoSans-Regular.ttf"),
+]
+
+
+def load_font(size: int = 22) -> ImageFont.FreeTypeFont:
+    for p in FONT_CANDIDATES:
+        if p.exists():
+            return ImageFont.truetype(str(p), size=size)
+    return ImageFont.load_default()
+
+# ========= отрисовка =========
+
+
+def draw_custom(bgr: np.ndarray, dets: List[Dict[str, Any]], render_thr: float,
+                draw_boxes: bool, draw_labels: bool, out_path: Path, *,
+                colors: Dict[str, RGB], draw_masks: bool = False) -> None:
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    im = Image.fromarray(rgb)
+    draw = ImageDraw.Draw(im, "RGBA")
+
+    H, W = bgr.shape[:2]
+    box_thickness = max(4, int(min(W, H) * 0.006))
+    font_size = max(20, int(min(W, H) * 0.028))
+    font = load_font(size=font_size)
+    pad = max(6, box_thickness)
+
+    for d in dets:
+        if d["confidence"] < render_thr:
+            continue
+        x1, y1, x2, y2 = [int(round(t)) for t in d["bbox_xyxy"]]
+        en_name = d["class_name"]
+        ru_name = d.get("class_name_ru") or en_name
+        conf_frac = max(0.0, min(1.0, float(d["confidence"])))
+        color = colors.get(en_name, (255, 255, 255))
+        label = f"{ru_name} {conf_frac:.2f}"
+
+        if draw_masks and d.get("mask"):
+            poly = [(float(px), float(py)) for px, py in d["mask"]]
+            draw.polygon(poly, fill=(color[0], color[1], color[2], 90))
+        if draw_boxes:
+            for off in range(box_thickness):
+                draw.rectangle(
+                    [(x1-off, y1-off), (x2+off, y2+off)], outline=color)
+        if draw_labels:
+            x0, y0, x3, y3 = draw.textbbox((0, 0), label, font=font)
+            tw, th = (x3-x0), (y3-y0)
+            bx = max(0, min(x1, W - tw - pad*2))
+            by = max(0, y1 - th - pad*2)
+            draw.rectangle([(bx, by), (bx+tw+pad*2, by+th+pad*2)],
+                           fill=(color[0], color[1], color[2], 220))
+            draw.text((bx+pad, by+pad), label, font=font, fill=(255, 255, 255, 255),
+                      stroke_width=max(1, box_thickness//3), stroke_fill=(0, 0, 0, 200))
+    out_bgr = cv2.cvtColor(np.array(im), cv2.COLOR_RGB2BGR)
+    cv2.imwrite(str(out_path), out_bgr)
+
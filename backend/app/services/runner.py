@@ -0,0 +1,106 @@
+"""Точка входа роутов в пайплайн: локальные модели или сервер инференса.
+
+При заданном ``INFERENCE_SERVER`` этот модуль не импортирует
+``app.services.inference`` — модели в API-воркере не загружаются.
+"""
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from app.services import render
+from app.services.profiling import StageTimer
+from app.services.raw_store import MissingPass
+from app.services.render import color_map
+from app.settings import INFERENCE_SERVER
+
+_client = None
+_class_order: Optional[List[str]] = None
+# локальные модели не потокобезопасны (стриминг гоняет проходы в threadpool)
+_LOCAL_LOCK = threading.Lock()
+
+
+def _remote():
+    global _client
+    if _client is None:
+        from app.services.inference_client import InferenceClient
+        _client = InferenceClient()
+    return _client
+
+
+def decode_image(data: bytes) -> np.ndarray:
+    """Один раз декодировать загрузку в BGR; дальше все стадии работают с массивом."""
+    bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError("Can't decode image")
+    return bgr
+
+
+def run_pipeline(image: np.ndarray, *, model_kind: str, check_thr: float,
+                 timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    if INFERENCE_SERVER:
+        return _remote().run_pipeline(image, model_kind=model_kind, check_thr=check_thr, timer=timer)
+    from app.services import inference
+    with _LOCAL_LOCK:
+        return inference.run_pipeline(image, model_kind=model_kind, check_thr=check_thr, timer=timer)
+
+
+def detect_raw(image: np.ndarray, *, model_kind: str, floor_conf: float,
+               timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    if INFERENCE_SERVER:
+        return _remote().detect_raw(image, model_kind=model_kind, floor_conf=floor_conf, timer=timer)
+    from app.services import inference
+    with _LOCAL_LOCK:
+        return inference.detect_raw(image, model_kind=model_kind, floor_conf=floor_conf, timer=timer)
+
+
+def _resolve(raw: Dict[str, Any], check_thr: float, image: Optional[np.ndarray],
+             timer: Optional[StageTimer], allow_missing: bool = False) -> Dict[str, Any]:
+    if INFERENCE_SERVER:
+        return _remote().resolve(raw, check_thr=check_thr, image=image, timer=timer, allow_missing=allow_missing)
+    from app.services import inference
+    if image is None:
+        # без кадра модели не запускаются — блокировка не нужна
+        return inference.resolve(raw, check_thr, timer=timer, allow_missing=allow_missing)
+    with _LOCAL_LOCK:
+        return inference.resolve(raw, check_thr, image_path=image, timer=timer)
+
+
+def resolve(raw: Dict[str, Any], *, check_thr: float, load_image: Callable[[], np.ndarray],
+            timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    """Пересчёт по сохранённым детекциям; кадр читается, только если
+    для нового порога нужен проход модели (``raw`` тогда дополняется)."""
+    try:
+        return _resolve(raw, check_thr, None, timer)
+    except MissingPass:
+        return _resolve(raw, check_thr, load_image(), timer)
+
+
+def resolve_provisional(raw: Dict[str, Any], *, check_thr: float,
+                        timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    """Черновой результат только по уже выполненным проходам; недостающие —
+    в ``skipped`` (для их выполнения — ``resolve``)."""
+    return _resolve(raw, check_thr, None, timer, allow_missing=True)
+
+
+def class_order() -> List[str]:
+    """Порядок классов DET-модели (от него зависят цвета рендера); с сервера — один раз."""
+    global _class_order
+    if _class_order is None:
+        if INFERENCE_SERVER:
+            _class_order = list(_remote().class_order())
+        else:
+            from app.services import inference
+            _class_order = list(inference.CLASS_ORDER)
+    return _class_order
+
+
+def draw_custom(image: np.ndarray, dets: List[Dict[str, Any]], render_thr: float,
+                draw_boxes: bool, draw_labels: bool, out_path: Path, *, draw_masks: bool = False) -> None:
+    """Рендер в этом процессе: моделям он не нужен, на сервер инференса не ходит."""
+    render.draw_custom(image, dets, render_thr, draw_boxes, draw_labels, out_path,
+                       colors=color_map(tuple(class_order())), draw_masks=draw_masks)
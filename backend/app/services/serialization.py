@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+try:  # опционально: ответы в MessagePack для машинных клиентов
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+JSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+HAVE_MSGPACK = msgpack is not None
+
+
+def dumps_json(obj: Any) -> bytes:
+    """Компактный UTF-8 JSON (кириллица без \\u-экранирования)."""
+    return orjson.dumps(obj, option=JSON_OPTIONS)
+
+
+def loads_json(data: Any) -> Any:
+    return orjson.loads(data)
+
+
+def write_json(path: Path, obj: Any) -> None:
+    path.write_bytes(dumps_json(obj))
+
+
+def read_json(path: Path) -> Any:
+    return orjson.loads(path.read_bytes())
+
+
+def dumps_msgpack(obj: Any) -> bytes:
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    # numpy-скаляры и прочее, что msgpack не знает, проводим через orjson
+    return msgpack.packb(obj, use_bin_type=True, default=lambda o: orjson.loads(dumps_json(o)))
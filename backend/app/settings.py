@@ -4,23 +4,104 @@ import os
 # Базовые пути
 BASE_DIR = Path(__file__).resolve().parents[1]       # backend/
 APP_DIR = Path(__file__).resolve().parent           # backend/app
-UPLOAD_DIR = BASE_DIR / "uploads"
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", str(BASE_DIR / "uploads")))
 ORIGINAL_DIR = UPLOAD_DIR / "original"
 PROCESSED_DIR = UPLOAD_DIR / "processed"
 REPORTS_DIR = PROCESSED_DIR / "reports"
+DERIVED_DIR = UPLOAD_DIR / "derived"          # превью/WebP-производные
+RAW_DIR = UPLOAD_DIR / "raw"                  # сырые детекции аудитов (для пересчёта порогов)
 
-for d in (UPLOAD_DIR, ORIGINAL_DIR, PROCESSED_DIR, REPORTS_DIR):
+for d in (UPLOAD_DIR, ORIGINAL_DIR, PROCESSED_DIR, REPORTS_DIR, DERIVED_DIR, RAW_DIR):
     d.mkdir(parents=True, exist_ok=True)
 
 # DB
 DB_URL = os.getenv(
     "DB_URL", "mysql+pymysql://app:app@db:3306/tools?charset=utf8mb4")
 
+
+def _async_url(url: str) -> str:
+    # тот же DSN, но с асинхронным драйвером
+    for sync, aio in (("mysql+pymysql://", "mysql+aiomysql://"), ("mysql://", "mysql+aiomysql://"),
+                      ("sqlite+pysqlite://", "sqlite+aiosqlite://"), ("sqlite://", "sqlite+aiosqlite://")):
+        if url.startswith(sync):
+            return aio + url[len(sync):]
+    return url
+
+
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL") or _async_url(DB_URL)
+
+# пул соединений (общий для sync и async движков)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))        # сек
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))          # сек ожидания свободного соединения
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))  # только async-движок; 0 — без ограничения
+
+# Помесячные партиции audits по created_at (MySQL, python -m tools.partitions)
+# и архив холодных месяцев в сжатый NDJSON (читается экспортом /audits/export)
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "3"))   # месяцев вперёд
+AUDIT_HOT_MONTHS = int(os.getenv("AUDIT_HOT_MONTHS", "12"))              # остальное — в архив
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", str(BASE_DIR / "archive")))  # вне /static
+
 # Модели
 MODELS_DIR = APP_DIR / "models"
 DET_MODEL_PATH = MODELS_DIR / "yoloM_onlygroup.pt"
 SEG_MODEL_PATH = MODELS_DIR / "best-seg.pt"     # YOLO(seg) - test
 DOP_MODEL_PATH = MODELS_DIR / "yoloM-dop.pt"    # доп.детектор
 
+# Параметры пайплайна (tools/evaluate.py сравнивает их варианты на размеченных данных)
+DET_IMGSZ = int(os.getenv("DET_IMGSZ", "1280"))                    # основной проход DET/SEG
+SEG_FALLBACK_IMGSZ = int(os.getenv("SEG_FALLBACK_IMGSZ", "960"))   # коловорот из SEG
+DOP_IMGSZ = int(os.getenv("DOP_IMGSZ", "1280"))                    # DOP по всему кадру
+KOLOVOROT_FALLBACK = os.getenv("KOLOVOROT_FALLBACK", "1") == "1"
+DOP_FALLBACK = os.getenv("DOP_FALLBACK", "1") == "1"
+
+# Сырые детекции сохраняются с этого порога, чтобы check_thr/render_thr можно
+# было менять без повторного инференса (POST /audits/{id}/rethreshold)
+RAW_FLOOR_CONF = float(os.getenv("RAW_FLOOR_CONF", "0.05"))
+
+# Карта раскладки ложемента (app/services/layout_prior.py): где обычно лежит
+# каждый инструмент. Учится по уверенным детекциям сохранённых аудитов; DOP-fallback
+# по ней ищет недостающие инструменты только в кропах ожидаемых мест.
+LAYOUT_PRIOR_PATH = Path(os.getenv("LAYOUT_PRIOR_PATH", str(BASE_DIR / "layout" / "layout_prior.json")))  # вне /static
+LAYOUT_ROI_ENABLED = os.getenv("LAYOUT_ROI_ENABLED", "1") == "1"
+LAYOUT_LEARN_CONF = float(os.getenv("LAYOUT_LEARN_CONF", "0.85"))   # порог детекций для обучения
+LAYOUT_MIN_SAMPLES = int(os.getenv("LAYOUT_MIN_SAMPLES", "20"))     # до этого — DOP по всему кадру
+LAYOUT_ROI_SIGMA = 3.0          # область: среднее ± sigma·std по каждому краю бокса
+LAYOUT_ROI_PAD = 0.5            # + запас в долях размера инструмента
+LAYOUT_ROI_MIN_SIDE = 320       # px исходного кадра
+LAYOUT_ROI_IMGSZ = 640          # вход DOP для кропа (вместо 1280 для всего кадра)
+
+# INT8-версии (tools/quantize.py). Включаются USE_INT8_MODELS=1, но каждая
+# подхватывается только если офлайн-проверка (gate) прошла именно для этого файла.
+INT8_DIR = MODELS_DIR / "int8"
+DET_MODEL_INT8_PATH = INT8_DIR / "yoloM_onlygroup.int8.onnx"
+SEG_MODEL_INT8_PATH = INT8_DIR / "best-seg.int8.onnx"
+DOP_MODEL_INT8_PATH = INT8_DIR / "yoloM-dop.int8.onnx"
+INT8_GATE_REPORT = INT8_DIR / "gate.json"
+INT8_GATE_TOLERANCE = float(os.getenv("INT8_GATE_TOLERANCE", "0.02"))  # доля снимков с расхождением вердикта
+USE_INT8_MODELS = os.getenv("USE_INT8_MODELS", "0") == "1"
+
+# Производные изображений: максимальная сторона (None — исходный размер)
+DERIVED_SIZES = {"thumb": 160, "medium": 960, "full": None}
+DERIVED_JPEG_QUALITY = 82
+DERIVED_WEBP_QUALITY = 80
+DERIVED_CACHE_MAX_AGE = 60 * 60 * 24 * 365   # имена файлов уникальны (uid), кэшируем надолго
+
+# Отдельный процесс-сервер инференса (python -m app.services.inference_server).
+# Если адрес задан, API-воркеры не грузят модели, а передают кадры через shared memory.
+INFERENCE_SERVER = os.getenv("INFERENCE_SERVER", "")            # "host:port" или путь unix-сокета
+# соединение передаёт pickle: без ключа сервер слушает только loopback / unix-сокет
+INFERENCE_SERVER_AUTHKEY = os.getenv("INFERENCE_SERVER_AUTHKEY", "").encode()
+INFERENCE_SERVER_TIMEOUT = float(os.getenv("INFERENCE_SERVER_TIMEOUT", "120"))   # сек на один вызов
+INFERENCE_CPUS = os.getenv("INFERENCE_CPUS", "")                 # ядра для моделей, например "0-3" или "0,2,4"
+
+# Профилирование /infer (profile=true): только при включённом флаге и,
+# если задан токен, с заголовком X-Admin-Token
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+PROFILES_DIR = Path(os.getenv("PROFILES_DIR", str(BASE_DIR / "profiles")))   # вне /static
+PROFILES_KEEP = int(os.getenv("PROFILES_KEEP", "200"))
+
 # CORS
 CORS_ORIGINS = ["http://localhost:5173", "http://127.0.0.1:5173", "*"]
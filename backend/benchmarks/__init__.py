@@ -0,0 +1,8 @@
+"""Офлайн-бенчмарки backend: микробенчмарки, run_pipeline и HTTP-нагрузка.
+
+Запуск из ``backend/``::
+
+    python -m benchmarks                      # всё, сравнение с baseline.json
+    python -m benchmarks --suite micro        # только микробенчмарки
+    python -m benchmarks --update-baseline    # сохранить текущий прогон как baseline
+"""
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.common import (
+    DEFAULT_BASELINE, DEFAULT_OUTPUT, compare, is_stub, load_inference, load_results,
+    machine_info, prepare_env, write_results,
+)
+
+SUITES = ("micro", "pipeline", "load")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks", description="Offline benchmarks for the Silex backend")
+    ap.add_argument("--suite", action="append", choices=SUITES, help="запускать только эти наборы (можно несколько раз)")
+    ap.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    ap.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    ap.add_argument("--update-baseline", action="store_true", help="записать результаты как новый baseline")
+    ap.add_argument("--tolerance", type=float, default=0.20, help="допустимый рост p50 относительно baseline (0.20 = +20%%)")
+    ap.add_argument("--metric", default="p50_ms")
+    ap.add_argument("--stub", action="store_true", help="использовать заглушку модели даже при наличии весов")
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--requests", type=int, default=40, help="число запросов в нагрузочном тесте")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--workdir", type=Path, default=None, help="каталог для uploads/SQLite (по умолчанию временный)")
+    args = ap.parse_args(argv)
+
+    workdir = prepare_env(args.workdir)
+    load_inference(force_stub=args.stub)
+    suites = args.suite or list(SUITES)
+
+    results = {}
+    try:
+        if "micro" in suites:
+            from benchmarks import micro
+            results.update(micro.run(workdir, repeat=args.repeat))
+        if "pipeline" in suites:
+            from benchmarks import pipeline
+            results.update(pipeline.run(workdir, repeat=max(3, args.repeat // 2)))
+        if "load" in suites:
+            from benchmarks import load
+            results.update(load.run(workdir, requests=args.requests, concurrency=args.concurrency))
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    meta = {
+        "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "stub_model": is_stub(),
+        "suites": suites,
+        **machine_info(),
+    }
+    write_results(args.output, results, meta)
+    print(f"results -> {args.output}")
+
+    if args.update_baseline:
+        write_results(args.baseline, results, meta)
+        print(f"baseline updated -> {args.baseline}")
+        return 0
+
+    baseline = load_results(args.baseline)
+    if baseline is None:
+        for name, r in sorted(results.items()):
+            print(f"{name:40s} {r[args.metric]:10.3f} ms")
+        print(f"no baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+
+    rows = compare(results, baseline, metric=args.metric, tolerance=args.tolerance)
+    for r in rows:
+        base = f"{r['baseline']:10.3f}" if r["baseline"] is not None else f"{'—':>10s}"
+        ratio = f"x{r['ratio']:.2f}" if r["ratio"] is not None else ""
+        flag = "  REGRESSION" if r["regression"] else ""
+        print(f"{r['name']:40s} {r['current']:10.3f} {base} {ratio:>7s}{flag}")
+    regressions = [r for r in rows if r["regression"]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over +{args.tolerance:.0%} on {args.metric}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Общие утилиты бенчмарков: окружение, замеры, сравнение с baseline."""
+from __future__ import annotations
+
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+DEFAULT_OUTPUT = BENCH_DIR / "results.json"
+
+_STATE: Dict[str, Any] = {}
+
+
+def prepare_env(workdir: Optional[Path] = None) -> Path:
+    """Изолированное окружение: uploads и SQLite во временном каталоге.
+
+    Вызывать ДО любого импорта ``app.*`` — settings читает переменные при импорте.
+    """
+    if "workdir" in _STATE:
+        return _STATE["workdir"]
+    wd = Path(workdir) if workdir else Path(tempfile.mkdtemp(prefix="silex_bench_"))
+    wd.mkdir(parents=True, exist_ok=True)
+    os.environ["UPLOAD_DIR"] = str(wd / "uploads")
+    os.environ["DB_URL"] = f"sqlite:///{wd / 'bench.db'}"
+    os.environ["LAYOUT_PRIOR_PATH"] = str(wd / "layout_prior.json")
+    _STATE["workdir"] = wd
+    return wd
+
+
+def load_inference(force_stub: bool = False):
+    """Импорт ``app.services.inference``; без весов (или с ``force_stub``) —
+    все три модели заменяются на ``StubYOLO``."""
+    if "inference" in _STATE:
+        return _STATE["inference"]
+    from app.settings import DET_MODEL_PATH, DOP_MODEL_PATH, SEG_MODEL_PATH
+
+    stub = force_stub or not DET_MODEL_PATH.exists()
+    if stub:
+        from benchmarks import stub_model
+        stub_model.install()
+    from app.services import inference
+
+    if stub:
+        from benchmarks.stub_model import StubYOLO
+        inference.SEG_MODEL = StubYOLO(str(SEG_MODEL_PATH))
+        inference.DOP_MODEL = StubYOLO(str(DOP_MODEL_PATH))
+    _STATE["inference"] = inference
+    _STATE["stub"] = stub
+    return inference
+
+
+def is_stub() -> bool:
+    return bool(_STATE.get("stub"))
+
+
+# ========= замеры =========
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = (len(s) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(s) - 1)
+    return s[lo] + (s[hi] - s[lo]) * (k - lo)
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 4) if samples_ms else 0.0,
+        "p50_ms": round(percentile(samples_ms, 0.50), 4),
+        "p95_ms": round(percentile(samples_ms, 0.95), 4),
+        "min_ms": round(min(samples_ms), 4) if samples_ms else 0.0,
+        "max_ms": round(max(samples_ms), 4) if samples_ms else 0.0,
+    }
+
+
+def bench(fn: Callable[[], Any], *, repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return summarize(samples)
+
+
+# ========= результаты / baseline =========
+
+def machine_info() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: Path, results: Dict[str, Dict[str, float]], meta: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+def load_results(path: Path) -> Optional[Dict[str, Dict[str, float]]]:
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f).get("results", {})
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            *, metric: str = "p50_ms", tolerance: float = 0.20) -> List[Dict[str, Any]]:
+    """Строки сравнения; ``regression=True`` если метрика выросла больше чем на ``tolerance``."""
+    rows: List[Dict[str, Any]] = []
+    for name, cur in sorted(current.items()):
+        base = baseline.get(name)
+        if not base or metric not in base or metric not in cur:
+            rows.append({"name": name, "current": cur.get(metric), "baseline": None, "ratio": None, "regression": False})
+            continue
+        b, c = float(base[metric]), float(cur[metric])
+        ratio = c / b if b > 0 else None
+        rows.append({
+            "name": name, "current": c, "baseline": b,
+            "ratio": round(ratio, 3) if ratio is not None else None,
+            "regression": ratio is not None and ratio > 1.0 + tolerance,
+        })
+    return rows
@@ -0,0 +1,86 @@
+"""Нагрузочный тест ``/infer`` и ``/audits/stats`` на локальной SQLite."""
+from __future__ import annotations
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.common import load_inference, summarize
+from benchmarks.stub_model import synthetic_image
+
+
+def _seed_audits(n: int) -> None:
+    from app.db.database import SessionLocal
+    from app.db.models import Audit
+
+    rnd = random.Random(0)
+    start = datetime(2025, 1, 1)
+    with SessionLocal() as db:
+        db.query(Audit).delete()
+        for i in range(n):
+            db.add(Audit(
+                image_uid=f"seed{i:06d}",
+                employee_id=f"emp{rnd.randint(1, 40):03d}",
+                created_at=start + timedelta(minutes=17 * i),
+                total_detections=rnd.randint(8, 14),
+                all_tools_present=rnd.random() < 0.7,
+                min_confidence=rnd.uniform(0.3, 0.99),
+                manual_check_required=rnd.random() < 0.4,
+                missing_tools='["Коловорот"]' if rnd.random() < 0.2 else "[]",
+                extras_or_duplicates="[]",
+            ))
+        db.commit()
+
+
+def _hammer(fn: Callable[[], None], *, requests: int, concurrency: int) -> Dict[str, float]:
+    samples: List[float] = []
+
+    def one(_: int) -> None:
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as ex:
+        list(ex.map(one, range(requests)))
+    wall = time.perf_counter() - t0
+    res = summarize(samples)
+    res["rps"] = round(requests / wall, 2) if wall > 0 else 0.0
+    res["concurrency"] = concurrency
+    return res
+
+
+def run(workdir: Path, *, requests: int = 40, concurrency: int = 4, seed_rows: int = 5000) -> Dict[str, Dict[str, float]]:
+    load_inference()
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    img = synthetic_image(workdir / "load.jpg", w=1920, h=1440, seed=3)
+    payload = img.read_bytes()
+    out: Dict[str, Dict[str, float]] = {}
+
+    with TestClient(app) as client:
+        def infer() -> None:
+            r = client.post(
+                "/infer",
+                files={"image": ("tray.jpg", payload, "image/jpeg")},
+                data={"employee_id": "bench", "check_thr": "0.7", "render_thr": "0.6"},
+            )
+            r.raise_for_status()
+
+        out[f"http_infer[c={concurrency}]"] = _hammer(infer, requests=requests, concurrency=concurrency)
+
+        _seed_audits(seed_rows)
+
+        def stats() -> None:
+            client.get("/audits/stats").raise_for_status()
+
+        def stats_range() -> None:
+            client.get("/audits/stats", params={"date_from": "2025-01-10", "date_to": "2025-01-20"}).raise_for_status()
+
+        out[f"http_stats[{seed_rows}]"] = _hammer(stats, requests=requests, concurrency=concurrency)
+        out[f"http_stats_range[{seed_rows}]"] = _hammer(stats_range, requests=requests, concurrency=concurrency)
+    return out
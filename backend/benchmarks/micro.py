@@ -0,0 +1,43 @@
+"""Микробенчмарки: classwise_nms, make_summary, draw_custom, извлечение детекций."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.common import bench, load_inference
+from benchmarks.stub_model import StubYOLO, synthetic_dets, synthetic_image
+
+
+class _CachedModel:
+    """Отдаёт заранее посчитанный результат — меряем только разбор в ``yolo_detect_boxes``."""
+
+    def __init__(self, model: StubYOLO, source: Path):
+        self._results = model.predict(source=str(source), conf=0.01)
+
+    def predict(self, **_):
+        return self._results
+
+
+def run(workdir: Path, *, repeat: int = 20) -> Dict[str, Dict[str, float]]:
+    inf = load_inference()
+    out: Dict[str, Dict[str, float]] = {}
+
+    for n in (30, 300):
+        dets = synthetic_dets(n, seed=n)
+        out[f"classwise_nms[{n}]"] = bench(lambda: inf.classwise_nms(dets), repeat=repeat)
+        out[f"make_summary[{n}]"] = bench(lambda: inf.make_summary(dets, check_thr=0.7), repeat=repeat)
+
+    img = synthetic_image(workdir / "micro_draw.jpg", w=1920, h=1440, seed=1)
+    dets = synthetic_dets(15, seed=15, w=1920, h=1440)
+    out_path = workdir / "micro_draw_out.jpg"
+    out["draw_custom[1920x1440,15]"] = bench(
+        lambda: inf.draw_custom(img, dets, render_thr=0.0, draw_boxes=True,
+                                draw_labels=True, out_path=out_path),
+        repeat=max(3, repeat // 4),
+    )
+
+    det_model = _CachedModel(StubYOLO("det.pt"), img)
+    seg_model = _CachedModel(StubYOLO("seg.pt"), img)
+    out["extract_boxes[det]"] = bench(lambda: inf.yolo_detect_boxes(det_model, str(img), conf=0.01), repeat=repeat)
+    out["extract_boxes[seg]"] = bench(lambda: inf.yolo_detect_boxes(seg_model, str(img), conf=0.01), repeat=repeat)
+    return out
@@ -0,0 +1,24 @@
+"""Сквозные замеры ``run_pipeline`` (с заглушкой модели, если весов нет)."""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict
+
+from benchmarks.common import bench, load_inference
+from benchmarks.stub_model import synthetic_image
+
+
+def run(workdir: Path, *, repeat: int = 10) -> Dict[str, Dict[str, float]]:
+    inf = load_inference()
+    out: Dict[str, Dict[str, float]] = {}
+    img = synthetic_image(workdir / "pipeline.jpg", w=4000, h=3000, seed=2)
+
+    for kind in ("det", "seg"):
+        if kind == "seg" and inf.SEG_MODEL is None:
+            continue
+        for thr in (0.5, 0.9):
+            out[f"run_pipeline[{kind},thr={thr}]"] = bench(
+                lambda: inf.run_pipeline(img, model_kind=kind, check_thr=thr),
+                repeat=repeat, warmup=1,
+            )
+    return out
@@ -0,0 +1,178 @@
+"""Заглушка YOLO для бенчмарков без весов и без сети.
+
+Повторяет ту часть интерфейса ``ultralytics.YOLO``, которую использует
+``app/services/inference.py``: ``model.names``, ``predict(...)`` и объекты
+результата с ``boxes`` / ``masks`` / ``names`` / ``orig_shape``.
+Детекции детерминированы (зависят от имени файла), так что прогоны сравнимы.
+"""
+from __future__ import annotations
+
+import sys
+import types
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+DET_NAMES: List[str] = [
+    "otvertka-minus", "otvertka-plus", "otvertka-smesh", "kolovorot",
+    "pass-contr", "pass", "sherniza", "razv-key", "otkrivashka",
+    "rozhkov-key", "bokorezi",
+]
+# SEG-модель использует часть синонимов (см. SEG_TO_DET_CANON)
+SEG_NAMES: List[str] = [
+    "otvertka-minus", "otvertka-plus", "otvertka-smesh", "kolovorot",
+    "pass-contr", "passatizhi", "sherniza", "razv-key", "open-oil",
+    "rozh-key", "bokorezi",
+]
+
+
+# ========= объекты результата =========
+
+class _Box:
+    def __init__(self, cls: int, conf: float, xyxy: Sequence[float]):
+        self.cls = np.array([float(cls)], dtype=np.float32)
+        self.conf = np.array([conf], dtype=np.float32)
+        self.xyxy = np.array([xyxy], dtype=np.float32)
+
+
+class _Boxes:
+    def __init__(self, boxes: List[_Box]):
+        self._boxes = boxes
+
+    def __iter__(self):
+        return iter(self._boxes)
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+
+class _Masks:
+    def __init__(self, xyn: List[np.ndarray]):
+        self.xyn = xyn
+
+
+class _Result:
+    def __init__(self, names: Dict[int, str], orig_shape, boxes: List[_Box], masks: Optional[List[np.ndarray]]):
+        self.names = names
+        self.orig_shape = orig_shape
+        self.boxes = _Boxes(boxes)
+        self.masks = _Masks(masks) if masks is not None else None
+
+
+class _Model:
+    def __init__(self, names: Dict[int, str]):
+        self.names = names
+
+
+# ========= генерация детекций =========
+
+def _image_size(source: Any):
+    if isinstance(source, np.ndarray):
+        h, w = source.shape[:2]
+        return w, h
+    with Image.open(str(source)) as im:
+        return im.size
+
+
+def synthetic_detections(w: int, h: int, seed: int, n_classes: int, *,
+                         extra: int = 6, poly_points: int = 0) -> List[Dict[str, Any]]:
+    """Раскладка «теневой доски»: по одному инструменту каждого класса в своей
+    ячейке сетки, плюс ``extra`` перекрывающихся кандидатов-дублей."""
+    rng = np.random.default_rng(seed)
+    cols = 4
+    rows = (n_classes + cols - 1) // cols
+    cw, ch = w / cols, h / rows
+    out: List[Dict[str, Any]] = []
+    for i in range(n_classes):
+        r, c = divmod(i, cols)
+        x1 = c * cw + cw * rng.uniform(0.05, 0.2)
+        y1 = r * ch + ch * rng.uniform(0.05, 0.2)
+        x2 = x1 + cw * rng.uniform(0.5, 0.75)
+        y2 = y1 + ch * rng.uniform(0.5, 0.75)
+        out.append({"cls": i, "conf": float(rng.uniform(0.55, 0.98)), "xyxy": [x1, y1, x2, y2]})
+    for _ in range(extra):
+        base = out[int(rng.integers(0, n_classes))]
+        x1, y1, x2, y2 = base["xyxy"]
+        dx, dy = (x2 - x1) * rng.uniform(-0.15, 0.15), (y2 - y1) * rng.uniform(-0.15, 0.15)
+        out.append({"cls": base["cls"], "conf": float(rng.uniform(0.05, 0.6)),
+                    "xyxy": [x1 + dx, y1 + dy, x2 + dx, y2 + dy]})
+    if poly_points:
+        for d in out:
+            x1, y1, x2, y2 = d["xyxy"]
+            t = np.linspace(0, 2 * np.pi, poly_points, endpoint=False)
+            px = ((x1 + x2) / 2 + (x2 - x1) / 2 * np.cos(t)) / w
+            py = ((y1 + y2) / 2 + (y2 - y1) / 2 * np.sin(t)) / h
+            d["xyn"] = np.stack([px, py], axis=1).astype(np.float32)
+    return out
+
+
+def synthetic_dets(n: int, seed: int = 0, w: int = 4000, h: int = 3000) -> List[Dict[str, Any]]:
+    """Детекции в формате пайплайна (как из ``yolo_detect_boxes``) —
+    вход для микробенчмарков ``classwise_nms`` / ``make_summary`` / ``draw_custom``."""
+    rng = np.random.default_rng(seed)
+    out: List[Dict[str, Any]] = []
+    for _ in range(n):
+        cls = int(rng.integers(0, len(DET_NAMES)))
+        x1, y1 = float(rng.uniform(0, w * 0.8)), float(rng.uniform(0, h * 0.8))
+        bw, bh = float(rng.uniform(w * 0.05, w * 0.2)), float(rng.uniform(h * 0.05, h * 0.2))
+        out.append({
+            "class_id": cls,
+            "class_name": DET_NAMES[cls],
+            "class_name_ru": DET_NAMES[cls],
+            "confidence": float(rng.uniform(0.05, 0.99)),
+            "bbox_xyxy": [x1, y1, x1 + bw, y1 + bh],
+        })
+    return out
+
+
+def synthetic_image(path: Path, w: int = 1920, h: int = 1440, seed: int = 0) -> Path:
+    rng = np.random.default_rng(seed)
+    arr = rng.integers(0, 255, size=(h // 8, w // 8, 3), dtype=np.uint8)
+    Image.fromarray(arr).resize((w, h)).save(str(path), quality=90)
+    return path
+
+
+# ========= модель =========
+
+class StubYOLO:
+    """Подменяет ``ultralytics.YOLO``; SEG-вариант определяется по имени файла."""
+
+    def __init__(self, model: Any = None, task: Optional[str] = None, **_: Any):
+        name = Path(str(model or "")).name.lower()
+        self.is_seg = task == "segment" or "seg" in name
+        labels = SEG_NAMES if self.is_seg else DET_NAMES
+        self.names = {i: n for i, n in enumerate(labels)}
+        self.model = _Model(self.names)
+        self.seed = zlib.crc32(name.encode())
+
+    def _one(self, source: Any, conf: float, max_det: int) -> _Result:
+        w, h = _image_size(source)
+        key = source.tobytes()[:64] if isinstance(source, np.ndarray) else Path(str(source)).name.encode()
+        seed = self.seed ^ zlib.crc32(key)
+        raw = synthetic_detections(w, h, seed, len(self.names), poly_points=48 if self.is_seg else 0)
+        raw = [d for d in raw if d["conf"] >= conf]
+        raw.sort(key=lambda d: d["conf"], reverse=True)
+        raw = raw[:max_det]
+        boxes = [_Box(d["cls"], d["conf"], d["xyxy"]) for d in raw]
+        masks = [d["xyn"] for d in raw] if self.is_seg else None
+        return _Result(self.names, (h, w), boxes, masks)
+
+    def predict(self, source: Any = None, conf: float = 0.25, iou: float = 0.7,
+                imgsz: int = 640, max_det: int = 300, **_: Any) -> List[_Result]:
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        return [self._one(s, conf, max_det) for s in sources]
+
+    __call__ = predict
+
+
+def install() -> None:
+    """Подставить ``StubYOLO`` до импорта ``app.services.inference``."""
+    try:
+        import ultralytics
+    except ImportError:
+        ultralytics = types.ModuleType("ultralytics")
+        sys.modules["ultralytics"] = ultralytics
+    ultralytics.YOLO = StubYOLO  # type: ignore[attr-defined]
@@ -0,0 +1,83 @@
+"""Тесты бэкенда: SQLite и uploads во временном каталоге, заглушка модели
+из ``benchmarks`` вместо весов — запускаются на CPU без сети.
+
+Из ``backend/``::
+
+    python -m pytest
+"""
+from __future__ import annotations
+
+import os
+from datetime import datetime
+from typing import Any, Dict
+
+import pytest
+
+from benchmarks.common import load_inference, prepare_env
+
+# до любого импорта app.* — settings читает окружение при импорте
+WORKDIR = prepare_env()
+os.environ.setdefault("ARCHIVE_DIR", str(WORKDIR / "archive"))
+os.environ.setdefault("PROFILES_DIR", str(WORKDIR / "profiles"))
+load_inference(force_stub=True)
+
+
+@pytest.fixture(scope="session")
+def inference():
+    return load_inference()
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def engine(client):
+    """Движок тестовой SQLite; таблица audits очищается перед тестом."""
+    from sqlalchemy import delete
+    from app.db.database import engine
+    from app.db.models import Audit
+
+    with engine.begin() as conn:
+        conn.execute(delete(Audit))
+    return engine
+
+
+def make_audit(created_at: datetime, **kw: Any):
+    from app.db.models import Audit
+
+    fields: Dict[str, Any] = {
+        "image_uid": f"u{created_at:%Y%m%d%H%M%S}",
+        "employee_id": "e1",
+        "created_at": created_at,
+        "total_detections": 11,
+        "all_tools_present": True,
+        "min_confidence": 0.9,
+        "manual_check_required": False,
+        "missing_tools": "[]",
+        "extras_or_duplicates": "[]",
+        "original_url": "/static/original/x.jpg",
+        "processed_url": "/static/processed/x.jpg",
+        "report_url": None,
+    }
+    fields.update(kw)
+    return Audit(**fields)
+
+
+@pytest.fixture(scope="session")
+def jpeg() -> bytes:
+    import cv2
+    import numpy as np
+
+    img = np.random.default_rng(5).integers(0, 255, (720, 960, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", img)[1].tobytes()
+
+
+def post_infer(client, jpeg: bytes, path: str = "/infer", headers=None, **data: Any):
+    return client.post(path, files={"image": ("a.jpg", jpeg, "image/jpeg")},
+                       data={"employee_id": "e1", **data}, headers=headers)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.api import routes_audits
+from app.api.routes_audits import date_bounds
+from app.services import archive
+from app.services.archive import archive_path, iter_archived, query_archive, write_month
+from tests.conftest import make_audit
+
+
+def row(i: int, ts: str, employee: str = "e1", manual: bool = False):
+    return {"id": i, "employee_id": employee, "created_at": ts, "manual_check_required": manual}
+
+
+# ========= date_bounds =========
+
+def test_date_bounds_single_day():
+    assert date_bounds("2025-03-10") == (datetime(2025, 3, 10), datetime(2025, 3, 11))
+
+
+def test_date_bounds_range_is_inclusive():
+    assert date_bounds(date_from="2025-03-01", date_to="2025-03-31") == (
+        datetime(2025, 3, 1), datetime(2025, 4, 1))
+    assert date_bounds(date_to="2025-12-31") == (None, datetime(2026, 1, 1))
+    assert date_bounds() == (None, None)
+
+
+def test_date_bounds_rejects_bad_date():
+    with pytest.raises(HTTPException) as e:
+        date_bounds("10.03.2025")
+    assert e.value.status_code == 400
+
+
+# ========= файлы архива =========
+
+def test_write_month_round_trip(tmp_path):
+    rows = [row(1, "2025-01-02 10:00:00"), row(2, "2025-01-31 23:59:59", manual=True)]
+    assert write_month(rows, (2025, 1), tmp_path) == 2
+    assert list(iter_archived((2025, 1), tmp_path)) == rows
+    assert archive.archived_months(tmp_path) == [(2025, 1)]
+    # временный файл переименован, мусора не остаётся
+    assert [p.name for p in tmp_path.iterdir()] == [archive_path((2025, 1), tmp_path).name]
+
+
+def test_iter_archived_missing_month(tmp_path):
+    assert list(iter_archived((2020, 1), tmp_path)) == []
+
+
+# ========= query_archive =========
+
+@pytest.fixture
+def arch(tmp_path):
+    write_month([row(1, "2025-01-05 08:00:00", "Alice"), row(2, "2025-01-20 08:00:00", "bob", manual=True)],
+                (2025, 1), tmp_path)
+    write_month([row(3, "2025-02-01 00:00:00", "alice"), row(4, "2025-02-28 12:00:00", "carol", manual=True)],
+                (2025, 2), tmp_path)
+    return tmp_path
+
+
+def ids(rows):
+    return [r["id"] for r in rows]
+
+
+def test_query_archive_newest_first(arch):
+    assert ids(query_archive(base=arch)) == [4, 3, 2, 1]
+
+
+def test_query_archive_date_range_is_half_open(arch):
+    assert ids(query_archive(date_from=datetime(2025, 1, 20), date_to=datetime(2025, 2, 1), base=arch)) == [2]
+    assert ids(query_archive(date_from=datetime(2025, 2, 1), base=arch)) == [4, 3]
+
+
+def test_query_archive_filters(arch):
+    assert ids(query_archive(employee_search="ALI", base=arch)) == [3, 1]
+    assert ids(query_archive(employees=["bob", "carol"], base=arch)) == [4, 2]
+    assert ids(query_archive(manual="yes", base=arch)) == [4, 2]
+    assert ids(query_archive(manual="no", base=arch)) == [3, 1]
+
+
+def test_query_archive_skips_months_outside_range(arch, monkeypatch):
+    read = []
+    orig = archive.iter_archived
+    monkeypatch.setattr(archive, "iter_archived", lambda m, base: read.append(m) or orig(m, base))
+    query_archive(date_from=datetime(2025, 2, 10), base=arch)
+    assert read == [(2025, 2)]
+
+
+# ========= /audits/export =========
+
+@pytest.fixture
+def export(client, engine, arch, monkeypatch):
+    """3 живые строки (февраль-март 2025) + 4 архивные (arch); счётчик чтений архива."""
+    with Session(engine) as db:
+        db.add_all(make_audit(datetime(2025, 3, d)) for d in (1, 2, 3))
+        db.commit()
+    reads = []
+    monkeypatch.setattr(routes_audits, "query_archive",
+                        lambda **kw: reads.append(kw) or query_archive(base=arch, **kw))
+
+    def run(**body):
+        r = client.post("/audits/export", json=body)
+        assert r.status_code == 200
+        return [i["created_at"][:10] for i in r.json()["items"]], len(reads)
+    return run
+
+
+def test_export_live_page_skips_archive(export):
+    assert export(page_from=1, page_to=1, size=2) == (["2025-03-03", "2025-03-02"], 0)
+
+
+def test_export_pages_continue_into_archive(export):
+    assert export(page_from=2, page_to=2, size=2) == (["2025-03-01", "2025-02-28"], 1)
+    assert export(page_from=3, page_to=3, size=2) == (["2025-02-01", "2025-01-20"], 2)
+    assert export(page_from=9, page_to=9, size=2)[0] == []
+
+
+def test_export_all_and_without_archive(export):
+    items, reads = export()
+    assert len(items) == 7 and reads == 1
+    assert export(include_archive=False) == (["2025-03-03", "2025-03-02", "2025-03-01"], 1)
+    assert export(date_from="2025-02-01", date_to="2025-02-28")[0] == ["2025-02-28", "2025-02-01"]
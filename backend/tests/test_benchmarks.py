@@ -0,0 +1,15 @@
+"""Смоук-прогон бенчмарков (по одному повтору) — чтобы они не ломались незаметно."""
+from __future__ import annotations
+
+from benchmarks import micro, pipeline
+from tests.conftest import WORKDIR
+
+
+def test_micro_suite_runs():
+    res = micro.run(WORKDIR, repeat=1)
+    assert res and all("p50_ms" in v for v in res.values())
+
+
+def test_pipeline_suite_runs():
+    res = pipeline.run(WORKDIR, repeat=1)
+    assert res and all("p50_ms" in v for v in res.values())
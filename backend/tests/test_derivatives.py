@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import gc
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services import derivatives
+from app.settings import PROCESSED_DIR
+
+
+@pytest.fixture(scope="module")
+def processed():
+    """Снимок 1200x900 в processed/ — как после /infer."""
+    img = np.random.default_rng(28).integers(0, 255, (900, 1200, 3), dtype=np.uint8)
+    p = PROCESSED_DIR / "deriv28.jpg"
+    cv2.imwrite(str(p), img)
+    return p
+
+
+def get(client, name, **params):
+    headers = params.pop("headers", {})
+    return client.get(f"/derived/processed/{name}", params=params, headers=headers)
+
+
+@pytest.mark.parametrize("size, side", [("thumb", 160), ("medium", 960)])
+@pytest.mark.parametrize("fmt, mime", [("jpeg", "image/jpeg"), ("webp", "image/webp")])
+def test_sizes_and_formats(client, processed, size, side, fmt, mime):
+    r = get(client, processed.name, size=size, fmt=fmt)
+    assert r.status_code == 200 and r.headers["content-type"] == mime
+    im = Image.open(io.BytesIO(r.content))
+    assert im.format == fmt.upper() and max(im.size) == side
+    assert im.size[0] / im.size[1] == pytest.approx(1200 / 900, abs=0.01)
+
+
+def test_full_jpeg_is_the_source(client, processed):
+    r = get(client, processed.name, size="full", fmt="jpeg")
+    assert r.content == processed.read_bytes()
+    im = Image.open(io.BytesIO(get(client, processed.name, size="full", fmt="webp").content))
+    assert im.format == "WEBP" and im.size == (1200, 900)
+
+
+def test_auto_format_follows_accept(client, processed):
+    r = get(client, processed.name, headers={"Accept": "image/avif,image/webp,*/*"})
+    assert r.headers["content-type"] == "image/webp" and r.headers["vary"] == "Accept"
+    assert get(client, processed.name, headers={"Accept": "image/*"}).headers["content-type"] == "image/jpeg"
+
+
+def test_etag_and_304(client, processed):
+    r = get(client, processed.name, fmt="jpeg")
+    etag = r.headers["etag"]
+    assert "immutable" in r.headers["cache-control"]
+    r = get(client, processed.name, fmt="jpeg", headers={"If-None-Match": f'"other", {etag}'})
+    assert r.status_code == 304 and not r.content and r.headers["etag"] == etag
+    assert get(client, processed.name, fmt="jpeg", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("kind, name", [("processed", "missing.jpg"), ("raw", "deriv28.jpg"),
+                                        ("processed", "..%2Fsecret.jpg")])
+def test_unknown_sources_are_404(client, processed, kind, name):
+    assert client.get(f"/derived/{kind}/{name}").status_code == 404
+
+
+def test_etag_cache_is_bounded_and_forgets(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivatives, "ETAG_CACHE_SIZE", 3)
+    monkeypatch.setattr(derivatives, "_etags", type(derivatives._etags)())
+    files = []
+    for i in range(5):
+        p = tmp_path / f"{i}.bin"
+        p.write_bytes(b"x" * (i + 1))
+        derivatives.etag_for(p)
+        files.append(p)
+    assert list(derivatives._etags) == [str(p) for p in files[2:]]
+    derivatives.forget(files[4])
+    assert str(files[4]) not in derivatives._etags
+
+
+def test_build_locks_are_released():
+    with derivatives._lock_for("processed/x.jpg"):
+        assert "processed/x.jpg" in derivatives._locks
+    gc.collect()
+    assert "processed/x.jpg" not in derivatives._locks
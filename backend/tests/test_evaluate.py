@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.inference import iou_xyxy
+from tools.evaluate import match, parse_config, read_labels
+
+
+def test_parse_config_forms():
+    assert parse_config("base") == {"name": "base", "backend": "auto", "params": {}}
+    assert parse_config("fast: imgsz=960 dop=0") == {
+        "name": "fast", "backend": "auto", "params": {"DET_IMGSZ": 960, "DOP_FALLBACK": False}}
+    assert parse_config("q8,backend=int8,roi=1") == {
+        "name": "q8", "backend": "int8", "params": {"LAYOUT_ROI_ENABLED": True}}
+    assert parse_config("seg_imgsz=640")["name"] == "seg_imgsz=640"
+
+
+@pytest.mark.parametrize("spec", ["x: bogus=1", "x: backend=fp16", "x: imgsz"])
+def test_parse_config_errors(spec):
+    with pytest.raises(ValueError):
+        parse_config(spec)
+
+
+def det(cls, box, conf=1.0):
+    return {"class_name": cls, "confidence": conf, "bbox_xyxy": box}
+
+
+def test_match_greedy_by_confidence():
+    gts = [det("pass", [0, 0, 10, 10]), det("pass", [20, 20, 30, 30]), det("bokorezi", [0, 0, 5, 5])]
+    preds = [
+        det("pass", [0, 0, 10, 10], 0.6),
+        det("pass", [1, 1, 10, 10], 0.9),     # уверенней — забирает первый бокс
+        det("razv-key", [0, 0, 10, 10], 0.8),
+    ]
+    assert match(preds, gts, 0.5, iou_xyxy) == {
+        "pass": {"tp": 1, "fp": 1, "fn": 1},
+        "bokorezi": {"tp": 0, "fp": 0, "fn": 1},
+        "razv-key": {"tp": 0, "fp": 1, "fn": 0},
+    }
+
+
+def test_read_labels_boxes_polygons_and_synonyms(tmp_path):
+    p = tmp_path / "a.txt"
+    p.write_text("0 0.5 0.5 0.2 0.4\n1 0.1 0.1 0.3 0.1 0.3 0.3 0.1 0.3\n\n", encoding="utf-8")
+    gts = read_labels(p, {0: "pass", 1: "open-oil"}, {"open-oil": "otkrivashka"}, w=100, h=50)
+    assert [g["class_name"] for g in gts] == ["pass", "otkrivashka"]
+    assert gts[0]["bbox_xyxy"] == pytest.approx([40, 15, 60, 35])
+    assert gts[1]["bbox_xyxy"] == pytest.approx([10, 5, 30, 15])
+    assert read_labels(tmp_path / "none.txt", {}, {}, 1, 1) == []
+
+
+# ========= CLI =========
+
+@pytest.fixture
+def dataset(tmp_path):
+    import cv2
+    import numpy as np
+
+    (tmp_path / "images" / "val").mkdir(parents=True)
+    (tmp_path / "labels" / "val").mkdir(parents=True)
+    (tmp_path / "data.yaml").write_text("names: [pass, open-oil]\n", encoding="utf-8")
+    for i in range(2):
+        img = np.random.default_rng(i).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / "images" / "val" / f"{i}.jpg"), img)
+        (tmp_path / "labels" / "val" / f"{i}.txt").write_text("0 0.5 0.5 0.2 0.2\n", encoding="utf-8")
+    return tmp_path
+
+
+def test_refuses_to_run_without_weights(dataset, capsys):
+    from app.settings import DET_MODEL_PATH
+    from tools.evaluate import main
+
+    if DET_MODEL_PATH.exists():
+        pytest.skip("model weights are present")
+    assert main(["--dataset", str(dataset), "--split", "val"]) == 2
+    assert "--stub" in capsys.readouterr().out
+
+
+def test_stub_run_is_marked(dataset, tmp_path):
+    from app.services.serialization import read_json
+    from tools.evaluate import main
+
+    out = tmp_path / "eval.json"
+    assert main(["--dataset", str(dataset), "--split", "val", "--stub", "--warmup", "0",
+                 "--config", "base", "--config", "fast: imgsz=640", "--out", str(out)]) == 0
+    report = read_json(out)
+    assert report["stub"] is True
+    assert [c["name"] for c in report["configs"]] == ["base", "fast"]
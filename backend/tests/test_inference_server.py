@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services import runner
+from app.services.inference_client import InferenceClient, InferenceServerUnavailable
+from app.services.inference_server import is_local_address, parse_address, parse_cpus, serve
+from app.services.profiling import StageTimer
+
+KEY = b"test-key"
+
+
+@pytest.fixture(scope="module")
+def address(tmp_path_factory, inference):
+    addr = str(tmp_path_factory.mktemp("srv") / "inf.sock")
+    threading.Thread(target=serve, args=(addr, "", KEY), daemon=True).start()
+    for _ in range(100):
+        try:
+            InferenceClient(addr, authkey=KEY).ping()
+            return addr
+        except InferenceServerUnavailable:
+            time.sleep(0.05)
+    pytest.fail("inference server did not start")
+
+
+@pytest.fixture
+def remote(address):
+    return InferenceClient(address, authkey=KEY)
+
+
+@pytest.fixture(scope="module")
+def bgr():
+    return np.random.default_rng(31).integers(0, 255, (720, 960, 3), dtype=np.uint8)
+
+
+def test_parse_address_and_cpus():
+    assert parse_address("127.0.0.1:8765") == ("127.0.0.1", 8765)
+    assert parse_address("/run/inf.sock") == "/run/inf.sock"
+    assert parse_cpus("0-2, 5,") == {0, 1, 2, 5}
+
+
+@pytest.mark.parametrize("addr, local", [
+    ("/run/inf.sock", True), (("127.0.0.1", 1), True), (("localhost", 1), True),
+    (("[::1]", 1), True), (("0.0.0.0", 1), False), (("inference", 1), False),
+])
+def test_is_local_address(addr, local):
+    assert is_local_address(addr) is local
+
+
+def test_non_loopback_bind_needs_authkey():
+    with pytest.raises(SystemExit, match="INFERENCE_SERVER_AUTHKEY"):
+        serve("0.0.0.0:0", "", b"")
+
+
+def test_round_trip_matches_local(remote, inference, bgr):
+    timer = StageTimer()
+    got = remote.run_pipeline(bgr, model_kind="det", check_thr=0.7, timer=timer)
+    ref = inference.run_pipeline(bgr.copy(), model_kind="det", check_thr=0.7)
+    assert got["summary"] == ref["summary"]
+    assert [d["class_name"] for d in got["detections"]] == [d["class_name"] for d in ref["detections"]]
+    # разбивка по стадиям приходит с сервера
+    assert "det" in timer.as_dict()["stages_ms"]
+
+
+def test_raw_then_resolve(remote, inference, bgr):
+    raw = remote.detect_raw(bgr, model_kind="det", floor_conf=0.05)
+    got = remote.resolve(raw, check_thr=0.7, image=bgr)
+    assert got["summary"] == inference.run_pipeline(bgr.copy(), model_kind="det", check_thr=0.7)["summary"]
+    # проходы сохранены в raw — повторный пересчёт без кадра
+    assert remote.resolve(raw, check_thr=0.7)["summary"] == got["summary"]
+
+
+def test_class_order(remote, inference):
+    assert remote.class_order() == list(inference.CLASS_ORDER)
+
+
+@pytest.mark.parametrize("key", [b"wrong", b""])
+def test_bad_authkey_is_unavailable(address, key):
+    with pytest.raises(InferenceServerUnavailable):
+        InferenceClient(address, authkey=key).ping()
+    # сервер продолжает принимать соединения
+    assert InferenceClient(address, authkey=KEY).ping()["pid"]
+
+
+def test_runner_renders_locally(remote, address, bgr, tmp_path, monkeypatch):
+    calls = []
+    call = remote.call
+    monkeypatch.setattr(remote, "call", lambda msg: calls.append(msg["op"]) or call(msg))
+    monkeypatch.setattr(runner, "INFERENCE_SERVER", address)
+    monkeypatch.setattr(runner, "_client", remote)
+    monkeypatch.setattr(runner, "_class_order", None)
+
+    pred = runner.run_pipeline(bgr, model_kind="det", check_thr=0.7)
+    for i in range(2):
+        runner.draw_custom(bgr, pred["detections"], render_thr=0.0, draw_boxes=True,
+                           draw_labels=True, out_path=tmp_path / f"{i}.jpg")
+    assert cv2.imread(str(tmp_path / "1.jpg")).shape == bgr.shape
+    # кадр на рендер не отправляется, порядок классов запрашивается один раз
+    assert calls == ["run_pipeline", "class_order"]
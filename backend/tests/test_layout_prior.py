@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services import layout_prior
+from app.services.layout_prior import LayoutPrior, confident_boxes
+from app.settings import LAYOUT_PRIOR_PATH, UPLOAD_DIR
+
+
+def det(cls, box, conf=0.95):
+    return {"class_name": cls, "confidence": conf, "bbox_xyxy": box}
+
+
+def test_confident_boxes_only_unique_confident_classes():
+    dets = [
+        det("pass", [100, 50, 300, 150]),
+        det("sherniza", [0, 0, 10, 10]), det("sherniza", [20, 20, 30, 30]),   # дубликат
+        det("bokorezi", [0, 0, 10, 10], conf=0.5),                            # неуверенная
+        det("razv-key", [50, 50, 40, 60]),                                    # вырожденный бокс
+    ]
+    assert confident_boxes(dets, 1000, 500, min_conf=0.85) == [("pass", [0.1, 0.1, 0.3, 0.3])]
+    assert confident_boxes(dets, 0, 500) == []
+
+
+def test_observe_running_mean_and_variance():
+    p = LayoutPrior()
+    for x in (0.1, 0.2, 0.3):
+        p.observe("pass", [x, 0.5, x + 0.1, 0.6])
+    s = p.classes["pass"]
+    assert s["n"] == 3 and p.samples("pass") == 3 and p.samples("sherniza") == 0
+    assert s["mean"] == pytest.approx([0.2, 0.5, 0.3, 0.6])
+    assert s["m2"][0] == pytest.approx(0.02) and s["m2"][1] == pytest.approx(0.0)
+
+
+def test_region_needs_min_samples():
+    p = LayoutPrior()
+    for _ in range(4):
+        p.observe("pass", [0.4, 0.4, 0.5, 0.5])
+    assert p.region("pass", 1000, 1000, min_samples=5) is None
+    assert p.region("kolovorot", 1000, 1000, min_samples=1) is None
+    assert p.region("pass", 1000, 1000, min_samples=4) is not None
+
+
+def test_region_grows_with_spread_and_pad():
+    p = LayoutPrior()
+    for x in (0.40, 0.42, 0.44):
+        p.observe("pass", [x, 0.40, x + 0.10, 0.50])
+    x1, y1, x2, y2 = p.region("pass", 1000, 1000, sigma=0.0, pad=0.0, min_side=0, min_samples=1)
+    assert (x1, y1, x2, y2) == (420, 400, 520, 500)
+    wide = p.region("pass", 1000, 1000, sigma=3.0, pad=0.5, min_side=0, min_samples=1)
+    assert wide[0] < x1 and wide[2] > x2 and wide[1] < y1 and wide[3] > y2
+
+
+def test_region_min_side_and_clipping():
+    p = LayoutPrior()
+    for _ in range(3):
+        p.observe("pass", [0.0, 0.0, 0.02, 0.02])
+    assert p.region("pass", 1000, 800, sigma=0.0, pad=0.0, min_side=320, min_samples=1) == [0, 0, 170, 168]
+    # кадр меньше min_side — область не выходит за кадр
+    assert p.region("pass", 200, 100, sigma=0.0, pad=0.0, min_side=320, min_samples=1) == [0, 0, 102, 51]
+
+
+def test_record_and_reload(tmp_path):
+    path = tmp_path / "sub" / "prior.json"
+    dets = [det("pass", [100, 100, 200, 200]), det("sherniza", [10, 10, 20, 20], conf=0.3)]
+    assert layout_prior.record(dets, 1000, 1000, min_conf=0.85, path=path) == 1
+    assert layout_prior.record(dets, 1000, 1000, min_conf=0.85, path=path) == 1
+    assert layout_prior.record([], 1000, 1000, path=path) == 0
+    prior = layout_prior.current(path)
+    assert prior.samples("pass") == 2 and prior.samples("sherniza") == 0
+    assert prior.classes["pass"]["mean"] == pytest.approx([0.1, 0.1, 0.2, 0.2])
+
+
+def test_unknown_version_is_ignored(tmp_path):
+    path = tmp_path / "prior.json"
+    path.write_text('{"version": 99, "classes": {"pass": {"n": 5}}}', encoding="utf-8")
+    assert layout_prior.current(path).classes == {}
+
+
+def test_prior_is_not_served_as_static():
+    assert UPLOAD_DIR not in LAYOUT_PRIOR_PATH.parents
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import pytest
+
+from app.services.masks import decode_mask, encode_detections, encode_mask
+
+SQUARE = [(10.2, 10.7), (50.4, 10.1), (50.5, 40.6), (30.0, 40.4), (10.3, 40.2)]
+
+
+def flat(poly):
+    return [v for pt in poly for v in pt]
+
+
+def test_poly_is_lossless():
+    # float32 внутри simplify_polygon
+    assert flat(decode_mask(encode_mask(SQUARE, "poly"))) == pytest.approx(flat(SQUARE), abs=1e-4)
+
+
+@pytest.mark.parametrize("fmt", ["int", "packed"])
+def test_integer_formats_round_to_pixels(fmt):
+    got = decode_mask(encode_mask(SQUARE, fmt))
+    assert got == [(float(round(x)), float(round(y))) for x, y in SQUARE]
+
+
+def test_packed_layout():
+    enc = encode_mask(SQUARE, "packed")
+    assert enc["format"] == "i16b64" and enc["count"] == len(SQUARE)
+
+
+def test_tolerance_drops_collinear_points():
+    enc = encode_mask(SQUARE, "int", tolerance_px=2.0)
+    assert len(enc) == 4
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        encode_mask(SQUARE, "rle")
+    with pytest.raises(ValueError):
+        decode_mask({"format": "rle", "data": ""})
+
+
+def test_encode_detections_keeps_source():
+    dets = [{"class_name": "pass", "mask": SQUARE}, {"class_name": "kolovorot"}]
+    out = encode_detections(dets, "packed")
+    assert isinstance(out[0]["mask"], dict) and "mask" not in out[1]
+    assert dets[0]["mask"] is SQUARE
+    assert encode_detections(dets, "poly") is dets
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.db import partitions
+from app.db.models import Audit
+from app.db.partitions import add_months, drop_month, month_range, months_between, parse_month
+from app.services.archive import archive_month, iter_archived
+from tests.conftest import make_audit
+
+
+def test_add_months():
+    assert add_months((2025, 11), 3) == (2026, 2)
+    assert add_months((2025, 1), -1) == (2024, 12)
+    assert add_months((2025, 6), -18) == (2023, 12)
+    assert add_months((2025, 6), 0) == (2025, 6)
+
+
+def test_months_between():
+    assert months_between((2025, 11), (2026, 2)) == [(2025, 11), (2025, 12), (2026, 1), (2026, 2)]
+    assert months_between((2025, 3), (2025, 3)) == [(2025, 3)]
+    assert months_between((2025, 4), (2025, 3)) == []
+
+
+def test_parse_month():
+    assert parse_month("2025-07") == (2025, 7)
+    with pytest.raises(ValueError):
+        parse_month("2025/07")
+
+
+PARTS = [
+    {"name": "p202502", "bound": "2025-03-01", "rows": 0},
+    {"name": "p202503", "bound": "2025-04-01", "rows": 0},
+    {"name": "pmax", "bound": None, "rows": 0},
+]
+
+
+def test_month_range_follows_partitions(engine, monkeypatch):
+    monkeypatch.setattr(partitions, "list_partitions", lambda conn: PARTS)
+    with engine.connect() as conn:
+        # первая партиция держит всё ниже своей границы
+        assert month_range(conn, (2025, 2)) == (None, datetime(2025, 3, 1))
+        assert month_range(conn, (2025, 3)) == (datetime(2025, 3, 1), datetime(2025, 4, 1))
+        # месяца без партиции (или не MySQL) — просто границы месяца
+        assert month_range(conn, (2025, 6)) == (datetime(2025, 6, 1), datetime(2025, 7, 1))
+
+
+def _count(engine) -> int:
+    with Session(engine) as db:
+        return db.scalar(select(func.count()).select_from(Audit))
+
+
+def _seed(engine, *stamps: datetime) -> None:
+    with Session(engine) as db:
+        db.add_all(make_audit(ts) for ts in stamps)
+        db.commit()
+
+
+def test_drop_month_deletes_only_that_month(engine):
+    _seed(engine, datetime(2025, 1, 31, 23, 59), datetime(2025, 2, 1), datetime(2025, 2, 28, 12), datetime(2025, 3, 1))
+    assert drop_month(engine, (2025, 2)) == "delete"
+    assert _count(engine) == 2
+
+
+def test_drop_month_refuses_count_mismatch(engine):
+    _seed(engine, datetime(2025, 2, 1), datetime(2025, 2, 2))
+    with pytest.raises(RuntimeError):
+        drop_month(engine, (2025, 2), expect=1)
+    assert _count(engine) == 2
+
+
+def test_archive_month_then_drop(engine, tmp_path):
+    _seed(engine, datetime(2025, 1, 10), datetime(2025, 1, 11), datetime(2025, 2, 1))
+    res = archive_month(engine, (2025, 1), base=tmp_path)
+    assert (res["rows"], res["db_rows"], res["dropped"]) == (2, 2, "delete")
+    assert len(list(iter_archived((2025, 1), tmp_path))) == 2
+    assert _count(engine) == 1
+    # повторный запуск не дублирует уже выгруженные строки
+    assert archive_month(engine, (2025, 1), base=tmp_path)["rows"] == 2
+
+
+def test_archive_first_partition_keeps_stray_rows(engine, tmp_path, monkeypatch):
+    # строка января в первой партиции (p202502) после DROP январской
+    monkeypatch.setattr(partitions, "list_partitions", lambda conn: PARTS)
+    _seed(engine, datetime(2025, 1, 15), datetime(2025, 2, 3), datetime(2025, 3, 3))
+    res = archive_month(engine, (2025, 2), base=tmp_path, drop=False)
+    assert (res["rows"], res["db_rows"], res["also"]) == (1, 2, ["2025-01"])
+    assert len(list(iter_archived((2025, 1), tmp_path))) == 1
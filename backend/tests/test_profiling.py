@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import pstats
+import time
+
+import pytest
+
+from app.services import profiling
+from app.services.profiling import StageTimer
+from tests.conftest import post_infer
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_ADMIN_TOKEN", "")
+
+
+# ========= StageTimer =========
+
+def test_stage_timer_accumulates():
+    t = StageTimer()
+    for _ in range(2):
+        with t.stage("det"):
+            time.sleep(0.002)
+    t.note("candidates", 7)
+    out = t.as_dict()
+    assert out["calls"] == {"det": 2}
+    assert out["stages_ms"]["det"] >= 4.0
+    assert out["total_ms"] >= out["stages_ms"]["det"]
+    assert out["notes"] == {"candidates": 7}
+
+
+def test_stage_timer_merges_remote_breakdown():
+    t = StageTimer()
+    with t.stage("render"):
+        pass
+    t.merge({"stages_ms": {"det": 12.5, "render": 1.0}, "calls": {"det": 1, "render": 1}, "notes": {"n": 3}})
+    out = t.as_dict()
+    assert out["calls"] == {"render": 2, "det": 1}
+    assert out["stages_ms"]["det"] == 12.5 and out["notes"] == {"n": 3}
+
+
+# ========= /infer?profile =========
+
+def test_profile_disabled(client, jpeg, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", False)
+    assert post_infer(client, jpeg, profile="true").status_code == 403
+    assert client.get("/profiles").status_code == 403
+    # без profile запрос обычный
+    assert "profile" not in post_infer(client, jpeg).json()
+
+
+def test_profile_requires_admin_token(client, jpeg, enabled, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILING_ADMIN_TOKEN", "s3cret")
+    assert post_infer(client, jpeg, profile="true").status_code == 403
+    assert post_infer(client, jpeg, profile="true", headers={"X-Admin-Token": "nope"}).status_code == 403
+    assert post_infer(client, jpeg, profile="true", headers={"X-Admin-Token": "s3cret"}).status_code == 200
+
+
+def test_profile_stages_and_dump(client, jpeg, enabled):
+    r = post_infer(client, jpeg, profile="true")
+    assert r.status_code == 200
+    prof = r.json()["profile"]
+    assert {"decode", "det", "render", "io_report", "db"} <= set(prof["stages_ms"])
+    assert prof["calls"]["det"] == 1
+    # дамп — только вызов пайплайна, без рендера и записи
+    stats = pstats.Stats(str(profiling.PROFILES_DIR / prof["dump"]))
+    funcs = {name for _, _, name in stats.stats}
+    assert "run_pipeline" in funcs and "draw_custom" not in funcs
+
+    items = client.get("/profiles").json()["items"]
+    assert items[0]["name"] == prof["dump"] and items[0]["audit_id"] == r.json()["audit_id"]
+    assert client.get(f"/profiles/{prof['dump']}").content == (profiling.PROFILES_DIR / prof["dump"]).read_bytes()
+    assert client.get("/profiles/..%2Fbench.db").status_code == 404
+
+
+def test_profile_busy_slot(client, jpeg, enabled):
+    with profiling.profiler_slot() as ok:
+        assert ok
+        r = post_infer(client, jpeg, profile="true")
+        assert r.status_code == 409
+        # непрофилируемые запросы слот не занимают
+        assert post_infer(client, jpeg).status_code == 200
+    assert post_infer(client, jpeg, profile="true").status_code == 200
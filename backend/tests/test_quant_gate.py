@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from app.services.quant_gate import file_sha256, gate_allows
+
+
+def gate_for(path, *, passed=True, **extra):
+    entry = {"file": path.name, "sha256": file_sha256(path), **extra}
+    if passed is not None:
+        entry["passed"] = passed
+    return {"passed": bool(passed), "models": {"det": entry}}
+
+
+def test_gate_allows_approved_file(tmp_path):
+    p = tmp_path / "det.int8.onnx"
+    p.write_bytes(b"model")
+    assert gate_allows(p, gate_for(p))
+
+
+def test_gate_rejects_failed_model(tmp_path):
+    p = tmp_path / "det.int8.onnx"
+    p.write_bytes(b"model")
+    assert not gate_allows(p, gate_for(p, passed=False))
+
+
+def test_gate_rejects_changed_file(tmp_path):
+    p = tmp_path / "det.int8.onnx"
+    p.write_bytes(b"model")
+    gate = gate_for(p)
+    p.write_bytes(b"requantized")
+    assert not gate_allows(p, gate)
+
+
+def test_gate_rejects_old_format_without_per_model_result(tmp_path):
+    p = tmp_path / "seg.int8.onnx"
+    p.write_bytes(b"model")
+    gate = gate_for(p, passed=None)
+    gate["passed"] = True
+    assert not gate_allows(p, gate)
+
+
+def test_gate_rejects_missing_file_or_gate(tmp_path):
+    p = tmp_path / "dop.int8.onnx"
+    assert not gate_allows(p, {"passed": True, "models": {}})
+    p.write_bytes(b"model")
+    assert not gate_allows(p, {})
+
+
+# ========= tools.quantize =========
+
+def test_merge_report_keeps_other_models():
+    from tools.quantize import merge_report
+
+    old = {"passed": True, "models": {"det": {"passed": True, "file": "det.onnx"},
+                                      "seg": {"passed": True, "file": "seg.onnx"}}}
+    new = {"passed": False, "n_images": 5, "models": {"seg": {"passed": False, "file": "seg.onnx"}}}
+    merged = merge_report(old, new)
+    assert merged["models"]["det"] == old["models"]["det"]
+    assert merged["models"]["seg"]["passed"] is False
+    assert merged["passed"] is False and merged["n_images"] == 5
+    assert merge_report(None, {"passed": True, "models": {"dop": {"passed": True}}})["passed"] is True
+
+
+def test_calibration_uses_pipeline_imgsz():
+    from app.settings import DET_IMGSZ, DOP_IMGSZ, SEG_FALLBACK_IMGSZ
+    from tools.quantize import MODELS
+
+    assert [MODELS[k][3] for k in ("det", "seg", "dop")] == [DET_IMGSZ, SEG_FALLBACK_IMGSZ, DOP_IMGSZ]
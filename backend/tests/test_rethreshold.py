@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from app.services.serialization import read_json
+from app.settings import PROCESSED_DIR, REPORTS_DIR
+from tests.conftest import post_infer
+
+
+@pytest.fixture
+def audit(client, jpeg):
+    return post_infer(client, jpeg, check_thr="0.7").json()
+
+
+def rethreshold(client, audit_id, **body):
+    return client.post(f"/audits/{audit_id}/rethreshold", json=body)
+
+
+def renders(uid: str):
+    return sorted(p.name for p in PROCESSED_DIR.glob(f"{uid}_r*.jpg"))
+
+
+def test_same_threshold_matches_infer(client, audit):
+    r = rethreshold(client, audit["audit_id"], check_thr=0.7, render=False)
+    assert r.status_code == 200
+    assert r.json()["summary"] == audit["summary"]
+    assert r.json()["processed_url"] == audit["processed_url"]
+
+
+def test_lower_threshold_finds_more(client, audit):
+    hi = rethreshold(client, audit["audit_id"], check_thr=0.95, render=False).json()
+    lo = rethreshold(client, audit["audit_id"], check_thr=0.05, render=False).json()
+    assert len(lo["summary"]["missing_tools"]) <= len(hi["summary"]["missing_tools"])
+
+
+def test_missing_audit(client):
+    assert rethreshold(client, 999999).status_code == 404
+    assert rethreshold(client, 1, check_thr=1.5).status_code == 422
+
+
+def test_render_names_depend_on_params(client, audit):
+    a = rethreshold(client, audit["audit_id"], check_thr=0.5).json()["processed_url"]
+    b = rethreshold(client, audit["audit_id"], check_thr=0.5).json()["processed_url"]
+    c = rethreshold(client, audit["audit_id"], check_thr=0.5, draw_labels=False).json()["processed_url"]
+    assert a == b != c != audit["processed_url"]
+    assert (PROCESSED_DIR / Path(c).name).is_file()
+
+
+def test_old_renders_are_pruned(client, audit):
+    uid = Path(audit["processed_url"]).stem
+    for thr in (0.3, 0.4, 0.5):
+        last = rethreshold(client, audit["audit_id"], check_thr=thr).json()["processed_url"]
+    # исходный рендер аудита не трогается, из перерисовок остаётся последняя
+    assert renders(uid) == [Path(last).name]
+    assert (PROCESSED_DIR / f"{uid}.jpg").is_file()
+
+
+def test_persist_updates_audit_and_report(client, audit):
+    uid = Path(audit["processed_url"]).stem
+    kept = rethreshold(client, audit["audit_id"], check_thr=0.3, persist=True).json()["processed_url"]
+    report = read_json(REPORTS_DIR / f"{uid}.json")
+    assert report["check_threshold"] == 0.3 and report["processed_url"] == kept
+    # записанная в аудит перерисовка переживает следующие пересчёты
+    latest = rethreshold(client, audit["audit_id"], check_thr=0.6).json()["processed_url"]
+    assert renders(uid) == sorted([Path(kept).name, Path(latest).name])
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.testclient import TestClient
+
+from app.api.compression import CompressionMiddleware, choose_encoding
+from app.api.responses import MSGPACK_MEDIA_TYPE, AcceptNegotiationMiddleware, FastResponse
+from app.services.serialization import dumps_json, loads_json
+from tests.conftest import post_infer
+
+msgpack = pytest.importorskip("msgpack")
+
+BIG = {"items": [{"class_name_ru": "Отвертка +", "confidence": 0.91, "bbox_xyxy": [1.5, 2, 3, 4]}] * 100}
+
+
+@pytest.fixture(scope="module")
+def app_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    app.add_middleware(AcceptNegotiationMiddleware)
+
+    @app.get("/big")
+    def big():
+        return FastResponse(BIG)
+
+    @app.get("/small")
+    def small():
+        return FastResponse({"ok": True})
+
+    @app.get("/image")
+    def image():
+        return Response(b"\xff\xd8" + b"0" * 4096, media_type="image/jpeg")
+
+    @app.get("/stream")
+    def stream():
+        return PlainTextResponse("data: x\n\n" * 500, media_type="text/event-stream")
+
+    return TestClient(app)
+
+
+# ========= orjson =========
+
+def test_dumps_json_compact_utf8_and_numpy():
+    out = dumps_json({"ru": "Коловорот", "f": np.float32(0.5), "a": np.array([1, 2]), 3: "k"})
+    assert out == '{"ru":"Коловорот","f":0.5,"a":[1,2],"3":"k"}'.encode()
+    assert loads_json(out)["a"] == [1, 2]
+
+
+# ========= Accept: MessagePack =========
+
+@pytest.mark.parametrize("accept", ["application/x-msgpack", "application/msgpack, application/json;q=0.5"])
+def test_msgpack_when_accepted(app_client, accept):
+    r = app_client.get("/big", headers={"Accept": accept})
+    assert r.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert msgpack.unpackb(r.content, raw=False) == BIG
+    assert "Accept" in r.headers["vary"]
+
+
+def test_json_by_default(app_client):
+    for headers in ({}, {"Accept": "application/json"}, {"Accept": "*/*"}):
+        r = app_client.get("/big", headers=headers)
+        assert r.headers["content-type"] == "application/json" and r.json() == BIG
+
+
+def test_msgpack_on_real_endpoint(client, jpeg):
+    post_infer(client, jpeg)
+    ref = client.get("/audits").json()
+    r = client.get("/audits", headers={"Accept": MSGPACK_MEDIA_TYPE})
+    assert r.headers["content-type"] == MSGPACK_MEDIA_TYPE
+    assert msgpack.unpackb(r.content, raw=False) == ref
+
+
+# ========= Accept-Encoding =========
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("", None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br"])
+def test_large_json_is_compressed(app_client, encoding):
+    r = app_client.get("/big", headers={"Accept-Encoding": encoding})
+    assert r.headers["content-encoding"] == encoding
+    assert "Accept-Encoding" in r.headers["vary"]
+    assert int(r.headers["content-length"]) < len(dumps_json(BIG))
+    assert r.json() == BIG
+
+
+def test_msgpack_is_compressed_too(app_client):
+    r = app_client.get("/big", headers={"Accept": MSGPACK_MEDIA_TYPE, "Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert msgpack.unpackb(r.content, raw=False) == BIG
+
+
+@pytest.mark.parametrize("path", ["/small", "/image", "/stream"])
+def test_not_compressed(app_client, path):
+    r = app_client.get(path, headers={"Accept-Encoding": "gzip, br"})
+    assert "content-encoding" not in r.headers
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.api import routes_infer
+from app.services.serialization import loads_json
+from tests.conftest import post_infer
+
+
+def sse_events(text: str):
+    out = []
+    for block in text.strip().split("\n\n"):
+        ev, data = block.split("\n", 1)
+        out.append((ev[len("event: "):], loads_json(data[len("data: "):])))
+    return out
+
+
+def test_infer_and_stream_agree(client, jpeg):
+    r = post_infer(client, jpeg, check_thr="0.9")
+    assert r.status_code == 200
+    ref = r.json()
+    assert "raw" not in ref
+
+    r = post_infer(client, jpeg, "/infer/stream", check_thr="0.9")
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(r.text)
+    assert events[0][0] == "detections" and events[-1][0] == "done"
+    last = [p for e, p in events if e in ("detections", "refined")][-1]
+    assert last["final"] is True
+    assert last["summary"] == ref["summary"] == events[-1][1]["summary"]
+    assert client.get(events[-1][1]["processed_url"]).status_code == 200
+
+
+def test_pending_passes_are_refined(client, jpeg):
+    events = sse_events(post_infer(client, jpeg, "/infer/stream", check_thr="0.9").text)
+    first = events[0][1]
+    if first["pending"]:
+        assert first["final"] is False
+        assert events[1][0] == "refined" and events[1][1]["passes"] == first["pending"]
+    else:
+        assert [e for e, _ in events] == ["detections", "done"]
+
+
+@pytest.mark.parametrize("path", ["/infer", "/infer/stream"])
+def test_rejects_garbage(client, path):
+    assert post_infer(client, b"not an image", path).status_code == 400
+    assert post_infer(client, b"\xff\xd8", path, mask_format="rle").status_code == 400
+
+
+def test_stream_ends_with_error_event(client, jpeg, monkeypatch):
+    def boom(*args, **kwargs):
+        raise KeyError("boom")
+
+    monkeypatch.setattr(routes_infer, "_write_outputs", boom)
+    r = post_infer(client, jpeg, "/infer/stream")
+    assert r.status_code == 200
+    event, payload = sse_events(r.text)[-1]
+    assert event == "error" and payload["status"] == 500
+
+
+@pytest.mark.parametrize("path", ["/infer", "/infer/stream"])
+def test_render_runs_off_the_event_loop(client, jpeg, monkeypatch, path):
+    seen = []
+    draw = routes_infer.draw_custom
+
+    def spy(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            seen.append("loop")
+        except RuntimeError:
+            seen.append("thread")
+        return draw(*args, **kwargs)
+
+    monkeypatch.setattr(routes_infer, "draw_custom", spy)
+    assert post_infer(client, jpeg, path).status_code == 200
+    assert seen == ["thread"]
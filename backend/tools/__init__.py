@@ -0,0 +1 @@
+"""Офлайн-инструменты backend (запуск из ``backend/``: ``python -m tools.<name>``)."""
@@ -0,0 +1,413 @@
+"""Офлайн-оценка пайплайна на размеченном датасете: точность и задержки.
+
+Из ``backend/``::
+
+    # текущая конфигурация (как в settings / env)
+    python -m tools.evaluate --dataset /data/trays_labelled --split val
+
+    # сравнение вариантов бок о бок
+    python -m tools.evaluate --dataset /data/trays_labelled --split val \\
+        --config base \\
+        --config "fast: imgsz=960 dop_imgsz=960" \\
+        --config "int8: backend=int8" \\
+        --config "no-cascade: kolovorot=0 dop=0" \\
+        --out eval.json
+
+Датасет — в формате YOLO: ``images/[<split>/]*.jpg`` и ``labels/[<split>/]*.txt``
+(``cls cx cy w h`` в долях кадра; полигоны сегментации сводятся к боксу),
+имена классов — из ``data.yaml`` (``names``). SEG-синонимы приводятся к
+именам DET-модели (``SEG_TO_DET_CANON``).
+
+Для каждой конфигурации считаются:
+
+- precision / recall по классам (детекции с confidence >= check_thr,
+  жадное сопоставление с разметкой по IoU >= ``--iou``);
+- совпадение вердикта ``make_summary`` с вердиктом по разметке
+  (missing_tools + extras_or_duplicates) и число ложных «всё на месте»;
+- p50/p90/p99 по стадиям ``StageTimer`` и по всему прогону;
+- доля снимков, на которых сработали fallback-и (коловорот из SEG,
+  DOP по всему кадру, DOP по кропам карты раскладки).
+
+Ключи ``--config``: ``imgsz``, ``seg_imgsz``, ``dop_imgsz``, ``kolovorot``,
+``dop``, ``roi`` (0/1) — подменяют параметры пайплайна
+(``inference.override_pipeline``); ``backend`` — ``auto`` (как в settings),
+``fp32`` или ``int8`` (файлы из ``tools.quantize``, без проверки gate).
+Без весов моделей инструмент завершается с ошибкой. Заглушка из ``benchmarks``
+включается только явно (``--stub``, ``"stub": true`` в отчёте) и годится
+лишь для проверки самого харнесса.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+# ключ --config -> (параметр inference.override_pipeline, приведение типа)
+CONFIG_KEYS: Dict[str, Tuple[str, Any]] = {
+    "imgsz": ("DET_IMGSZ", int),
+    "seg_imgsz": ("SEG_FALLBACK_IMGSZ", int),
+    "dop_imgsz": ("DOP_IMGSZ", int),
+    "kolovorot": ("KOLOVOROT_FALLBACK", lambda v: v == "1"),
+    "dop": ("DOP_FALLBACK", lambda v: v == "1"),
+    "roi": ("LAYOUT_ROI_ENABLED", lambda v: v == "1"),
+}
+BACKENDS = ("auto", "fp32", "int8")
+
+# стадия StageTimer -> имя fallback-а в отчёте
+FALLBACK_STAGES = {"kolovorot_fallback": "kolovorot", "dop": "dop_full", "dop_roi": "dop_roi"}
+
+
+# ========= датасет =========
+
+def load_names(root: Path) -> Dict[int, str]:
+    import yaml
+
+    for name in ("data.yaml", "dataset.yaml"):
+        p = root / name
+        if p.exists():
+            with p.open("r", encoding="utf-8") as f:
+                names = (yaml.safe_load(f) or {}).get("names")
+            if isinstance(names, list):
+                return {i: str(n) for i, n in enumerate(names)}
+            if isinstance(names, dict):
+                return {int(k): str(v) for k, v in names.items()}
+    raise FileNotFoundError(f"{root}/data.yaml with `names` not found")
+
+
+def list_samples(root: Path, split: Optional[str], limit: Optional[int]) -> List[Tuple[Path, Path]]:
+    img_dir = root / "images" / split if split else root / "images"
+    lbl_dir = root / "labels" / split if split else root / "labels"
+    if not img_dir.is_dir():
+        raise FileNotFoundError(f"{img_dir} not found")
+    files = sorted(p for p in img_dir.rglob("*") if p.suffix.lower() in IMG_EXTS)
+    out = [(p, (lbl_dir / p.relative_to(img_dir)).with_suffix(".txt")) for p in files]
+    return out[:limit] if limit else out
+
+
+def read_labels(path: Path, names: Dict[int, str], canon: Dict[str, str],
+                w: int, h: int) -> List[Dict[str, Any]]:
+    """Разметка снимка в виде детекций пайплайна (confidence = 1). Нет файла — пустой лоток."""
+    gts: List[Dict[str, Any]] = []
+    if not path.exists():
+        return gts
+    for line in path.read_text(encoding="utf-8").splitlines():
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        cls, vals = int(parts[0]), [float(x) for x in parts[1:]]
+        if len(vals) == 4:
+            cx, cy, bw, bh = vals
+            box = [(cx - bw / 2) * w, (cy - bh / 2) * h, (cx + bw / 2) * w, (cy + bh / 2) * h]
+        else:
+            xs, ys = vals[0::2], vals[1::2]
+            box = [min(xs) * w, min(ys) * h, max(xs) * w, max(ys) * h]
+        en = names.get(cls, str(cls))
+        gts.append({"class_name": canon.get(en, en), "confidence": 1.0, "bbox_xyxy": box})
+    return gts
+
+
+# ========= конфигурации =========
+
+def parse_config(spec: str) -> Dict[str, Any]:
+    """``"name: k=v k=v"`` / ``"name,k=v,k=v"`` / ``"k=v ..."`` -> {name, backend, params}."""
+    head, sep, rest = spec.partition(":")
+    if not sep:
+        head, rest = "", spec
+    tokens = rest.replace(",", " ").split()
+    if not head and tokens and "=" not in tokens[0]:
+        head = tokens.pop(0)
+    cfg: Dict[str, Any] = {"name": head.strip(), "backend": "auto", "params": {}}
+    for tok in tokens:
+        key, eq, val = tok.partition("=")
+        if not eq:
+            raise ValueError(f"bad config token {tok!r} in {spec!r}")
+        if key == "name":
+            cfg["name"] = val
+        elif key == "backend":
+            if val not in BACKENDS:
+                raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
+            cfg["backend"] = val
+        elif key in CONFIG_KEYS:
+            param, conv = CONFIG_KEYS[key]
+            cfg["params"][param] = conv(val)
+        else:
+            raise ValueError(f"unknown config key {key!r}; known: backend, {', '.join(CONFIG_KEYS)}")
+    cfg["name"] = cfg["name"] or (" ".join(tokens) or "base")
+    return cfg
+
+
+def load_backend(backend: str) -> Dict[str, Any]:
+    """Модели для ``override_models``; ``auto`` — те, что загрузил inference."""
+    if backend == "auto":
+        return {}
+    from ultralytics import YOLO
+    from app.settings import (
+        DET_MODEL_INT8_PATH, DET_MODEL_PATH, DOP_MODEL_INT8_PATH, DOP_MODEL_PATH,
+        SEG_MODEL_INT8_PATH, SEG_MODEL_PATH,
+    )
+
+    if backend == "fp32":
+        if not DET_MODEL_PATH.exists():
+            raise FileNotFoundError(f"{DET_MODEL_PATH} not found")
+        return {
+            "det": YOLO(str(DET_MODEL_PATH)),
+            "seg": YOLO(str(SEG_MODEL_PATH)) if SEG_MODEL_PATH.exists() else None,
+            "dop": YOLO(str(DOP_MODEL_PATH)) if DOP_MODEL_PATH.exists() else None,
+        }
+    if not DET_MODEL_INT8_PATH.exists():
+        raise FileNotFoundError(f"{DET_MODEL_INT8_PATH} — run `python -m tools.quantize quantize` first")
+    models = {"det": YOLO(str(DET_MODEL_INT8_PATH), task="detect")}
+    # для отсутствующих INT8 SEG/DOP остаются текущие модели
+    if SEG_MODEL_INT8_PATH.exists():
+        models["seg"] = YOLO(str(SEG_MODEL_INT8_PATH), task="segment")
+    if DOP_MODEL_INT8_PATH.exists():
+        models["dop"] = YOLO(str(DOP_MODEL_INT8_PATH), task="detect")
+    return models
+
+
+# ========= метрики =========
+
+def match(preds: List[Dict[str, Any]], gts: List[Dict[str, Any]], iou_thr: float,
+          iou_fn) -> Dict[str, Dict[str, int]]:
+    """TP/FP/FN по классам: жадно, от самых уверенных детекций к лучшему по IoU боксу разметки."""
+    out: Dict[str, Dict[str, int]] = {}
+    for cls in {d["class_name"] for d in preds} | {g["class_name"] for g in gts}:
+        p = sorted((d for d in preds if d["class_name"] == cls), key=lambda d: d["confidence"], reverse=True)
+        free = [g["bbox_xyxy"] for g in gts if g["class_name"] == cls]
+        tp = 0
+        for d in p:
+            best, best_iou = None, iou_thr
+            for i, g in enumerate(free):
+                v = iou_fn(d["bbox_xyxy"], g)
+                if v >= best_iou:
+                    best, best_iou = i, v
+            if best is not None:
+                free.pop(best)
+                tp += 1
+        out[cls] = {"tp": tp, "fp": len(p) - tp, "fn": len(free)}
+    return out
+
+
+def verdict(summary: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "all_tools_present": bool(summary["all_tools_present"]),
+        "missing_tools": sorted(summary["missing_tools"]),
+        "extras_or_duplicates": sorted(summary["extras_or_duplicates"]),
+    }
+
+
+def _pcts(values: List[float]) -> Dict[str, float]:
+    from benchmarks.common import percentile
+
+    return {
+        "n": len(values),
+        "p50_ms": round(percentile(values, 0.50), 2),
+        "p90_ms": round(percentile(values, 0.90), 2),
+        "p99_ms": round(percentile(values, 0.99), 2),
+    }
+
+
+def _ratio(a: int, b: int) -> Optional[float]:
+    return round(a / b, 4) if b else None
+
+
+# ========= прогон =========
+
+def evaluate(inference, samples: List[Tuple[Path, Path]], names: Dict[int, str], cfg: Dict[str, Any], *,
+             models: Dict[str, Any], check_thr: float, iou_thr: float, model_kind: str,
+             warmup: int) -> Dict[str, Any]:
+    import cv2
+    from app.services.profiling import StageTimer
+
+    counts: Dict[str, Dict[str, int]] = {}
+    stages: Dict[str, List[float]] = {}
+    totals: List[float] = []
+    fired = {v: 0 for v in FALLBACK_STAGES.values()}
+    agree = agree_ok = false_ok = false_alarm = 0
+    disagreements: List[Dict[str, Any]] = []
+    n = 0
+
+    with inference.override_models(**models), inference.override_pipeline(**cfg["params"]):
+        for img_path, _ in samples[:warmup]:
+            bgr = cv2.imread(str(img_path))
+            if bgr is not None:
+                inference.run_pipeline(bgr, model_kind=model_kind, check_thr=check_thr)
+
+        for img_path, lbl_path in samples:
+            bgr = cv2.imread(str(img_path))
+            if bgr is None:
+                print(f"{img_path}: cannot decode, skipped")
+                continue
+            h, w = bgr.shape[:2]
+            gts = read_labels(lbl_path, names, inference.SEG_TO_DET_CANON, w, h)
+
+            timer = StageTimer()
+            t0 = time.perf_counter()
+            out = inference.run_pipeline(bgr, model_kind=model_kind, check_thr=check_thr, timer=timer)
+            totals.append((time.perf_counter() - t0) * 1000.0)
+            n += 1
+            for k, v in timer.stages.items():
+                stages.setdefault(k, []).append(v)
+            for k, v in FALLBACK_STAGES.items():
+                fired[v] += k in timer.stages
+
+            preds = [d for d in out["detections"] if d["confidence"] >= check_thr]
+            for cls, c in match(preds, gts, iou_thr, inference.iou_xyxy).items():
+                acc = counts.setdefault(cls, {"tp": 0, "fp": 0, "fn": 0})
+                for k in acc:
+                    acc[k] += c[k]
+
+            got = verdict(out["summary"])
+            ref = verdict(inference.make_summary(gts, check_thr=check_thr))
+            agree += got == ref
+            agree_ok += got["all_tools_present"] == ref["all_tools_present"]
+            false_ok += got["all_tools_present"] and not ref["all_tools_present"]
+            false_alarm += ref["all_tools_present"] and not got["all_tools_present"]
+            if got != ref and len(disagreements) < 100:
+                disagreements.append({"image": str(img_path.name), "truth": ref, "predicted": got})
+
+    per_class: Dict[str, Dict[str, Any]] = {}
+    for cls in sorted(counts):
+        c = counts[cls]
+        per_class[cls] = {**c, "precision": _ratio(c["tp"], c["tp"] + c["fp"]),
+                          "recall": _ratio(c["tp"], c["tp"] + c["fn"])}
+    tp, fp, fn = (sum(c[k] for c in counts.values()) for k in ("tp", "fp", "fn"))
+    return {
+        "name": cfg["name"],
+        "backend": cfg["backend"],
+        "params": {**{k: getattr(inference, k) for k in inference.PIPELINE_PARAMS}, **cfg["params"]},
+        "n_images": n,
+        "detection": {"tp": tp, "fp": fp, "fn": fn,
+                      "precision": _ratio(tp, tp + fp), "recall": _ratio(tp, tp + fn)},
+        "per_class": per_class,
+        "verdict": {
+            "agreement": _ratio(agree, n),
+            "all_tools_present_agreement": _ratio(agree_ok, n),
+            "false_ok": false_ok,
+            "false_alarm": false_alarm,
+        },
+        "latency": {"total": _pcts(totals), "stages": {k: _pcts(v) for k, v in sorted(stages.items())}},
+        "fallback_rate": {k: _ratio(v, n) for k, v in fired.items()},
+        "disagreements": disagreements,
+    }
+
+
+# ========= вывод =========
+
+def _fmt(v: Any) -> str:
+    if v is None:
+        return "-"
+    return f"{v:.3f}" if isinstance(v, float) else str(v)
+
+
+def _ms(v: Optional[float]) -> Optional[str]:
+    return f"{v:.1f}" if v is not None else None
+
+
+def print_table(reports: List[Dict[str, Any]]) -> None:
+    rows: List[Tuple[str, List[Any]]] = [
+        ("images", [r["n_images"] for r in reports]),
+        ("precision", [r["detection"]["precision"] for r in reports]),
+        ("recall", [r["detection"]["recall"] for r in reports]),
+        ("verdict agreement", [r["verdict"]["agreement"] for r in reports]),
+        ("all-present agreement", [r["verdict"]["all_tools_present_agreement"] for r in reports]),
+        ("false ok", [r["verdict"]["false_ok"] for r in reports]),
+        ("false alarm", [r["verdict"]["false_alarm"] for r in reports]),
+    ]
+    for q in ("p50_ms", "p90_ms", "p99_ms"):
+        rows.append((f"total {q}", [_ms(r["latency"]["total"][q]) for r in reports]))
+    for stage in sorted({s for r in reports for s in r["latency"]["stages"]}):
+        rows.append((f"{stage} p50_ms", [_ms(r["latency"]["stages"].get(stage, {}).get("p50_ms")) for r in reports]))
+    for fb in FALLBACK_STAGES.values():
+        rows.append((f"fallback {fb}", [r["fallback_rate"][fb] for r in reports]))
+    for cls in sorted({c for r in reports for c in r["per_class"]}):
+        cells = []
+        for r in reports:
+            c = r["per_class"].get(cls)
+            cells.append(f"{_fmt(c['precision'])}/{_fmt(c['recall'])}" if c else "-")
+        rows.append((f"P/R {cls}", cells))
+
+    head = ["metric"] + [r["name"] for r in reports]
+    table = [head] + [[label] + [v if isinstance(v, str) else _fmt(v) for v in vals] for label, vals in rows]
+    widths = [max(len(row[i]) for row in table) for i in range(len(head))]
+    for j, row in enumerate(table):
+        print("  ".join(cell.ljust(widths[i]) if i == 0 else cell.rjust(widths[i]) for i, cell in enumerate(row)))
+        if j == 0:
+            print("  ".join("-" * w for w in widths))
+
+
+# ========= CLI =========
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m tools.evaluate",
+                                 description="precision/recall, вердикты и задержки пайплайна на размеченном датасете")
+    ap.add_argument("--dataset", type=Path, required=True, help="корень датасета YOLO (data.yaml, images/, labels/)")
+    ap.add_argument("--split", default=None, help="подкаталог images/ и labels/ (train/val/test)")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--config", action="append", default=None,
+                    help='конфигурация "name: imgsz=960 backend=int8 dop=0" (можно несколько раз)')
+    ap.add_argument("--check-thr", type=float, default=0.70)
+    ap.add_argument("--iou", type=float, default=0.50, help="IoU для сопоставления с разметкой")
+    ap.add_argument("--model-kind", choices=("det", "seg"), default="det")
+    ap.add_argument("--warmup", type=int, default=2, help="прогонов без замера перед каждой конфигурацией")
+    ap.add_argument("--stub", action="store_true", help="заглушка модели вместо весов (проверка харнесса)")
+    ap.add_argument("--out", type=Path, default=None, help="JSON-отчёт")
+    args = ap.parse_args(argv)
+
+    try:
+        configs = [parse_config(s) for s in (args.config or ["base"])]
+        names = load_names(args.dataset)
+        samples = list_samples(args.dataset, args.split, args.limit)
+    except (ValueError, FileNotFoundError) as e:
+        print(e)
+        return 2
+    if not samples:
+        print("no images found")
+        return 2
+
+    from app.settings import DET_MODEL_PATH
+    from benchmarks.common import is_stub, load_inference
+
+    # load_inference без весов молча подставляет заглушку — метрики были бы не о модели
+    if not args.stub and not DET_MODEL_PATH.exists():
+        print(f"{DET_MODEL_PATH} not found; pass --stub to check the harness on the stub model")
+        return 2
+    inference = load_inference(force_stub=args.stub)
+    reports: List[Dict[str, Any]] = []
+    for cfg in configs:
+        try:
+            models = load_backend(cfg["backend"])
+        except FileNotFoundError as e:
+            print(f"{cfg['name']}: {e}")
+            return 2
+        print(f"{cfg['name']}: {len(samples)} images ...")
+        reports.append(evaluate(inference, samples, names, cfg, models=models, check_thr=args.check_thr,
+                                iou_thr=args.iou, model_kind=args.model_kind, warmup=args.warmup))
+
+    print()
+    print_table(reports)
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        with args.out.open("w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                "dataset": str(args.dataset),
+                "split": args.split,
+                "check_threshold": args.check_thr,
+                "iou_threshold": args.iou,
+                "model_kind": args.model_kind,
+                "stub": is_stub(),
+                "configs": reports,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"report -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Карта раскладки ложемента для DOP-fallback по кропам.
+
+Карта дообучается сама при каждом ``/infer``. Этот инструмент нужен, чтобы
+собрать её заново по сохранённым отчётам аудитов или посмотреть, что в ней
+сейчас. Из ``backend/``::
+
+    python -m tools.layout_prior rebuild                   # по uploads/processed/reports
+    python -m tools.layout_prior rebuild --reports /backup/reports --min-conf 0.9
+    python -m tools.layout_prior show
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from app.services import layout_prior
+from app.services.serialization import read_json
+from app.settings import LAYOUT_LEARN_CONF, LAYOUT_MIN_SAMPLES, LAYOUT_PRIOR_PATH, REPORTS_DIR
+
+
+def rebuild(reports_dir: Path, min_conf: float) -> layout_prior.LayoutPrior:
+    prior = layout_prior.LayoutPrior()
+    n_reports = 0
+    for p in sorted(reports_dir.glob("*.json")):
+        try:
+            rep = read_json(p)
+        except Exception:
+            continue
+        w, h = int(rep.get("image_width") or 0), int(rep.get("image_height") or 0)
+        boxes = layout_prior.confident_boxes(rep.get("detections") or [], w, h, min_conf)
+        for cls, box in boxes:
+            prior.observe(cls, box)
+        n_reports += bool(boxes)
+    print(f"{n_reports} reports used")
+    return prior
+
+
+def show(prior: layout_prior.LayoutPrior) -> None:
+    if not prior.classes:
+        print("layout prior is empty")
+    for cls in sorted(prior.classes):
+        n = prior.samples(cls)
+        region = prior.region(cls, 1000, 1000)
+        where = f"{region} (на кадре 1000x1000)" if region else f"мало данных (< {LAYOUT_MIN_SAMPLES})"
+        print(f"{cls:28s} n={n:<6d} {where}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m tools.layout_prior")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rp = sub.add_parser("rebuild", help="собрать карту заново по отчётам аудитов")
+    rp.add_argument("--reports", type=Path, default=REPORTS_DIR)
+    rp.add_argument("--min-conf", type=float, default=LAYOUT_LEARN_CONF)
+    rp.add_argument("--out", type=Path, default=LAYOUT_PRIOR_PATH)
+
+    sp = sub.add_parser("show", help="число наблюдений и ожидаемые области по классам")
+    sp.add_argument("--path", type=Path, default=LAYOUT_PRIOR_PATH)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "rebuild":
+        prior = rebuild(args.reports, args.min_conf)
+        layout_prior.save(prior, args.out)
+        print(f"layout prior -> {args.out}")
+        show(prior)
+        return 0
+
+    show(layout_prior.current(args.path))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Помесячные партиции ``audits`` и архив холодных месяцев.
+
+Из ``backend/``::
+
+    python -m tools.partitions init                 # один раз: перевести audits на партиции (MySQL)
+    python -m tools.partitions add --ahead 3        # досоздать партиции вперёд (API делает это и сам раз в сутки)
+    python -m tools.partitions list
+    python -m tools.partitions archive              # месяцы старше AUDIT_HOT_MONTHS -> ARCHIVE_DIR, затем DROP PARTITION
+    python -m tools.partitions archive --before 2025-01 --keep-in-db
+    python -m tools.partitions drop --month 2024-01 --yes   # без архива
+
+Архив — ``ARCHIVE_DIR/audits_YYYY-MM.ndjson.gz``; его читает ``POST /audits/export``
+(``include_archive``, по умолчанию включено).
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime
+
+from app.db.database import engine
+from app.db.partitions import (
+    add_months, add_partitions, drop_month, init_partitioning, is_mysql, list_partitions,
+    month_label, month_of, parse_month, partition_month,
+)
+from app.services.archive import archive_month, archived_months
+from app.settings import ARCHIVE_DIR, AUDIT_HOT_MONTHS, AUDIT_PARTITIONS_AHEAD
+
+
+def cold_months(before) -> list:
+    """Месяцы с данными (партиции или строки) строго раньше ``before``."""
+    from sqlalchemy import func, select
+    from app.db.models import Audit
+    with engine.connect() as conn:
+        parts = list_partitions(conn)
+        if parts:
+            months = [m for m in (partition_month(p["name"]) for p in parts) if m]
+        else:
+            lo = conn.execute(select(func.min(Audit.created_at))).scalar()
+            months = []
+            if lo is not None:
+                m = month_of(lo)
+                while m < before:
+                    months.append(m)
+                    m = add_months(m, 1)
+    return [m for m in months if m < before]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m tools.partitions")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ip = sub.add_parser("init", help="перевести audits на помесячные партиции (MySQL, перестройка таблицы)")
+    ip.add_argument("--ahead", type=int, default=AUDIT_PARTITIONS_AHEAD)
+
+    adp = sub.add_parser("add", help="досоздать партиции на N месяцев вперёд")
+    adp.add_argument("--ahead", type=int, default=AUDIT_PARTITIONS_AHEAD)
+
+    sub.add_parser("list", help="партиции и архивные месяцы")
+
+    arp = sub.add_parser("archive", help="выгрузить холодные месяцы в сжатый NDJSON и удалить из БД")
+    arp.add_argument("--before", help="YYYY-MM: архивировать месяцы раньше этого "
+                                      f"(по умолчанию — старше {AUDIT_HOT_MONTHS} мес.)")
+    arp.add_argument("--keep-in-db", action="store_true", help="только выгрузить, партиции не удалять")
+
+    dp = sub.add_parser("drop", help="удалить месяц без архивирования")
+    dp.add_argument("--month", required=True, help="YYYY-MM")
+    dp.add_argument("--yes", action="store_true")
+    args = ap.parse_args(argv)
+
+    cur = month_of(datetime.utcnow().date())
+
+    if args.cmd == "init":
+        names = init_partitioning(engine, ahead=args.ahead)
+        print(f"audits partitioned: {names[0]} .. {names[-1]} + pmax")
+        return 0
+
+    if args.cmd == "add":
+        if not is_mysql(engine):
+            print("not MySQL: nothing to do")
+            return 0
+        names = add_partitions(engine, ahead=args.ahead)
+        print(f"added: {', '.join(names)}" if names else "partitions are up to date")
+        return 0
+
+    if args.cmd == "list":
+        with engine.connect() as conn:
+            parts = list_partitions(conn)
+        if not parts:
+            print("audits is not partitioned")
+        for p in parts:
+            print(f"{p['name']:10s} < {p['bound'] or 'MAXVALUE':12s} ~{p['rows']} rows")
+        arch = archived_months()
+        print(f"archive ({ARCHIVE_DIR}): {', '.join(month_label(m) for m in arch) if arch else 'empty'}")
+        return 0
+
+    if args.cmd == "archive":
+        before = parse_month(args.before) if args.before else add_months(cur, -AUDIT_HOT_MONTHS)
+        if before > cur:
+            print("refusing to archive the current month")
+            return 2
+        months = cold_months(before)
+        if not months:
+            print(f"nothing older than {month_label(before)}")
+        for m in months:
+            res = archive_month(engine, m, drop=not args.keep_in_db)
+            print(f"{res['month']}: {res['rows']} rows -> {res['file']}"
+                  + (f" (+ stray rows of {', '.join(res['also'])})" if res["also"] else "")
+                  + (f", dropped ({res['dropped']})" if res["dropped"] else ""))
+        return 0
+
+    m = parse_month(args.month)
+    if not args.yes:
+        print(f"this permanently deletes all audits of {month_label(m)}; re-run with --yes "
+              "(or use `archive` to keep them in ARCHIVE_DIR)")
+        return 2
+    how = drop_month(engine, m)
+    print(f"{month_label(m)} dropped ({how})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""INT8-квантование DET/SEG/DOP и проверка, что вердикты не меняются.
+
+Из ``backend/``::
+
+    # 1) квантование (static — с калибровкой на локальных снимках лотков)
+    python -m tools.quantize quantize --mode static --calib-dir /data/trays --models det seg dop
+    python -m tools.quantize quantize --mode dynamic
+
+    # 2) проверка каждой модели: вердикты make_summary на FP32 и INT8 должны совпадать
+    python -m tools.quantize evaluate --images /data/trays_holdout --tolerance 0.02
+
+Пока ``evaluate`` не запишет в ``models/int8/gate.json`` хэш файла с
+``passed: true`` для этой модели, ``USE_INT8_MODELS=1`` её не подхватит.
+Нужны ``onnx`` и ``onnxruntime``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+from app.services.quant_gate import load_gate
+from app.settings import (
+    DET_IMGSZ, DET_MODEL_INT8_PATH, DET_MODEL_PATH, DOP_IMGSZ, DOP_MODEL_INT8_PATH, DOP_MODEL_PATH,
+    INT8_DIR, INT8_GATE_REPORT, INT8_GATE_TOLERANCE, SEG_FALLBACK_IMGSZ, SEG_MODEL_INT8_PATH,
+    SEG_MODEL_PATH,
+)
+
+# имя -> (FP32 .pt, INT8 .onnx, задача ultralytics, imgsz калибровки — как в пайплайне)
+MODELS: Dict[str, Any] = {
+    "det": (DET_MODEL_PATH, DET_MODEL_INT8_PATH, "detect", DET_IMGSZ),
+    "seg": (SEG_MODEL_PATH, SEG_MODEL_INT8_PATH, "segment", SEG_FALLBACK_IMGSZ),
+    "dop": (DOP_MODEL_PATH, DOP_MODEL_INT8_PATH, "detect", DOP_IMGSZ),
+}
+IMG_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def list_images(folder: Path, limit: Optional[int] = None) -> List[Path]:
+    files = sorted(p for p in folder.rglob("*") if p.suffix.lower() in IMG_EXTS)
+    return files[:limit] if limit else files
+
+
+# ========= квантование =========
+
+def letterbox(bgr: np.ndarray, size: int) -> np.ndarray:
+    """Та же подготовка, что у ultralytics: resize с сохранением пропорций + паддинг 114."""
+    h, w = bgr.shape[:2]
+    r = min(size / h, size / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    out = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out[top:top + nh, left:left + nw] = cv2.resize(bgr, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    x = cv2.cvtColor(out, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(x)
+
+
+def export_onnx(pt_path: Path, workdir: Path) -> Path:
+    from ultralytics import YOLO
+
+    tmp_pt = workdir / pt_path.name           # export пишет рядом с весами
+    shutil.copy2(pt_path, tmp_pt)
+    out = YOLO(str(tmp_pt)).export(format="onnx", dynamic=True, simplify=True, opset=17)
+    return Path(out)
+
+
+def _calibration_reader(onnx_path: Path, images: List[Path], imgsz: int):
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationDataReader
+
+    input_name = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self) -> None:
+            self._it: Iterator[Path] = iter(images)
+
+        def get_next(self):
+            for p in self._it:
+                bgr = cv2.imread(str(p))
+                if bgr is not None:
+                    return {input_name: letterbox(bgr, imgsz)}
+            return None
+
+        def rewind(self) -> None:
+            self._it = iter(images)
+
+    return _Reader()
+
+
+def quantize_model(name: str, mode: str, calib: List[Path]) -> Path:
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    pt_path, int8_path, _, imgsz = MODELS[name]
+    if not pt_path.exists():
+        raise FileNotFoundError(pt_path)
+    INT8_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="quant_") as td:
+        wd = Path(td)
+        fp32_onnx = export_onnx(pt_path, wd)
+        prep = wd / "prep.onnx"
+        quant_pre_process(str(fp32_onnx), str(prep))
+        if mode == "dynamic":
+            quantize_dynamic(str(prep), str(int8_path), weight_type=QuantType.QInt8)
+        else:
+            if not calib:
+                raise ValueError("static quantization needs --calib-dir with tray images")
+            quantize_static(
+                str(prep), str(int8_path), _calibration_reader(prep, calib, imgsz),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                per_channel=True,
+            )
+    return int8_path
+
+
+# ========= проверка вердиктов =========
+#   Каждая INT8-модель проверяется отдельно (остальные — FP32) там, где она
+#   влияет на результат:
+#   det — вердикт пайплайна det;
+#   seg — вердикты пайплайна seg и det (fallback коловорота);
+#   dop — вердикт пайплайна det и классы детекций самой DOP-модели
+#         (fallback срабатывает не на каждом снимке, поэтому она прогоняется всегда).
+
+VERDICT_KEYS = ("missing_tools", "extras_or_duplicates", "manual_check_required")
+
+
+def verdict(summary: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "missing_tools": sorted(summary["missing_tools"]),
+        "extras_or_duplicates": sorted(summary["extras_or_duplicates"]),
+        "manual_check_required": bool(summary["manual_check_required"]),
+    }
+
+
+def probe(inference, name: str, image: Path, check_thr: float) -> Dict[str, Any]:
+    """Что должно совпасть у FP32 и INT8 для модели ``name`` (поле -> значение)."""
+    out: Dict[str, Any] = {}
+    for kind in (("det", "seg") if name == "seg" else ("det",)):
+        v = verdict(inference.run_pipeline(image, model_kind=kind, check_thr=check_thr)["summary"])
+        out.update({f"{kind}.{k}": v[k] for k in VERDICT_KEYS})
+    if name == "dop":
+        dets = inference.yolo_detect_boxes(
+            inference.DOP_MODEL, image, conf=0.50, iou=0.65, imgsz=inference.DOP_IMGSZ)["detections"]
+        out["dop.classes"] = sorted(d["class_name"] for d in dets)
+    return out
+
+
+def evaluate(images: List[Path], names: List[str], *, check_thr: float, tolerance: float) -> Dict[str, Any]:
+    from ultralytics import YOLO
+    from app.services import inference
+    from app.services.quant_gate import file_sha256
+
+    fp32 = {
+        "det": YOLO(str(DET_MODEL_PATH)),
+        "seg": YOLO(str(SEG_MODEL_PATH)) if SEG_MODEL_PATH.exists() else None,
+        "dop": YOLO(str(DOP_MODEL_PATH)) if DOP_MODEL_PATH.exists() else None,
+    }
+    n = len(images)
+    models: Dict[str, Any] = {}
+    for name in names:
+        _, int8_path, task, _ = MODELS[name]
+        if not int8_path.exists():
+            raise FileNotFoundError(f"{int8_path} — run `quantize` first")
+        if fp32[name] is None:
+            print(f"{name}: FP32 model not found, skipped")
+            continue
+        q = {**fp32, name: YOLO(str(int8_path), task=task)}
+
+        per_key: Dict[str, int] = {}
+        mismatches: List[Dict[str, Any]] = []
+        for p in images:
+            with inference.override_models(**fp32):
+                ref = probe(inference, name, p, check_thr)
+            with inference.override_models(**q):
+                got = probe(inference, name, p, check_thr)
+            diff = [k for k in ref if ref[k] != got[k]]
+            for k in diff:
+                per_key[k] = per_key.get(k, 0) + 1
+            if diff:
+                mismatches.append({"image": p.name, "fields": diff,
+                                   "fp32": {k: ref[k] for k in diff}, "int8": {k: got[k] for k in diff}})
+
+        rate = len(mismatches) / n if n else 1.0
+        models[name] = {
+            "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            "n_images": n,
+            "check_threshold": check_thr,
+            "tolerance": tolerance,
+            "file": int8_path.name,
+            "sha256": file_sha256(int8_path),
+            "passed": bool(n) and rate <= tolerance,
+            "mismatch_rate": round(rate, 4),
+            "mismatch_by_field": per_key,
+            "mismatches": mismatches[:100],
+        }
+
+    return {
+        # gate_allows смотрит на passed каждой модели; общий — все проверенные прошли
+        "passed": bool(models) and all(m["passed"] for m in models.values()),
+        "created_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+        "n_images": n,
+        "check_threshold": check_thr,
+        "tolerance": tolerance,
+        "models": models,
+    }
+
+
+def merge_report(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Записи моделей из нового прогона заменяют старые, остальные сохраняются:
+    ``evaluate --models seg`` не должен снимать допуск с det."""
+    models = {**((old or {}).get("models") or {}), **new["models"]}
+    return {**new, "passed": bool(models) and all(m.get("passed") is True for m in models.values()),
+            "models": models}
+
+
+# ========= CLI =========
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m tools.quantize")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    qp = sub.add_parser("quantize", help="экспорт в ONNX и INT8-квантование")
+    qp.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    qp.add_argument("--mode", choices=("dynamic", "static"), default="static")
+    qp.add_argument("--calib-dir", type=Path, help="папка со снимками лотков для static-калибровки")
+    qp.add_argument("--calib-limit", type=int, default=200)
+
+    ep = sub.add_parser("evaluate", help="сравнить FP32 и INT8 каждой модели и записать gate")
+    ep.add_argument("--images", type=Path, required=True)
+    ep.add_argument("--models", nargs="+", choices=list(MODELS), default=None,
+                    help="какие INT8-модели подставлять (по умолчанию все существующие)")
+    ep.add_argument("--limit", type=int, default=None)
+    ep.add_argument("--check-thr", type=float, default=0.70)
+    ep.add_argument("--tolerance", type=float, default=INT8_GATE_TOLERANCE)
+    ep.add_argument("--report", type=Path, default=INT8_GATE_REPORT)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "quantize":
+        calib = list_images(args.calib_dir, args.calib_limit) if args.calib_dir else []
+        for name in args.models:
+            if not MODELS[name][0].exists():
+                print(f"{name}: {MODELS[name][0]} not found, skipped")
+                continue
+            out = quantize_model(name, args.mode, calib)
+            print(f"{name}: {args.mode} INT8 -> {out}")
+        print("run `python -m tools.quantize evaluate --images ...` before enabling USE_INT8_MODELS")
+        return 0
+
+    names = args.models or [k for k, v in MODELS.items() if v[1].exists()]
+    if not names:
+        print("no INT8 models found; run `quantize` first")
+        return 2
+    images = list_images(args.images, args.limit)
+    report = evaluate(images, names, check_thr=args.check_thr, tolerance=args.tolerance)
+    merged = merge_report(load_gate(args.report), report)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with args.report.open("w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False, indent=2)
+    print(f"{report['n_images']} images, tolerance {report['tolerance']:.2%}")
+    for name, m in report["models"].items():
+        print(f"  {name}: mismatch rate {m['mismatch_rate']:.2%} -> {'PASSED' if m['passed'] else 'FAILED'}")
+    for name in sorted(set(merged["models"]) - set(report["models"])):
+        m = merged["models"][name]
+        print(f"  {name}: kept from {m.get('created_at', 'earlier run')} -> {'PASSED' if m.get('passed') else 'FAILED'}")
+    print(f"report -> {args.report}")
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
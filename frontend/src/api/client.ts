@@ -1,4 +1,4 @@
-import type { InferenceResponse, AuditListResponse, ExportRequest } from "./types";
+import type { InferenceResponse, AuditListResponse, ExportRequest, MaskFormat } from "./types";
 
 const BASE = import.meta.env.VITE_API_BASE || "http://localhost:8000";
 
@@ -8,6 +8,24 @@ function absUrl(path?: string) {
   return `${BASE}${path.startsWith("/") ? "" : "/"}${path}`;
 }
 
+// Производные изображения (превью/WebP) для /static/original|processed/<file>
+export type DerivedSize = "thumb" | "medium" | "full";
+export type DerivedFormat = "auto" | "webp" | "jpeg"; // auto — сервер выбирает по Accept
+
+export function derivedUrl(
+  staticUrl: string | undefined,
+  size: DerivedSize,
+  fmt: DerivedFormat = "auto"
+): string | undefined {
+  if (!staticUrl) return undefined;
+  // локальные blob:/data: превью производных не имеют
+  if (/^(blob|data):/i.test(staticUrl)) return staticUrl;
+  const m = staticUrl.match(/\/static\/(original|processed)\/([^/?#]+)$/);
+  if (!m) return absUrl(staticUrl);
+  const q = fmt === "auto" ? "" : `&fmt=${fmt}`;
+  return `${BASE}/derived/${m[1]}/${encodeURIComponent(m[2])}?size=${size}${q}`;
+}
+
 export async function inferImage(
   file: File,
   optsOrEmployeeId:
@@ -20,11 +38,18 @@ export async function inferImage(
         drawBoxes?: boolean;
         drawLabels?: boolean;
         drawMasks?: boolean; // только для сегментации
+        maskFormat?: MaskFormat; // формат масок в ответе (по умолчанию packed для seg)
+        maskTolerance?: number; // упрощение полигонов, px
       },
   confPercentLegacy?: number,
   drawBoxesLegacy?: boolean,
   drawLabelsLegacy?: boolean
-): Promise<InferenceResponse & { processed_url_abs?: string; original_url_abs?: string }> {
+): Promise<InferenceResponse & {
+  processed_url_abs?: string;
+  original_url_abs?: string;
+  processed_thumb_url?: string;
+  processed_medium_url?: string;
+}> {
  
   let employeeId: string;
   let confPercent = typeof confPercentLegacy === "number" ? confPercentLegacy : 5;
@@ -36,6 +61,8 @@ export async function inferImage(
   let checkThr: number | undefined;
   let renderThr: number | undefined;
   let drawMasks: boolean | undefined;
+  let maskFormat: MaskFormat | undefined;
+  let maskTolerance: number | undefined;
 
   if (typeof optsOrEmployeeId === "string") {
     employeeId = optsOrEmployeeId;
@@ -47,6 +74,8 @@ export async function inferImage(
     drawBoxes = optsOrEmployeeId.drawBoxes ?? drawBoxes;
     drawLabels = optsOrEmployeeId.drawLabels ?? drawLabels;
     drawMasks = optsOrEmployeeId.drawMasks;
+    maskFormat = optsOrEmployeeId.maskFormat;
+    maskTolerance = optsOrEmployeeId.maskTolerance;
 
     // Если пришёл renderThr (логика нового UI), то не даём фронту
     // случайно задрать conf на бэке — фиксируем низкий порог детекции.
@@ -69,6 +98,11 @@ export async function inferImage(
   if (modelKind === "seg" && typeof drawMasks === "boolean") {
     fd.append("draw_masks", String(drawMasks));
   }
+  if (modelKind === "seg") {
+    // компактные маски: целочисленные точки в base64 + упрощение на 1px
+    fd.append("mask_format", maskFormat ?? "packed");
+    fd.append("mask_tolerance", String(maskTolerance ?? 1));
+  }
 
   const res = await fetch(`${BASE}/infer`, { method: "POST", body: fd });
   if (!res.ok) throw new Error(`Infer failed: ${res.status} ${await res.text()}`);
@@ -78,6 +112,115 @@ export async function inferImage(
     ...data,
     processed_url_abs: absUrl(data.processed_url),
     original_url_abs: absUrl(data.original_url),
+    processed_thumb_url: derivedUrl(data.processed_url, "thumb"),
+    processed_medium_url: derivedUrl(data.processed_url, "medium"),
+  };
+}
+
+// Потоковый /infer (SSE): детекции после основного прохода, уточнение после
+// fallback-ов (коловорот из SEG, DOP), затем audit_id и URL-ы
+export type InferStreamEvent =
+  | { event: "detections"; data: Pick<InferenceResponse, "image_width" | "image_height" | "detections" | "summary" | "mask_format"> & { final: boolean; pending: string[] } }
+  | { event: "refined"; data: Pick<InferenceResponse, "detections" | "summary" | "mask_format"> & { final: boolean; passes: string[] } }
+  | { event: "done"; data: Pick<InferenceResponse, "audit_id" | "summary" | "original_url" | "processed_url"> & { processed_url_abs?: string } }
+  | { event: "error"; data: { status: number; detail: string } };
+
+export async function inferImageStream(
+  file: File,
+  opts: {
+    employeeId: string;
+    modelKind?: "det" | "seg";
+    checkThr?: number;
+    renderThr?: number;
+    drawBoxes?: boolean;
+    drawLabels?: boolean;
+    drawMasks?: boolean;
+    maskFormat?: MaskFormat;
+    maskTolerance?: number;
+  },
+  onEvent: (ev: InferStreamEvent) => void
+): Promise<void> {
+  const fd = new FormData();
+  fd.append("image", file);
+  fd.append("employee_id", opts.employeeId);
+  if (opts.modelKind) fd.append("model_kind", opts.modelKind);
+  if (typeof opts.checkThr === "number") fd.append("check_thr", String(opts.checkThr));
+  if (typeof opts.renderThr === "number") fd.append("render_thr", String(opts.renderThr));
+  fd.append("draw_boxes", String(opts.drawBoxes ?? true));
+  fd.append("draw_labels", String(opts.drawLabels ?? true));
+  if (opts.modelKind === "seg") {
+    if (typeof opts.drawMasks === "boolean") fd.append("draw_masks", String(opts.drawMasks));
+    fd.append("mask_format", opts.maskFormat ?? "packed");
+    fd.append("mask_tolerance", String(opts.maskTolerance ?? 1));
+  }
+
+  const res = await fetch(`${BASE}/infer/stream`, { method: "POST", body: fd });
+  if (!res.ok || !res.body) throw new Error(`Infer failed: ${res.status} ${await res.text()}`);
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += value;
+    let sep: number;
+    while ((sep = buf.indexOf("\n\n")) >= 0) {
+      const block = buf.slice(0, sep);
+      buf = buf.slice(sep + 2);
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      const ev = { event, data: JSON.parse(data) } as InferStreamEvent;
+      if (ev.event === "error") throw new Error(`Infer failed: ${ev.data.status} ${ev.data.detail}`);
+      onEvent(ev);
+    }
+  }
+}
+
+// Пересчёт порогов по сохранённым детекциям аудита — без повторной загрузки и инференса
+export async function rethresholdAudit(
+  auditId: number,
+  opts: {
+    checkThr: number; // 0..1
+    renderThr?: number; // 0..1
+    drawBoxes?: boolean;
+    drawLabels?: boolean;
+    drawMasks?: boolean;
+    render?: boolean; // false — только детекции и сводка
+    persist?: boolean; // записать новую сводку в аудит
+    maskFormat?: MaskFormat;
+    maskTolerance?: number;
+  }
+): Promise<InferenceResponse & {
+  processed_url_abs?: string;
+  processed_thumb_url?: string;
+  processed_medium_url?: string;
+}> {
+  const res = await fetch(`${BASE}/audits/${auditId}/rethreshold`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      check_thr: opts.checkThr,
+      render_thr: opts.renderThr ?? 0.6,
+      draw_boxes: opts.drawBoxes ?? true,
+      draw_labels: opts.drawLabels ?? true,
+      draw_masks: opts.drawMasks ?? false,
+      render: opts.render ?? true,
+      persist: opts.persist ?? false,
+      mask_format: opts.maskFormat ?? "packed",
+      mask_tolerance: opts.maskTolerance ?? 1,
+    }),
+  });
+  if (!res.ok) throw new Error(`Rethreshold failed: ${res.status} ${await res.text()}`);
+  const data = (await res.json()) as InferenceResponse;
+  return {
+    ...data,
+    processed_url_abs: absUrl(data.processed_url),
+    processed_thumb_url: derivedUrl(data.processed_url, "thumb"),
+    processed_medium_url: derivedUrl(data.processed_url, "medium"),
   };
 }
 
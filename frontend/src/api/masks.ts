@@ -0,0 +1,20 @@
+import type { DetectionMask } from "./types";
+
+// Декодирование масок из ответа /infer (формат задаётся mask_format на бэке):
+//   [[x, y], ...]                                  — poly / int
+//   { format: "i16b64", count, data }              — packed: base64 int16 LE x0,y0,x1,y1,...
+export function decodeMask(mask?: DetectionMask | null): [number, number][] | null {
+  if (!mask) return null;
+  if (Array.isArray(mask)) return mask as [number, number][];
+  if (mask.format !== "i16b64") return null;
+
+  const bin = atob(mask.data);
+  const bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  const view = new DataView(bytes.buffer);
+  const out: [number, number][] = [];
+  for (let i = 0; i < mask.count; i++) {
+    out.push([view.getInt16(i * 4, true), view.getInt16(i * 4 + 2, true)]);
+  }
+  return out;
+}
@@ -28,12 +28,22 @@
 // Детекция
 export type BBox = [number, number, number, number];
 
+export type PackedMask = {
+  format: "i16b64";
+  count: number; // число точек
+  data: string; // base64 int16 little-endian x0,y0,x1,y1,...
+};
+
+export type MaskFormat = "poly" | "int" | "packed";
+export type DetectionMask = [number, number][] | PackedMask;
+
 export type Detection = {
   class_id: number;
   class_name: string;
   class_name_ru?: string;
   confidence: number; // 0..1
   bbox_xyxy: BBox; // pixels
+  mask?: DetectionMask; // только для сегментации, см. decodeMask()
 };
 
 export type Summary = {
@@ -49,6 +59,7 @@ export type InferenceResponse = {
   image_width: number;
   image_height: number;
   detections: Detection[];
+  mask_format?: MaskFormat;
   summary: Summary;
   original_url?: string;
   processed_url?: string;
@@ -1,6 +1,7 @@
 // src/components/ImageCanvas.tsx
 import React, { useEffect, useRef } from "react";
 import type { Detection } from "../api/types";
+import { decodeMask } from "../api/masks";
 
 type Props = {
   src: string;
@@ -9,12 +10,13 @@ type Props = {
   confPercent: number;       // 0..100
   drawBoxes: boolean;
   drawLabels: boolean;
+  drawMasks?: boolean;
   maxSize?: { w: number; h: number };
 };
 
 const ImageCanvas: React.FC<Props> = ({
   src, naturalSize, detections = [],
-  confPercent, drawBoxes, drawLabels,
+  confPercent, drawBoxes, drawLabels, drawMasks = false,
   maxSize = { w: 1000, h: 700 }
 }) => {
   const ref = useRef<HTMLCanvasElement>(null);
@@ -31,7 +33,7 @@ const ImageCanvas: React.FC<Props> = ({
       ctx.clearRect(0, 0, cw, ch);
       ctx.drawImage(img, 0, 0, cw, ch);
 
-      if (!drawBoxes && !drawLabels) return;
+      if (!drawBoxes && !drawLabels && !drawMasks) return;
 
       const confThr = confPercent / 100;
       const baseW = naturalSize?.w ?? img.width;
@@ -48,6 +50,16 @@ const ImageCanvas: React.FC<Props> = ({
           const rw = Math.round((x2 - x1) * sx);
           const rh = Math.round((y2 - y1) * sy);
 
+          if (drawMasks) {
+            const poly = decodeMask(d.mask);
+            if (poly && poly.length >= 3) {
+              ctx.beginPath();
+              poly.forEach(([px, py], k) => (k ? ctx.lineTo(px * sx, py * sy) : ctx.moveTo(px * sx, py * sy)));
+              ctx.closePath();
+              ctx.fillStyle = "rgba(34,197,94,.35)";
+              ctx.fill();
+            }
+          }
           if (drawBoxes) {
             ctx.strokeStyle = "#22c55e";
             ctx.lineWidth = 2;
@@ -67,7 +79,7 @@ const ImageCanvas: React.FC<Props> = ({
         });
     };
     img.src = src;
-  }, [src, detections, confPercent, drawBoxes, drawLabels, maxSize.w, maxSize.h, naturalSize?.w, naturalSize?.h]);
+  }, [src, detections, confPercent, drawBoxes, drawLabels, drawMasks, maxSize.w, maxSize.h, naturalSize?.w, naturalSize?.h]);
 
   return <canvas ref={ref} style={{ width: "100%", height: "auto", borderRadius: 12 }} />;
 };
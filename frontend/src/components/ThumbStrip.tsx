@@ -3,9 +3,10 @@ import React from "react";
 import { IconButton, Stack } from "@mui/material";
 import ChevronLeftIcon from "@mui/icons-material/ChevronLeft";
 import ChevronRightIcon from "@mui/icons-material/ChevronRight";
+import { derivedUrl } from "../api/client";
 
 type Props = {
-  urls: string[];
+  urls: string[]; // original_url / processed_url — в ленте показываются их thumb-производные
   current: number;
   onSelect: (i: number) => void;
   onPrev: () => void;
@@ -28,7 +29,16 @@ const ThumbStrip: React.FC<Props> = ({ urls, current, onSelect, onPrev, onNext }
             }}
             title={`Фото ${i + 1}`}
           >
-            <img src={u} alt={`thumb-${i}`} style={{ width: "100%", height: "100%", objectFit: "cover" }} />
+            <picture>
+              <source srcSet={derivedUrl(u, "thumb", "webp")} type="image/webp" />
+              <img
+                src={derivedUrl(u, "thumb", "jpeg")}
+                alt={`thumb-${i}`}
+                loading="lazy"
+                decoding="async"
+                style={{ width: "100%", height: "100%", objectFit: "cover" }}
+              />
+            </picture>
           </button>
         ))}
       </div>
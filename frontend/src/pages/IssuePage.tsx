@@ -26,8 +26,9 @@ import {
 import { alpha } from "@mui/material/styles";
 import ChevronLeftIcon from "@mui/icons-material/ChevronLeft";
 import ChevronRightIcon from "@mui/icons-material/ChevronRight";
-import { inferImage } from "../api/client";
-import type { InferenceResponse } from "../api/types";
+import { derivedUrl, inferImageStream, rethresholdAudit } from "../api/client";
+import { decodeMask } from "../api/masks";
+import type { DetectionMask, InferenceResponse } from "../api/types";
 
 /* ===================== Утилиты ===================== */
 const IMG_EXT_RE = /\.(jpe?g|png|bmp|tiff?|webp|heic|heif)$/i;
@@ -147,13 +148,14 @@ type Detection = {
   class_name_ru?: string;
   confidence: number;
   bbox_xyxy: [number, number, number, number];
-  mask?: [number, number][]; // для сегментации (пиксели исходного изображения)
+  mask?: DetectionMask; // для сегментации (пиксели исходного изображения), см. decodeMask()
 };
 
 type Item = {
   file: File;
   url: string; // локальный objectURL исходника
   processedUrl?: string;
+  thumbUrl?: string; // превью обработанного изображения (derived, ~160px)
   result?: InferenceResponse;
   loading?: boolean;
   error?: string;
@@ -240,20 +242,41 @@ export default function IssuePage() {
       setItems((arr) => arr.map((it, k) => (k === i ? { ...it, loading: true, error: undefined } : it)));
 
       try {
-        const res = await inferImage(items[i].file, {
-          employeeId: employeeId.trim(),
-          modelKind,
-          checkThr: checkThr / 100,
-          renderThr: renderThr / 100,
-          drawBoxes: true,
-          drawLabels: true,
-          drawMasks: modelKind === "seg" ? drawMasks : false,
-        });
-
-        setItems((arr) =>
-          arr.map((it, k) =>
-            k === i ? { ...it, result: res, processedUrl: res.processed_url_abs, loading: false } : it
-          )
+        // детекции показываются сразу после основного прохода, уточняются после fallback-ов
+        await inferImageStream(
+          items[i].file,
+          {
+            employeeId: employeeId.trim(),
+            modelKind,
+            checkThr: checkThr / 100,
+            renderThr: renderThr / 100,
+            drawBoxes: true,
+            drawLabels: true,
+            drawMasks: modelKind === "seg" ? drawMasks : false,
+          },
+          (ev) => {
+            setItems((arr) =>
+              arr.map((it, k) => {
+                if (k !== i) return it;
+                if (ev.event === "detections") {
+                  return { ...it, result: { ...ev.data } as InferenceResponse };
+                }
+                if (ev.event === "refined" && it.result) {
+                  return { ...it, result: { ...it.result, ...ev.data } };
+                }
+                if (ev.event === "done" && it.result) {
+                  return {
+                    ...it,
+                    result: { ...it.result, ...ev.data },
+                    processedUrl: ev.data.processed_url_abs,
+                    thumbUrl: derivedUrl(ev.data.processed_url, "thumb"),
+                    loading: false,
+                  };
+                }
+                return it;
+              })
+            );
+          }
         );
       } catch (e: any) {
         setItems((arr) =>
@@ -276,6 +299,29 @@ export default function IssuePage() {
     setBatchRunning(false);
   }
 
+  /* ---------- порог проверки по уже обработанным (без повторного инференса) ---------- */
+  async function applyCheckThr(thrPercent: number) {
+    const targets = items
+      .map((it, i) => ({ i, id: it.result?.audit_id }))
+      .filter((x): x is { i: number; id: number } => typeof x.id === "number");
+    await Promise.all(
+      targets.map(async ({ i, id }) => {
+        try {
+          const res = await rethresholdAudit(id, { checkThr: thrPercent / 100, render: false });
+          setItems((arr) =>
+            arr.map((it, k) =>
+              k === i && it.result
+                ? { ...it, result: { ...it.result, detections: res.detections, summary: res.summary, mask_format: res.mask_format } }
+                : it
+            )
+          );
+        } catch (e: any) {
+          setItems((arr) => arr.map((it, k) => (k === i ? { ...it, error: e?.message || "Ошибка" } : it)));
+        }
+      })
+    );
+  }
+
   /* ---------- сброс ---------- */
   function resetAll() {
     items.forEach((it) => URL.revokeObjectURL(it.url));
@@ -338,7 +384,8 @@ export default function IssuePage() {
     else if (r.right > er.right) wrap.scrollBy({ left: r.right - er.right + 8, behavior: "smooth" });
   }, [current]);
 
-  const urls = useMemo(() => items.map((i) => i.url), [items]);
+  // для ленты превью: маленькая серверная версия, пока её нет — локальный исходник
+  const thumbUrls = useMemo(() => items.map((i) => i.thumbUrl ?? i.url), [items]);
   const scrollByOne = (dir: -1 | 1) => {
     const wrap = stripRef.current;
     if (!wrap) return;
@@ -439,15 +486,16 @@ export default function IssuePage() {
       const color = colorForClass(d);
 
       // маска (для сегментации) — рисуем до рамки
-      if (modelKind === "seg" && drawMasks && d.mask && d.mask.length >= 3) {
+      const poly = modelKind === "seg" && drawMasks ? decodeMask(d.mask) : null;
+      if (poly && poly.length >= 3) {
         ctx.save();
         ctx.fillStyle = color as string;
         ctx.globalAlpha = 0.22;
         ctx.beginPath();
-        const [sx, sy] = d.mask[0];
+        const [sx, sy] = poly[0];
         ctx.moveTo(offX + sx * scale, offY + sy * scale);
-        for (let i = 1; i < d.mask.length; i++) {
-          const [px, py] = d.mask[i];
+        for (let i = 1; i < poly.length; i++) {
+          const [px, py] = poly[i];
           ctx.lineTo(offX + px * scale, offY + py * scale);
         }
         ctx.closePath();
@@ -546,7 +594,13 @@ export default function IssuePage() {
               <Typography variant="caption" sx={{ color: "text.secondary" }}>
                 Порог проверки: <b>{checkThr}%</b>
               </Typography>
-              <Slider value={checkThr} min={0} max={100} onChange={(_, v) => setCheckThr(v as number)} />
+              <Slider
+                value={checkThr}
+                min={0}
+                max={100}
+                onChange={(_, v) => setCheckThr(v as number)}
+                onChangeCommitted={(_, v) => applyCheckThr(v as number)}
+              />
             </Box>
 
             <Box>
@@ -697,7 +751,7 @@ export default function IssuePage() {
                     "&::-webkit-scrollbar-thumb": { background: "#d1d5db", borderRadius: 8 },
                   }}
                 >
-                  {urls.map((u, i) => {
+                  {thumbUrls.map((u, i) => {
                     const active = i === current;
                     return (
                       <button
@@ -724,6 +778,8 @@ export default function IssuePage() {
                         <img
                           src={u}
                           alt={`thumb-${i}`}
+                          loading="lazy"
+                          decoding="async"
                           style={{ width: "100%", height: "100%", objectFit: "cover", display: "block" }}
                         />
                       </button>